@@ -4,7 +4,7 @@
 # Author: noonchen - chennoon233@foxmail.com
 # Created Date: December 13th 2020
 # -----
-# Last Modified: Sun Oct 12 2025
+# Last Modified: Sun Oct 18 2026
 # Modified By: noonchen
 # -----
 # Copyright (c) 2020 noonchen
@@ -32,9 +32,11 @@ from itertools import product
 from deps.SharedSrc import *
 from deps.ui.transSrc import transDict
 from deps.DataInterface import DataInterface
+from deps.SessionCache import evictCache, detachFromCache
+from deps.ColumnarStore import getStorePath
 from deps.customizedQtClass import *
 from deps.ChartWidgets import *
-from deps.uic_stdLoader import stdfLoader
+from deps.uic_stdLoader import stdfLoader, stdFollower, TestIDTypeDict
 from deps.uic_stdMerge import MergePanel
 from deps.uic_stdFailMarker import FailMarker
 from deps.uic_stdExporter import stdfExporter
@@ -79,6 +81,9 @@ logger = logging.getLogger("STDF-Viewer")
 
 class signals4MainUI(QtCore.QObject):
     dataInterfaceSignal = Signal(object)  # get `DataInterface` from loader
+    dataAppendedSignal = Signal(int)      # get appended file id from loader
+    followRequestSignal = Signal(str, str, object)  # poll new parts of the followed file
+    snapshotSignal = Signal()                       # new parts are committed in progressive loading
     statusSignal = Signal(str, bool, bool, bool)   # status bar
     showDutDataSignal_TrendHisto = Signal(list)     # trend & histo
     showDutDataSignal_Bin = Signal(list)            # bin chart
@@ -108,9 +113,22 @@ class MyWindow(QtWidgets.QMainWindow):
         self.head_cb_dict = {}
         self.translatorUI = QTranslator(self)
         self.translatorCode = QTranslator(self)
+        # parse new parts of a followed file in background
+        self.follower = stdFollower()
+        self.followThread = QtCore.QThread(self)
+        self.follower.moveToThread(self.followThread)
+        self.followThread.start()
+        self.followTimer = QtCore.QTimer(self)
+        self.followTimer.setSingleShot(True)
+        self.followTimer.timeout.connect(self.pollFollowedFile)
         # init and connect signals
         self.signals = signals4MainUI()
         self.signals.dataInterfaceSignal.connect(self.updateData)
+        self.signals.dataAppendedSignal.connect(self.onDataAppended)
+        self.signals.followRequestSignal.connect(self.follower.poll)
+        self.follower.followedSignal.connect(self.onDataFollowed)
+        self.follower.failedSignal.connect(self.onFollowFailed)
+        self.signals.snapshotSignal.connect(self.onSnapshotReady)
         self.signals.statusSignal.connect(self.updateStatus)
         self.signals.showDutDataSignal_TrendHisto.connect(self.onReadDutData_TrendHisto)
         self.signals.showDutDataSignal_Bin.connect(self.onReadDutData_Bin)
@@ -145,6 +163,16 @@ class MyWindow(QtWidgets.QMainWindow):
         self.ui.actionFetchDatalog.triggered.connect(lambda: self.onFetchAllRows(self.ui.datalogTable))
         self.ui.actionAddFont.triggered.connect(self.onAddFont)
         self.ui.actionToXLSX.triggered.connect(self.onToXLSX)
+        self.actionAppend = QtWidgets.QAction(self.tr("Append Files"), self)
+        self.actionAppend.triggered.connect(self.onAppendFiles)
+        self.actionFollow = QtWidgets.QAction(self.tr("Follow File"), self)
+        self.actionFollow.setCheckable(True)
+        self.actionFollow.triggered.connect(self.onFollowFile)
+        self.actionQuickLook = QtWidgets.QAction(self.tr("Quick Look (Sampled)"), self)
+        self.actionQuickLook.triggered.connect(self.onQuickLook)
+        self.actionLoadFull = QtWidgets.QAction(self.tr("Load Full Data"), self)
+        self.actionLoadFull.triggered.connect(self.onLoadFullData)
+        self.actionLoadFull.setEnabled(False)
         # init search-related UI
         self.ui.SearchBox.textChanged.connect(self.proxyModel_list.setFilterWildcard)
         self.ui.ClearButton.clicked.connect(self.clearSearchBox)
@@ -162,6 +190,10 @@ class MyWindow(QtWidgets.QMainWindow):
         self.utilityMenu = QtWidgets.QMenu()
         self.utilityMenu.addActions([self.ui.actionLoad_Session, 
                                      self.ui.actionSave_Session,
+                                     self.actionAppend,
+                                     self.actionFollow,
+                                     self.actionQuickLook,
+                                     self.actionLoadFull,
                                      self.ui.actionAddFont,
                                      self.ui.actionToXLSX])
         self.utilityBtn = QtWidgets.QToolButton()
@@ -320,6 +352,138 @@ class MyWindow(QtWidgets.QMainWindow):
         self.mergePanel.showUI()
     
     
+    def onQuickLook(self):
+        '''
+        Open STDF files with a sample of parts, bins 
+        and yields are still from the summary records
+        '''
+        files, _ = QFileDialog.getOpenFileNames(self, caption=self.tr("Select STDF Files For Quick Look"), 
+                                                directory=getSetting().gen.recent_dir, 
+                                                filter=self.tr(FILE_FILTER),)
+        if files:
+            updateRecentFolder(files[0])
+            self.loader.loadFile([[f] for f in files], sampled=True)
+    
+    
+    def onLoadFullData(self):
+        '''
+        Parse all parts of the files in the sampled 
+        session, the sampled session is replaced
+        '''
+        if self.data_interface is None or not self.data_interface.isSampled:
+            return
+        self.callFileLoader(self.data_interface.file_paths)
+    
+    
+    def onFollowFile(self, checked: bool):
+        if not checked:
+            self.followTimer.stop()
+            return
+        
+        p, _ = QFileDialog.getOpenFileName(self, caption=self.tr("Select a STDF file being written"), 
+                                           directory=getSetting().gen.recent_dir, 
+                                           filter=self.tr(FILE_FILTER),)
+        if p:
+            updateRecentFolder(p)
+            self.loader.followFile(p)
+        # timer is started if loaded successfully
+        self.actionFollow.setChecked(self.followTimer.isActive())
+    
+    
+    def pollFollowedFile(self):
+        if self.data_interface is None or not self.data_interface.followPath:
+            return
+        settings = getSetting()
+        if settings.gen.id_type in TestIDTypeDict:
+            self.follower.setIDType(TestIDTypeDict[settings.gen.id_type])
+        self.follower.mprBlob = settings.gen.mpr_blob
+        self.follower.ingest = settings.ingest
+        di = self.data_interface
+        self.signals.followRequestSignal.emit(di.dbPath, di.followPath, di.followOffset)
+    
+    
+    def onDataFollowed(self, offset: int):
+        di = self.data_interface
+        if di is None or not di.followPath or not self.actionFollow.isChecked():
+            return
+        if offset != di.followOffset:
+            di.followOffset = offset
+            self.refreshSession()
+        # next poll starts after this one is done
+        self.followTimer.start(int(max(getSetting().gen.follow_interval, 0.5) * 1000))
+    
+    
+    def onFollowFailed(self, errMsg: str):
+        self.followTimer.stop()
+        self.actionFollow.setChecked(False)
+        self.updateStatus(self.tr("Following is stopped: {0}").format(errMsg), warning=True)
+    
+    
+    def onSnapshotReady(self):
+        if self.data_interface is None:
+            return
+        self.refreshSession()
+    
+    
+    def refreshSession(self):
+        '''
+        Reload the opened database after new parts are 
+        written to it, only redraw current tab and keep selections
+        '''
+        di = self.data_interface
+        # parts may be written to any file of the session
+        di.refreshDatabase()
+        if self.completeTestList != di.completeTestList:
+            self.completeTestList = di.completeTestList
+            self.refreshTestList()
+        if self.completeWaferList != di.completeWaferList:
+            self.completeWaferList = di.completeWaferList
+            self.updateModelContent(self.sim_list_wafer, self.completeWaferList)
+        self.ui.tabControl.setTabEnabled(tab.Wafer, di.containsWafer)
+        self.clearCurrentTab(self.ui.tabControl.currentIndex())
+        self.selectionTracker = {}
+        self.updateFileHeader()
+        self.updateDutSummaryTable()
+        self.onSelect()
+    
+    
+    def onAppendFiles(self):
+        if self.data_interface is None:
+            self.updateStatus(self.tr("Please open a file first"), warning=True)
+            return
+        
+        files, _ = QFileDialog.getOpenFileNames(self, caption=self.tr("Select STDF Files To Append"), 
+                                                directory=getSetting().gen.recent_dir, 
+                                                filter=self.tr(FILE_FILTER),)
+        if not files:
+            return
+        updateRecentFolder(files[0])
+        # append as a new file or merge into an opened file
+        targets = [self.tr("As a new file")] + [self.tr("Merge into File {0}").format(i) 
+                                                for i in range(self.data_interface.num_files)]
+        target, ok = QtWidgets.QInputDialog.getItem(self, self.tr("Append Files"), 
+                                                    self.tr("Append selected files:"), 
+                                                    targets, 0, False)
+        if not ok:
+            return
+        fid = targets.index(target) - 1
+        
+        # cached session must be kept as it is
+        dbPath = detachFromCache(self.data_interface.dbPath)
+        if dbPath != self.data_interface.dbPath:
+            self.loadDatabase(dbPath)
+        # dut summary model may hold a read lock
+        self.db_dut.close()
+        # columnar store is removed before appending
+        self.data_interface.DatabaseFetcher.closeColumnarStore()
+        self.loader.appendFile(dbPath, files, None if fid < 0 else fid)
+        if not self.db_dut.isOpen():
+            # cancelled or failed, database is unchanged
+            self.db_dut.open()
+            self.updateDutSummaryTable()
+            self.updateGDR_DTR_Table()
+    
+    
     def onLoadSession(self):
         p, _ = QFileDialog.getOpenFileName(self, caption=self.tr("Select a STDF-Viewer session"), 
                                            directory=getSetting().gen.recent_dir, 
@@ -450,6 +614,10 @@ class MyWindow(QtWidgets.QMainWindow):
         '''
         Clean up before closing app
         '''
+        self.followTimer.stop()
+        self.followThread.quit()
+        self.followThread.wait()
+        self.loader.stopBackgroundLoading()
         self.db_dut.close()
         if self.data_interface:
             currentDB = self.data_interface.dbPath
@@ -458,11 +626,13 @@ class MyWindow(QtWidgets.QMainWindow):
             currentDB = "???"
         # save settings to file
         dumpConfigFile()
+        # keep the parse cache within size limit
+        evictCache(getSetting().gen.cache_size, {currentDB})
         # clean generated database
         dbFolder = os.path.join(sys.rootFolder, "logs")
         for f in os.listdir(dbFolder):
-            # save current database
-            if f.endswith(".db") and not currentDB.endswith(f):
+            # save current database and its columnar store
+            if f.endswith((".db", ".db.cols")) and not getStorePath(currentDB).endswith(f) and not currentDB.endswith(f):
                 try:
                     os.remove(os.path.join(dbFolder, f))
                 except OSError:
@@ -688,6 +858,10 @@ class MyWindow(QtWidgets.QMainWindow):
 
     def updateFileHeader(self):
         if isinstance(self.data_interface, DataInterface):
+            # mark quick look sessions, parts are missing
+            isSampled = self.data_interface.isSampled
+            self.setWindowTitle(self.tr("STDF Viewer - Quick Look") if isSampled else self.tr("STDF Viewer"))
+            self.actionLoadFull.setEnabled(isSampled)
             # clear old info
             self.tmodel_info.removeRows(0, self.tmodel_info.rowCount())
             
@@ -1260,97 +1434,119 @@ class MyWindow(QtWidgets.QMainWindow):
             # working on the new object
             self.data_interface = newDI
             self.data_interface.loadDatabase()
+            # previous session is closed, it's safe to evict cache now
+            evictCache(getSetting().gen.cache_size, {self.data_interface.dbPath})
             # open new dut summary database
             self.db_dut.setDatabaseName(self.data_interface.dbPath)
             if not self.db_dut.open():
                 raise RuntimeError(f"Database cannot be opened by Qt: {self.data_interface.dbPath}")
             
-            # disable/enable wafer tab
-            self.ui.tabControl.setTabEnabled(tab.Wafer, self.data_interface.containsWafer)
+            self.updateUIContents()
+            # start polling if the new session is followed
+            if self.data_interface.followPath:
+                self.actionFollow.setChecked(True)
+                self.followTimer.start(int(max(getSetting().gen.follow_interval, 0.5) * 1000))
+            else:
+                self.actionFollow.setChecked(False)
+                self.followTimer.stop()
     
-            # update listView
-            self.completeTestList = self.data_interface.completeTestList
-            self.completeWaferList = self.data_interface.completeWaferList
-            self.refreshTestList()
-            self.updateModelContent(self.sim_list_wafer, self.completeWaferList)
-            
-            # remove site/head checkbox for invalid sites/heads
-            current_exist_site = list(self.site_cb_dict.keys())     # avoid RuntimeError: dictionary changed size during iteration
-            current_exist_head = list(self.head_cb_dict.keys())
-            self.availableSites = self.data_interface.availableSites
-            self.availableHeads = self.data_interface.availableHeads
-            
-            for site in current_exist_site:
-                if site not in self.availableSites:
-                    self.site_cb_dict.pop(site)
-                    row = 1 + site//4
-                    col = site % 4
-                    cb_layout = self.ui.gridLayout_site_select.itemAtPosition(row, col)
-                    if cb_layout is not None:
-                        cb_layout.widget().deleteLater()
-                        self.ui.gridLayout_site_select.removeItem(cb_layout)
-                        
-            for headnum in current_exist_head:
-                if headnum not in self.availableHeads:
-                    self.head_cb_dict.pop(headnum)
-                    row = headnum//3
-                    col = headnum % 3
-                    cb_layout_h = self.ui.gridLayout_head_select.itemAtPosition(row, col)
-                    if cb_layout_h is not None:
-                        cb_layout_h.widget().deleteLater()
-                        self.ui.gridLayout_head_select.removeItem(cb_layout_h)
-                                 
-            # add & enable checkboxes for each sites and heads
-            siteNum = 0     # pre-define local var in case there are no available sites
-            for siteNum in self.availableSites:
-                if siteNum in self.site_cb_dict: 
-                    # skip if already have a checkbox for this site
-                    continue
-                siteName = "Site %d" % siteNum
-                self.site_cb_dict[siteNum] = QtWidgets.QCheckBox(self.ui.site_selection_contents)
-                self.site_cb_dict[siteNum].setObjectName(siteName)
-                self.site_cb_dict[siteNum].setText(siteName)
-                row = 1 + siteNum//4
-                col = siteNum % 4
-                self.ui.gridLayout_site_select.addWidget(self.site_cb_dict[siteNum], row, col)
-                
-            for headnum in self.availableHeads:
-                if headnum in self.head_cb_dict:
-                    continue
-                headName = "Head %d" % headnum
-                self.head_cb_dict[headnum] = QtWidgets.QCheckBox(self.ui.head_selection_tab)
-                self.head_cb_dict[headnum].setObjectName(headName)
-                self.head_cb_dict[headnum].setText(headName)
-                self.head_cb_dict[headnum].setChecked(True)
+    
+    def onDataAppended(self, fid: int):
+        # files are appended to the opened database
+        self.clearAllContents()
+        self.data_interface.refreshDatabase(fid)
+        if not self.db_dut.isOpen() and not self.db_dut.open():
+            raise RuntimeError(f"Database cannot be opened by Qt: {self.data_interface.dbPath}")
+        self.updateUIContents()
+    
+    
+    def updateUIContents(self):
+        # disable/enable wafer tab
+        self.ui.tabControl.setTabEnabled(tab.Wafer, self.data_interface.containsWafer)
+
+        # update listView
+        self.completeTestList = self.data_interface.completeTestList
+        self.completeWaferList = self.data_interface.completeWaferList
+        self.refreshTestList()
+        self.updateModelContent(self.sim_list_wafer, self.completeWaferList)
+        
+        # remove site/head checkbox for invalid sites/heads
+        current_exist_site = list(self.site_cb_dict.keys())     # avoid RuntimeError: dictionary changed size during iteration
+        current_exist_head = list(self.head_cb_dict.keys())
+        self.availableSites = self.data_interface.availableSites
+        self.availableHeads = self.data_interface.availableHeads
+        
+        for site in current_exist_site:
+            if site not in self.availableSites:
+                self.site_cb_dict.pop(site)
+                row = 1 + site//4
+                col = site % 4
+                cb_layout = self.ui.gridLayout_site_select.itemAtPosition(row, col)
+                if cb_layout is not None:
+                    cb_layout.widget().deleteLater()
+                    self.ui.gridLayout_site_select.removeItem(cb_layout)
+                    
+        for headnum in current_exist_head:
+            if headnum not in self.availableHeads:
+                self.head_cb_dict.pop(headnum)
                 row = headnum//3
                 col = headnum % 3
-                self.ui.gridLayout_head_select.addWidget(self.head_cb_dict[headnum], row, col)
-            # set max height in order to resize site/head selection tab control
-            nrow_sites = len(set([0] + [1 + sn//4 for sn in self.site_cb_dict.keys()]))
-            self.ui.site_head_selection.setMaximumHeight(50 + self.ui.gridLayout_site_select.cellRect(0, 0).height()*nrow_sites + 7*nrow_sites)
-            # update UI
-            setSettingDefaultColor(self.availableSites, 
-                                   self.data_interface.SBIN_dict, 
-                                   self.data_interface.HBIN_dict)
-            setSettingDefaultSymbol(self.data_interface.num_files)
-            # remove existing color btns
-            self.settingUI.removeColorBtns()
-            self.settingUI.initColorBtns(self.availableSites, 
-                                         self.data_interface.SBIN_dict, 
-                                         self.data_interface.HBIN_dict)
-            self.settingUI.removeSymbolBtns()
-            self.settingUI.initSymbolBtns(self.data_interface.num_files)
-            self.exporter.removeSiteCBs()
-            self.exporter.refreshUI(self.completeTestList,
-                                    self.completeWaferList,
-                                    self.availableHeads,
-                                    self.availableSites,
-                                    self.data_interface.num_files)
-            self.init_Head_SiteCheckbox()
-            self.updateFileHeader()
-            self.updateDutSummaryTable()
-            self.updateGDR_DTR_Table()
-            self.onSelect()
+                cb_layout_h = self.ui.gridLayout_head_select.itemAtPosition(row, col)
+                if cb_layout_h is not None:
+                    cb_layout_h.widget().deleteLater()
+                    self.ui.gridLayout_head_select.removeItem(cb_layout_h)
+                             
+        # add & enable checkboxes for each sites and heads
+        siteNum = 0     # pre-define local var in case there are no available sites
+        for siteNum in self.availableSites:
+            if siteNum in self.site_cb_dict: 
+                # skip if already have a checkbox for this site
+                continue
+            siteName = "Site %d" % siteNum
+            self.site_cb_dict[siteNum] = QtWidgets.QCheckBox(self.ui.site_selection_contents)
+            self.site_cb_dict[siteNum].setObjectName(siteName)
+            self.site_cb_dict[siteNum].setText(siteName)
+            row = 1 + siteNum//4
+            col = siteNum % 4
+            self.ui.gridLayout_site_select.addWidget(self.site_cb_dict[siteNum], row, col)
+            
+        for headnum in self.availableHeads:
+            if headnum in self.head_cb_dict:
+                continue
+            headName = "Head %d" % headnum
+            self.head_cb_dict[headnum] = QtWidgets.QCheckBox(self.ui.head_selection_tab)
+            self.head_cb_dict[headnum].setObjectName(headName)
+            self.head_cb_dict[headnum].setText(headName)
+            self.head_cb_dict[headnum].setChecked(True)
+            row = headnum//3
+            col = headnum % 3
+            self.ui.gridLayout_head_select.addWidget(self.head_cb_dict[headnum], row, col)
+        # set max height in order to resize site/head selection tab control
+        nrow_sites = len(set([0] + [1 + sn//4 for sn in self.site_cb_dict.keys()]))
+        self.ui.site_head_selection.setMaximumHeight(50 + self.ui.gridLayout_site_select.cellRect(0, 0).height()*nrow_sites + 7*nrow_sites)
+        # update UI
+        setSettingDefaultColor(self.availableSites, 
+                               self.data_interface.SBIN_dict, 
+                               self.data_interface.HBIN_dict)
+        setSettingDefaultSymbol(self.data_interface.num_files)
+        # remove existing color btns
+        self.settingUI.removeColorBtns()
+        self.settingUI.initColorBtns(self.availableSites, 
+                                     self.data_interface.SBIN_dict, 
+                                     self.data_interface.HBIN_dict)
+        self.settingUI.removeSymbolBtns()
+        self.settingUI.initSymbolBtns(self.data_interface.num_files)
+        self.exporter.removeSiteCBs()
+        self.exporter.refreshUI(self.completeTestList,
+                                self.completeWaferList,
+                                self.availableHeads,
+                                self.availableSites,
+                                self.data_interface.num_files)
+        self.init_Head_SiteCheckbox()
+        self.updateFileHeader()
+        self.updateDutSummaryTable()
+        self.updateGDR_DTR_Table()
+        self.onSelect()
 
     
     @Slot(str, bool, bool, bool)
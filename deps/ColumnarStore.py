@@ -0,0 +1,124 @@
+#
+# ColumnarStore.py - STDF Viewer
+#
+# Author: noonchen - chennoon233@foxmail.com
+# Created Date: October 18th 2026
+# -----
+# Last Modified: Sun Oct 18 2026
+# Modified By: noonchen
+# -----
+# Copyright (c) 2026 noonchen
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+import numpy as np
+
+
+# layout is defined in `rust_stdf_helper/src/columnar_store.rs`
+STORE_EXT = ".cols"
+STORE_MAGIC = b"STDFVCOL"
+STORE_VERSION = 2
+HEADER_DTYPE = np.dtype([("magic", "S8"),
+                         ("version", "<u4"),
+                         ("num_tests", "<u4"),
+                         ("num_fids", "<u4"),
+                         ("reserved", "<u4"),
+                         ("num_files", "<u8")])
+FILE_DTYPE = np.dtype([("fid", "<u4"),
+                       ("reserved", "<u4"),
+                       ("dut_count", "<u8")])
+INDEX_DTYPE = np.dtype([("test_id", "<u4"),
+                        ("reserved", "<u4"),
+                        ("count", "<u8"),
+                        ("offset", "<u8")])
+
+
+def getStorePath(dbPath: str) -> str:
+    '''Columnar store of PTR data is next to the session database'''
+    return dbPath + STORE_EXT
+
+
+def removeStore(dbPath: str):
+    '''Remove the store of a session before new parts are written to it'''
+    try:
+        os.remove(getStorePath(dbPath))
+    except FileNotFoundError:
+        pass
+    except OSError:
+        # still mapped on Windows, it is outdated by dut counts anyway
+        pass
+
+
+class ColumnarStore:
+    '''
+    PTR data of a session stored per test, arrays of a
+    test are memory mapped and read without copy.
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self.mm = np.memmap(path, dtype=np.uint8, mode="r")
+        header = np.frombuffer(self.mm, dtype=HEADER_DTYPE, count=1)[0]
+        if header["magic"] != STORE_MAGIC or header["version"] != STORE_VERSION:
+            raise ValueError(f"Invalid columnar store: {path}")
+        self.numFiles = int(header["num_files"])
+        numFids = int(header["num_fids"])
+        files = np.frombuffer(self.mm, dtype=FILE_DTYPE, count=numFids, offset=HEADER_DTYPE.itemsize)
+        # DUTIndex restarts in every file
+        self.dutCounts = {int(fid): int(cnt) for fid, cnt in zip(files["fid"], files["dut_count"])}
+        index = np.frombuffer(self.mm, dtype=INDEX_DTYPE, count=int(header["num_tests"]), 
+                              offset=HEADER_DTYPE.itemsize + FILE_DTYPE.itemsize * numFids)
+        self.index = {int(tid): (int(cnt), int(ofs)) for tid, cnt, ofs in zip(index["test_id"], index["count"], index["offset"])}
+
+
+    @classmethod
+    def open(cls, dbPath: str):
+        '''`None` if the session doesn't have a valid store'''
+        path = getStorePath(dbPath)
+        if not os.path.isfile(path):
+            return None
+        try:
+            return cls(path)
+        except (ValueError, OSError):
+            return None
+
+
+    def isOutdated(self, dutCounts: dict, numFiles: int) -> bool:
+        '''
+        store is written before files are appended or merged 
+        into a file, `dutCounts` is {Fid: dut count}
+        '''
+        return self.dutCounts != dutCounts or self.numFiles != numFiles
+
+
+    def getTestData(self, testID: int) -> tuple | None:
+        '''
+        return (`dutList`, `dataList`, `flagList`) of all duts of `testID`,
+        DUTIndex is sorted, `None` if `testID` is not a PTR
+        '''
+        if testID not in self.index:
+            return None
+        count, offset = self.index[testID]
+        return (np.frombuffer(self.mm, dtype="<u4", count=count, offset=offset),
+                np.frombuffer(self.mm, dtype="<f4", count=count, offset=offset + 4 * count),
+                np.frombuffer(self.mm, dtype=np.uint8, count=count, offset=offset + 8 * count))
+
+
+    def close(self):
+        # mapping is released when all arrays are collected
+        self.index = {}
+        self.mm = None
+
+
+__all__ = ["getStorePath", "removeStore", "ColumnarStore"]
@@ -4,7 +4,7 @@
 # Author: noonchen - chennoon233@foxmail.com
 # Created Date: November 3rd 2022
 # -----
-# Last Modified: Sun Oct 12 2025
+# Last Modified: Sun Oct 18 2026
 # Modified By: noonchen
 # -----
 # Copyright (c) 2022 noonchen
@@ -13,11 +13,62 @@
 
 
 import os, itertools
+from collections import OrderedDict
 import numpy as np
-from deps.DatabaseFetcher import DatabaseFetcher
+from deps.DatabaseFetcher import DatabaseFetcher, selectDuts
 from deps.SharedSrc import *
 
 
+class TestDataCache:
+    '''
+    LRU cache of processed test data, least recently used 
+    entries are evicted if arrays exceed the memory budget.
+    '''
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+    
+    
+    @staticmethod
+    def entrySize(testData: dict) -> int:
+        return sum(v.nbytes for v in testData.values() if isinstance(v, np.ndarray))
+    
+    
+    def get(self, key: tuple) -> dict | None:
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        # callers pop items from the result
+        return dict(self.entries[key])
+    
+    
+    def put(self, key: tuple, testData: dict, maxSize: int):
+        self.pop(key)
+        size = self.entrySize(testData)
+        if size > maxSize:
+            return
+        self.entries[key] = dict(testData)
+        self.size += size
+        while self.size > maxSize:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= self.entrySize(evicted)
+    
+    
+    def pop(self, key: tuple):
+        if key in self.entries:
+            self.size -= self.entrySize(self.entries.pop(key))
+    
+    
+    def clear(self):
+        # counters are kept for the whole session
+        self.entries.clear()
+        self.size = 0
+
+
 class DataInterface:
     '''
     `DataInterface` provides APIs for STDF-Viewer UI to retrieve
@@ -34,7 +85,12 @@ class DataInterface:
         self.num_files = 0
         self.dbPath = ""
         self.dbConnected = False
+        # file being followed and offset of its next new part
+        self.followPath = ""
+        self.followOffset = 0
         self.containsWafer = False
+        # quick look session, only a sample of parts is parsed
+        self.isSampled = False
         
         self.availableSites = []
         self.availableHeads = []
@@ -50,6 +106,10 @@ class DataInterface:
         self.completeWaferList = []
         # cache test pin list and names for MPR
         self.pinInfoDictCache = {}
+        # processed data of recently viewed tests
+        self.testDataCache = TestDataCache()
+        # (fid, head, site) -> DUTIndex of valid duts
+        self.dutSelection = {}
         
         
     def loadDatabase(self):
@@ -58,16 +118,55 @@ class DataInterface:
         
         self.DatabaseFetcher.connectDB(self.dbPath)
         self.dbConnected = True
+        self.DatabaseFetcher.openColumnarStore()
         self.file_paths = self.DatabaseFetcher.file_paths
         self.num_files = self.DatabaseFetcher.num_files
         # get file name and size str for display
-        add_i_ifmany_then_join = lambda l, sz: "\n".join(l if sz < 2 else (f"#{i+1} → {e}" for i, e in enumerate(l)))
-        self.file_names = [add_i_ifmany_then_join(map(os.path.basename, fg), len(fg)) for fg in self.file_paths]
-        self.file_sizes = [add_i_ifmany_then_join(map(get_file_size, fg), len(fg)) for fg in self.file_paths]
+        self.file_names = [self.getFileGroupName(fg) for fg in self.file_paths]
+        self.file_sizes = [self.getFileGroupSize(fg) for fg in self.file_paths]
+        self.readSummary()
+        
+        
+    def refreshDatabase(self, fid: int | None = None):
+        '''
+        Reload after STDF files are appended to `fid`, 
+        file names and sizes of other files are kept.
+        All files are refreshed if `fid` is None, e.g.
+        new parts are written to every file in the session.
+        '''
+        if not self.dbConnected:
+            raise RuntimeError("No database is connected")
+        
+        self.DatabaseFetcher.readFilePaths()
+        self.file_paths = self.DatabaseFetcher.file_paths
+        self.num_files = self.DatabaseFetcher.num_files
+        fids = range(self.num_files) if fid is None else [fid]
+        for i in fids:
+            fg = self.file_paths[i]
+            if i < len(self.file_names):
+                self.file_names[i] = self.getFileGroupName(fg)
+                self.file_sizes[i] = self.getFileGroupSize(fg)
+            else:
+                self.file_names.append(self.getFileGroupName(fg))
+                self.file_sizes.append(self.getFileGroupSize(fg))
+        # pins of MPR might be changed by new files
+        self.pinInfoDictCache = {}
+        self.testDataCache.clear()
+        # store is not used if it doesn't contain new files
+        self.DatabaseFetcher.openColumnarStore()
+        self.readSummary()
+        
+        
+    def readSummary(self):
+        '''
+        read sites, tests, bins and wafers from the connected database
+        '''
         self.containsWafer = any(map(lambda c: c>0, self.DatabaseFetcher.getWaferCount()))
+        self.isSampled = self.DatabaseFetcher.isSampled
         # for site/head selection
         self.availableSites = self.DatabaseFetcher.getSiteList()
         self.availableHeads = self.DatabaseFetcher.getHeadList()        
+        self.dutSelection = self.DatabaseFetcher.getDutSelection()
         # get all MPR test numbers
         self.testRecTypeDict = self.DatabaseFetcher.getTestRecordTypeDict()
         # wafer info
@@ -82,7 +181,22 @@ class DataInterface:
         self.completeWaferList = self.DatabaseFetcher.getWaferList()
         
         
+    @staticmethod
+    def getFileGroupName(fg: list[str]) -> str:
+        if len(fg) < 2:
+            return "\n".join(map(os.path.basename, fg))
+        return "\n".join(f"#{i+1} → {os.path.basename(e)}" for i, e in enumerate(fg))
+        
+        
+    @staticmethod
+    def getFileGroupSize(fg: list[str]) -> str:
+        if len(fg) < 2:
+            return "\n".join(map(get_file_size, fg))
+        return "\n".join(f"#{i+1} → {get_file_size(e)}" for i, e in enumerate(fg))
+        
+        
     def close(self):
+        self.testDataCache.clear()
         if self.dbConnected:
             # disconnect database
             self.DatabaseFetcher.closeDB()
@@ -104,7 +218,15 @@ class DataInterface:
         metaDataList.append(["File Size: ", *self.file_sizes ])
         # dut summary
         dutCntDict = self.DatabaseFetcher.getDUTCountDict()
-        metaDataList.append(["Yield: ", *[f"{100*p/(p+f) :.2f}%" if (p+f)!=0 else "?" for (p, f) in zip(dutCntDict["Pass"], dutCntDict["Failed"])] ])
+        if self.isSampled:
+            # yield of sampled parts is not the yield of the lot,
+            # use part counts of the tester instead
+            summaryCnt = self.DatabaseFetcher.getSummaryDUTCount()
+            metaDataList.append(["Yield (PCR): ", *[f"{100*p/t :.2f}%" if (t and p is not None) else "?" for (p, t) in zip(summaryCnt["Pass"], summaryCnt["Total"])] ])
+            metaDataList.append(["DUTs Tested (PCR): ", *[str(n) if n is not None else "?" for n in summaryCnt["Total"]] ])
+            metaDataList.append(["Yield (Sampled): ", *[f"{100*p/(p+f) :.2f}%" if (p+f)!=0 else "?" for (p, f) in zip(dutCntDict["Pass"], dutCntDict["Failed"])] ])
+        else:
+            metaDataList.append(["Yield: ", *[f"{100*p/(p+f) :.2f}%" if (p+f)!=0 else "?" for (p, f) in zip(dutCntDict["Pass"], dutCntDict["Failed"])] ])
         metaDataList.append(["DUTs Tested: ", *[str(n) for n in dutCntDict["Total"]] ])
         metaDataList.append(["DUTs Passed: ", *[str(n) for n in dutCntDict["Pass"]] ])
         metaDataList.append(["DUTs Failed: ", *[str(n) for n in dutCntDict["Failed"]] ])
@@ -112,6 +234,10 @@ class DataInterface:
         metaDataList.append(["DUTs Unknown: ", *[str(n) for n in dutCntDict["Unknown"]] ])
         # MIR Record data
         InfoDict = self.DatabaseFetcher.getFileInfo()
+        sampleDesc = InfoDict.pop("SAMPLED", ())
+        if sampleDesc:
+            # at the top, so it won't be missed
+            metaDataList.insert(0, ["Sampled Session: ", *[v if v is not None else "Full" for v in sampleDesc] ])
         for fn in mirFieldNames:
             value: tuple = InfoDict.pop(fn, ())
             if value == (): 
@@ -201,14 +327,14 @@ class DataInterface:
         calculate Cpk of given testTuple from all heads/sites/files
         '''
         cpkList = []
-        for fid, head, site in itertools.product(range(self.num_files), 
-                                                 self.availableHeads, 
-                                                 self.availableSites):
-            testData = self.getTestDataFromHeadSite(testTuple, 
-                                                    [head], 
-                                                    [site], 
-                                                    fid)
-            cpkList.append(testData.get("Cpk", np.nan))
+        for fid in range(self.num_files):
+            # test is read once per file
+            headSiteData = self.getTestDataFromHeadSites(testTuple, 
+                                                         self.availableHeads, 
+                                                         self.availableSites, 
+                                                         fid)
+            for head, site in itertools.product(self.availableHeads, self.availableSites):
+                cpkList.append(headSiteData[(head, site)].get("Cpk", np.nan))
         return cpkList
     
     
@@ -225,7 +351,8 @@ class DataInterface:
         `TEST_NAME` / `TEST_NUM` / `flagList` / 
         `LLimit` / `HLimit` / `Unit` / `dataList` / `DUTIndex` / 
         `LSpec` / `HSpec` / `OPT_Flag` / `VECT_NAM` / `SEQ_NAME`
-        `Min` / `Max` / `Median` / `Mean` / `SDev` / `Cpk`
+        `Min` / `Max` / `Median` / `Mean` / `SDev` / `Cpk` / 
+        `P1` / `P99` / `RobustSDev`
         '''
         outData = {}
         if len(testInfo) == 0 or len(testData) == 0:
@@ -281,8 +408,9 @@ class DataInterface:
                 outData["CHAN_NAM"] = ";".join([cn for cn in ChanNames if cn != ""])
                 outData["LOG_NAM"] = LOG_NAM_list[dataIndex]
                 outData["PHY_NAM"] = PHY_NAM_list[dataIndex]
-                outData["dataList"] = testData["dataList"][dataIndex]
-                outData["stateList"] = testData["stateList"][dataIndex]
+                # a row view keeps all pins of the MPR alive in the cache
+                outData["dataList"] = testData["dataList"][dataIndex].copy()
+                outData["stateList"] = testData["stateList"][dataIndex].copy()
             except (ValueError, IndexError) as e:
                 outData["CHAN_NAM"] = ""
                 outData["LOG_NAM"] = ""
@@ -318,13 +446,21 @@ class DataInterface:
         if outData["dataList"].size > 0 and not np.all(np.isnan(outData["dataList"])):
             outData["Min"] = np.nanmin(outData["dataList"])
             outData["Max"] = np.nanmax(outData["dataList"])
-            outData["Median"] = np.nanmedian(outData["dataList"])
+            # one partition for all percentiles
+            P1, P25, Median, P75, P99 = np.nanpercentile(outData["dataList"], [1, 25, 50, 75, 99])
+            outData["Median"] = Median
+            outData["P1"] = P1
+            outData["P99"] = P99
+            outData["RobustSDev"] = (P75 - P25) / IQR_PER_SIGMA
         else:
             # functions above throw error on empty array,
             # manually set to nan
             outData["Min"] = np.nan
             outData["Max"] = np.nan
             outData["Median"] = np.nan
+            outData["P1"] = np.nan
+            outData["P99"] = np.nan
+            outData["RobustSDev"] = np.nan
                 
         outData["Mean"], outData["SDev"], outData["Cpk"] = calc_cpk(outData["LLimit"], 
                                                                     outData["HLimit"], 
@@ -344,6 +480,13 @@ class DataInterface:
         return a dictionary contains:
         see `testDataProcessCore`
         '''
+        cacheKey = self.getTestDataCacheKey(testTuple, selectHeads, selectSites, FileID)
+        maxCacheSize = getSetting().gen.data_cache_size * 2**20
+        if maxCacheSize > 0:
+            cached = self.testDataCache.get(cacheKey)
+            if cached is not None:
+                return cached
+        
         # testID -> (test_num, test_name)
         testID = (testTuple[0], testTuple[-1])
         testInfo = self.DatabaseFetcher.getTestInfo(testID, FileID)
@@ -357,9 +500,141 @@ class DataInterface:
         testData = self.DatabaseFetcher.getTestDataFromHeadSite(testID, 
                                                                 selectHeads, 
                                                                 selectSites, 
-                                                                FileID)
+                                                                FileID, 
+                                                                self.getSelectedDuts(selectHeads, selectSites, FileID))
         
-        return self.testDataProcessCore(testTuple, testInfo, testData, FileID)
+        outData = self.testDataProcessCore(testTuple, testInfo, testData, FileID)
+        if maxCacheSize > 0:
+            self.testDataCache.put(cacheKey, outData, maxCacheSize)
+        return outData
+    
+    
+    def getTestDataFromHeadSites(self, testTuple: tuple, selectHeads:list[int], selectSites:list[int], FileID: int) -> dict:
+        '''
+        Get parsed data of the given testTuple of every (head, site) combination, 
+        the test is read once and split by duts of each (head, site)
+        
+        `testTuple`: contains test number, pin index (valid for MPR) and name, e.g. (1000, 1, "name")
+        `selectHeads`: list of selected STDF heads
+        `selectSites`: list of selected STDF sites
+        `FileID`: index of loaded files
+        
+        return a dictionary, key: (head, site), value: same as 
+        `getTestDataFromHeadSite(testTuple, [head], [site], FileID)`
+        '''
+        maxCacheSize = getSetting().gen.data_cache_size * 2**20
+        headSiteData = {}
+        pending = []
+        for head, site in itertools.product(selectHeads, selectSites):
+            cached = None
+            if maxCacheSize > 0:
+                cached = self.testDataCache.get(self.getTestDataCacheKey(testTuple, [head], [site], FileID))
+            if cached is None:
+                pending.append((head, site))
+            else:
+                headSiteData[(head, site)] = cached
+        if len(pending) == 0:
+            return headSiteData
+        
+        testID = (testTuple[0], testTuple[-1])
+        testInfo = self.DatabaseFetcher.getTestInfo(testID, FileID)
+        if len(testInfo) == 0:
+            headSiteData.update({hs: {} for hs in pending})
+            return headSiteData
+        pendingHeads = sorted(set(h for h, _ in pending))
+        pendingSites = sorted(set(s for _, s in pending))
+        testData = self.DatabaseFetcher.getTestDataFromHeadSite(testID, 
+                                                                pendingHeads, 
+                                                                pendingSites, 
+                                                                FileID, 
+                                                                self.getSelectedDuts(pendingHeads, pendingSites, FileID))
+        for head, site in pending:
+            headSiteInfo = dict(testInfo)
+            if testInfo["recHeader"] == REC.MPR:
+                headSiteInfo["HeadSite"] = set([(head, site)])
+            # selected data is a copy, Inf can be replaced in place
+            outData = self.testDataProcessCore(testTuple, 
+                                               headSiteInfo, 
+                                               selectDuts(testData, self.getSelectedDuts([head], [site], FileID)), 
+                                               FileID)
+            if maxCacheSize > 0:
+                self.testDataCache.put(self.getTestDataCacheKey(testTuple, [head], [site], FileID), outData, maxCacheSize)
+            headSiteData[(head, site)] = outData
+        return headSiteData
+    
+    
+    @staticmethod
+    def getTestDataCacheKey(testTuple: tuple, selectHeads:list[int], selectSites:list[int], FileID: int) -> tuple:
+        # settings that change the processed data are part of the key,
+        # presentation settings, e.g. float format, are applied later
+        return (testTuple, tuple(selectHeads), tuple(selectSites), FileID, getSetting().gen.hide_inf)
+    
+    
+    def getSelectedDuts(self, selectHeads: list[int], selectSites: list[int], FileID: int) -> np.ndarray:
+        '''
+        return sorted DUTIndex of valid duts in `selectHeads` 
+        and `selectSites` (-1 for all sites) of `FileID`
+        '''
+        allSites = -1 in selectSites
+        selected = [duts for (fid, head, site), duts in self.dutSelection.items() 
+                    if fid == FileID and head in selectHeads and (site in selectSites or (allSites and site >= 0))]
+        if len(selected) == 0:
+            return np.array([], dtype=np.uint32)
+        elif len(selected) == 1:
+            return selected[0]
+        return np.sort(np.concatenate(selected))
+    
+    
+    def getTestDataCacheInfo(self) -> dict:
+        '''
+        return hit / miss counts, number of entries 
+        and size in bytes of the test data cache
+        '''
+        return {"Hits": self.testDataCache.hits, 
+                "Misses": self.testDataCache.misses, 
+                "Entries": len(self.testDataCache.entries), 
+                "Size": self.testDataCache.size}
+    
+    
+    def getTestSummaryFromHeadSite(self, testTuple: tuple, selectHeads:list[int], selectSites:list[int], FileID: int) -> dict:
+        '''
+        Get statistics of a PTR from the summary generated in parsing, test data is not read
+        
+        `testTuple`: contains test number, pin index (valid for MPR) and name, e.g. (1000, 1, "name")
+        `selectHeads`: list of selected STDF heads
+        `selectSites`: list of selected STDF sites
+        `FileID`: index of loaded files
+        
+        return a dictionary contains:
+        test info from DatabaseFetcher `getTestInfo` and
+        `FailCount` / `Min` / `Max` / `Median` / `Mean` / `SDev` / `Cpk` / 
+        `P1` / `P99` / `RobustSDev`, percentiles are estimated
+        
+        empty dict is returned if the summary cannot replace 
+        `getTestDataFromHeadSite`, e.g. Inf is not hidden
+        '''
+        testID = (testTuple[0], testTuple[-1])
+        stats = self.DatabaseFetcher.getTestStatsFromHeadSite(testID, 
+                                                              selectHeads, 
+                                                              selectSites, 
+                                                              FileID)
+        # Inf is replaced by float32 max/min before calculation
+        if len(stats) == 0 or (stats["InfCount"] > 0 and not getSetting().gen.hide_inf):
+            return {}
+        testInfo = self.DatabaseFetcher.getTestInfo(testID, FileID)
+        if len(testInfo) == 0:
+            return {}
+        
+        outData = {}
+        outData.update(testInfo)
+        outData["TEST_NAME_ORIG"] = testTuple[-1]
+        for key in ["FailCount", "Min", "Max", "Median", "Mean", "SDev", "P1", "P99", "RobustSDev"]:
+            outData[key] = stats[key]
+        outData["Cpk"] = calc_cpk_from_stats(outData["LLimit"], 
+                                             outData["HLimit"], 
+                                             outData["Mean"], 
+                                             outData["SDev"])
+        return outData
     
     
     def getTestDataFromDutIndex(self, testTuple: tuple, selectedDutIndex: list, FileID: int) -> dict:
@@ -546,7 +821,7 @@ class DataInterface:
         ## HHeader
         hHeaderLabels = ["Test Name", "Unit", "Low Limit", "High Limit", 
                         "Fail Num", "Cpk", "Average", "Median", 
-                        "St. Dev.", "Min", "Max"]
+                        "St. Dev.", "Min", "Max", "P1", "P99", "Robust St. Dev."]
         # if MPR or FTR is in selected tests, add columns for them as well
         testRecTypes = set([self.testRecTypeDict[ (test_num, test_name) ] for test_num, _, test_name in testTuples])
         containsFTR = REC.FTR in testRecTypes
@@ -560,9 +835,22 @@ class DataInterface:
         
         # TODO Configurable order of rows?
         default_order = [testTuples, selectHeads, selectSites, range(self.num_files)]
-        floatFormat = getSetting().getFloatFormat()
+        settings = getSetting()
+        floatFormat = settings.getFloatFormat()
+        # data of all heads and sites of (testTup, fid), read 
+        # once if statistics cannot be read from summary
+        headSiteData = {}
         for testTup, head, site, fid in itertools.product(*default_order):
-            testDataDict = self.getTestDataFromHeadSite(testTup, [head], [site], fid)
+            testDataDict = {}
+            # PTR statistics can be read from summary
+            if not settings.gen.exact_stats and self.testRecTypeDict[ (testTup[0], testTup[-1]) ] == REC.PTR:
+                testDataDict = self.getTestSummaryFromHeadSite(testTup, [head], [site], fid)
+            if not testDataDict:
+                if (testTup, fid) not in headSiteData:
+                    # previous tests are no longer needed
+                    headSiteData = {key: d for key, d in headSiteData.items() if key[0] == testTup}
+                    headSiteData[(testTup, fid)] = self.getTestDataFromHeadSites(testTup, selectHeads, selectSites, fid)
+                testDataDict = headSiteData[(testTup, fid)][(head, site)]
             # if current file doesn't have testID, 
             # `testDataDict` will be emtpy
             if testDataDict:
@@ -578,13 +866,17 @@ class DataInterface:
                         testDataDict["Unit"],
                         "N/A" if np.isnan(testDataDict["LLimit"]) else floatFormat % testDataDict["LLimit"],
                         "N/A" if np.isnan(testDataDict["HLimit"]) else floatFormat % testDataDict["HLimit"],
-                        "%d" % list(map(isPass, testDataDict["flagList"])).count(False),
+                        "%d" % (testDataDict["FailCount"] if "FailCount" in testDataDict 
+                                else list(map(isPass, testDataDict["flagList"])).count(False)),
                         CpkString,
                         floatFormat % testDataDict["Mean"],
                         floatFormat % testDataDict["Median"],
                         floatFormat % testDataDict["SDev"],
                         floatFormat % testDataDict["Min"],
-                        floatFormat % testDataDict["Max"]]
+                        floatFormat % testDataDict["Max"],
+                        floatFormat % testDataDict["P1"],
+                        floatFormat % testDataDict["P99"],
+                        floatFormat % testDataDict["RobustSDev"]]
                 # match the elements of hHeader
                 if containsFTR:
                     row[1:1] = [testDataDict["VECT_NAM"]] if testDataDict["recHeader"] == REC.FTR else [""]
@@ -743,11 +1035,17 @@ class DataInterface:
         '''
         data = {}
         testInfo = {}
+        headSiteData = {}
+        dynamicLimits = ({}, {})
         for fid, site in itertools.product(range(self.num_files), selectSites):
             sitesDict = data.setdefault(fid, {})
             infoDict: dict = testInfo.setdefault(fid, {})
+            if fid not in headSiteData:
+                # test is read once per file and split by sites
+                headSiteData = {fid: self.getTestDataFromHeadSites(testTuple, [head], selectSites, fid)}
+                dynamicLimits = self.getDynamicLimitsOfSites(headSiteData[fid])
             # retrieve single site data only
-            test_site_fid = self.getTestDataFromHeadSite(testTuple, [head], [site], fid)
+            test_site_fid = headSiteData[fid][(head, site)]
             if len(test_site_fid) == 0:
                 # skip this site if no data
                 continue
@@ -768,13 +1066,9 @@ class DataInterface:
                 nestSiteData["stateList"] = test_site_fid.pop("stateList")[validMask]
             elif test_site_fid["recHeader"] == REC.PTR:
                 # dynamic limit
-                dyL, dyH = self.DatabaseFetcher.getDynamicLimits(test_site_fid["TEST_NUM"],
-                                                                 test_site_fid["TEST_NAME"],
-                                                                 nestSiteData["dutList"],
-                                                                 test_site_fid["LLimit"],
-                                                                 test_site_fid["HLimit"])
-                nestSiteData["dyLLimit"] = dyL
-                nestSiteData["dyHLimit"] = dyH
+                dyL, dyH = dynamicLimits
+                nestSiteData["dyLLimit"] = {d: dyL[d] for d in nestSiteData["dutList"]} if dyL else {}
+                nestSiteData["dyHLimit"] = {d: dyH[d] for d in nestSiteData["dutList"]} if dyH else {}
             # info that are same for all sites 
             # will be stored in testInfo
             infoDict.update(test_site_fid)
@@ -782,6 +1076,24 @@ class DataInterface:
         return {"TestInfo": testInfo, "Data": data}
 
 
+    def getDynamicLimitsOfSites(self, headSiteData: dict) -> tuple:
+        '''
+        return (dynamic llim dict, dynamic hlim dict) of 
+        duts (not NaN) of all sites in `headSiteData` of a PTR, 
+        limits are read in one query
+        '''
+        siteData = [d for d in headSiteData.values() if len(d) > 0]
+        if len(siteData) == 0 or siteData[0]["recHeader"] != REC.PTR:
+            return {}, {}
+        info = siteData[0]
+        dutList = np.concatenate([d["dutList"][~np.isnan(d["dataList"])] for d in siteData])
+        return self.DatabaseFetcher.getDynamicLimits(info["TEST_NUM"], 
+                                                     info["TEST_NAME"], 
+                                                     dutList, 
+                                                     info["LLimit"], 
+                                                     info["HLimit"])
+    
+    
     def getBinChartData(self, head: int, site: int) -> dict:
         '''
         Get single-head, single-site HBIN & SBIN data from all files
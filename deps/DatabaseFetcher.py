@@ -4,7 +4,7 @@
 # Author: noonchen - chennoon233@foxmail.com
 # Created Date: May 15th 2021
 # -----
-# Last Modified: Sun Dec 11 2022
+# Last Modified: Sun Oct 18 2026
 # Modified By: noonchen
 # -----
 # Copyright (c) 2021 noonchen
@@ -24,7 +24,9 @@
 
 import sqlite3
 import numpy as np
-from deps.SharedSrc import REC, record_name_dict, DUT_SUMMARY_QUERY, DATALOG_QUERY
+import rust_stdf_helper
+from deps.ColumnarStore import ColumnarStore
+from deps.SharedSrc import REC, record_name_dict, DUT_SUMMARY_QUERY, DATALOG_QUERY, IQR_PER_SIGMA
 
 
 commaJoin = lambda numList: ",".join(map(str, numList))
@@ -45,26 +47,119 @@ def tryDecode(b: bytes) -> str:
         return b.decode(errors="replace")
 
 
+def decodeMPRArrays(rows: list, dtype) -> np.ndarray:
+    '''
+    Decode `RTN_RSLT` or `RTN_STAT` of MPR rows into a 2D array, 
+    row: dut, col: pmr.
+    
+    New sessions store little-endian BLOBs, which are decoded 
+    at once if all rows have the same length, older sessions 
+    store hex strings that must be parsed row by row.
+    '''
+    if rows and all(isinstance(r, bytes) for r in rows) and len(set(map(len, rows))) == 1:
+        # bytearray keeps the result writable
+        return np.frombuffer(bytearray().join(rows), dtype=np.dtype(dtype).newbyteorder("<")).reshape(len(rows), -1)
+    
+    return np.array([np.frombuffer(r, dtype=np.dtype(dtype).newbyteorder("<")) 
+                     if isinstance(r, bytes) 
+                     else np.frombuffer(bytearray.fromhex(r), dtype=dtype) 
+                     for r in rows])
+
+
+def selectDuts(testData: dict, duts: np.ndarray) -> dict:
+    '''
+    Keep data of `duts` in test data of `getTestDataFromHeadSite`, 
+    2D arrays of MPR are selected by column (dut).
+    '''
+    sel = np.isin(testData["dutList"], duts, assume_unique=True)
+    return {k: v[:, sel] if v.ndim == 2 else v[sel] for k, v in testData.items()}
+
+
+def digestQuantiles(centroids: np.ndarray, minVal: float, maxVal: float, qs: list) -> np.ndarray:
+    '''
+    Estimate quantiles `qs` (0 ~ 1) from t-digest centroids (mean, weight) 
+    of one or more digests, the result equals `np.percentile` if all 
+    centroids are single values.
+    '''
+    centroids = centroids[np.argsort(centroids[:, 0], kind="stable")]
+    means, weights = centroids[:, 0], centroids[:, 1]
+    cumWeights = np.cumsum(weights)
+    total = cumWeights[-1]
+    # a single value is at index i, it is centered at i + 0.5
+    centers = cumWeights - weights / 2
+    return np.interp(np.asarray(qs) * (total - 1) + 0.5, 
+                     np.concatenate([[0], centers, [total]]), 
+                     np.concatenate([[minVal], means, [maxVal]]))
+
+
 class DatabaseFetcher:
     def __init__(self):
         self.connection = None
         self.cursor = None
+        self.dbPath = ""
+        # per test PTR data, optional
+        self.columnStore = None
         self.file_paths = []
+        self.hasTestStats = False
+        self.isSampled = False
     
     
     def connectDB(self, dataBasePath: str):
         self.closeDB()
+        self.dbPath = dataBasePath
         self.connection = sqlite3.connect(dataBasePath)
         self.connection.text_factory = tryDecode
         self.cursor = self.connection.cursor()
         self.readFilePaths()
+        # sessions of older versions don't have Test_Stats
+        self.hasTestStats = self.cursor.execute('''SELECT
+                                                        COUNT(*)
+                                                    FROM
+                                                        sqlite_master
+                                                    WHERE
+                                                        type="table" AND name="Test_Stats"''').fetchone()[0] > 0
+        # quick look sessions only contain a sample of parts
+        self.isSampled = self.cursor.execute('''SELECT
+                                                    COUNT(*)
+                                                FROM
+                                                    File_Info
+                                                WHERE
+                                                    Field="SAMPLED"''').fetchone()[0] > 0
         
     
     def closeDB(self):
+        self.closeColumnarStore()
+        if self.dbPath:
+            rust_stdf_helper.close_test_data_connection(self.dbPath)
         if self.connection:
             self.connection.close()
         
     
+    def openColumnarStore(self):
+        '''
+        Memory map the columnar store of the connected database, 
+        the store is not used if it's written before files are appended
+        '''
+        if self.cursor is None: raise RuntimeError("No database is connected")
+        
+        self.closeColumnarStore()
+        store = ColumnarStore.open(self.dbPath)
+        if store is None:
+            return
+        dutCounts = dict(self.cursor.execute("SELECT Fid, COUNT(*) FROM Dut_Info GROUP BY Fid").fetchall())
+        numFiles, = self.cursor.execute("SELECT COUNT(*) FROM File_List").fetchone()
+        if store.isOutdated(dutCounts, numFiles):
+            store.close()
+        else:
+            self.columnStore = store
+        
+    
+    def closeColumnarStore(self):
+        if self.columnStore:
+            self.columnStore.close()
+            self.columnStore = None
+        
+    
     def readFilePaths(self):
         '''read file paths stored in the database'''
         if self.cursor is None: raise RuntimeError("No database is connected")
@@ -196,6 +291,31 @@ class DatabaseFetcher:
         return HeadList
     
     
+    def getDutSelection(self) -> dict:
+        '''
+        return a dict of valid duts (not superseded), 
+        key: (fid, head, site), value: sorted DUTIndex array (uint32)
+        '''
+        if self.cursor is None: raise RuntimeError("No database is connected")
+        
+        rows = self.cursor.execute('''SELECT 
+                                        Fid, HEAD_NUM, SITE_NUM, DUTIndex 
+                                    FROM 
+                                        Dut_Info 
+                                    WHERE 
+                                        Supersede=0 AND HEAD_NUM IS NOT NULL AND SITE_NUM IS NOT NULL''').fetchall()
+        if len(rows) == 0:
+            return {}
+        duts = np.array(rows, dtype=np.int64)
+        del rows
+        # sorted by (fid, head, site, DUTIndex), each key is a slice
+        duts = duts[np.lexsort(duts.T[::-1])]
+        keys, starts = np.unique(duts[:, :3], axis=0, return_index=True)
+        ends = np.append(starts[1:], len(duts))
+        return {(int(fid), int(head), int(site)): duts[start:end, 3].astype(np.uint32) 
+                for (fid, head, site), start, end in zip(keys, starts, ends)}
+    
+    
     def getPinNames(self, testNum:int, testName:str, isRTN=True):
         '''return test pin info of a MPR or FTR, fid is used as the 
         index of the nested list.
@@ -284,6 +404,12 @@ class DatabaseFetcher:
     def getBinStats(self, head, site, isHBIN=True):
         '''return a dict of bin num -> [count]'''
         if self.cursor is None: raise RuntimeError("No database is connected")
+        
+        if self.isSampled:
+            # sampled parts don't tell the real bin counts
+            BinStats = self.getSummaryBinStats(head, site, isHBIN)
+            if BinStats:
+                return BinStats
             
         BinStats = {}
         binType = "HBIN" if isHBIN else "SBIN"
@@ -311,6 +437,66 @@ class DatabaseFetcher:
         return BinStats
     
     
+    def getSummaryBinStats(self, head, site, isHBIN=True):
+        '''
+        return a dict of bin num -> [count] from HBR/SBR, 
+        per-site records of `head` are summed up if `site` is -1, 
+        records of HEAD_NUM 255 are used if there's no per-site records
+        '''
+        if self.cursor is None: raise RuntimeError("No database is connected")
+        
+        sql = '''SELECT 
+                    Fid, HEAD_NUM, SITE_NUM, BIN_NUM, BIN_CNT 
+                FROM 
+                    Bin_Counts 
+                WHERE 
+                    BIN_TYPE = ?'''
+        perSite = {}
+        allHeads = {}
+        for fid, head_num, site_num, bin_num, count in self.cursor.execute(sql, ["H" if isHBIN else "S"]):
+            if head_num == 255:
+                target = allHeads
+            elif head_num == head and (site == -1 or site_num == site):
+                target = perSite
+            else:
+                continue
+            countList = target.setdefault(bin_num, [0 for _ in range(self.num_files)])
+            countList[fid] += count
+        if perSite or site != -1:
+            return perSite
+        return allHeads
+    
+    
+    def getSummaryDUTCount(self) -> dict:
+        '''
+        return a dict of Literal[Total|Pass] -> [count] from PCR, 
+        count is None if a file doesn't have PCR
+        '''
+        if self.cursor is None: raise RuntimeError("No database is connected")
+        
+        perSite = {}
+        allHeads = {}
+        for fid, head_num, part_cnt, good_cnt in self.cursor.execute('''SELECT 
+                                                                        Fid, HEAD_NUM, PART_CNT, GOOD_CNT 
+                                                                    FROM 
+                                                                        Dut_Counts'''):
+            # GOOD_CNT 4294967295 is invalid
+            if good_cnt is None or good_cnt == 0xFFFFFFFF:
+                good_cnt = None
+            target = allHeads if head_num == 255 else perSite
+            total, good = target.get(fid, (0, 0))
+            target[fid] = (total + part_cnt, None if good is None or good_cnt is None else good + good_cnt)
+        
+        cntDict = {"Total": [None for _ in range(self.num_files)], 
+                   "Pass":  [None for _ in range(self.num_files)]}
+        for fid in range(self.num_files):
+            # prefer the summary of all heads
+            total, good = allHeads.get(fid, perSite.get(fid, (None, None)))
+            cntDict["Total"][fid] = total
+            cntDict["Pass"][fid] = good
+        return cntDict
+    
+    
     def getFileInfo(self):
         '''return field-value pair in File_Info table'''
         if self.cursor is None: raise RuntimeError("No database is connected")
@@ -498,12 +684,86 @@ class DatabaseFetcher:
         return testInfo
     
     
-    def getTestDataFromHeadSite(self, testTup: tuple, heads: list[int], sites: list[int], fileId: int) -> dict:
+    def getTestStatsFromHeadSite(self, testTup: tuple, heads: list[int], sites: list[int], fileId: int) -> dict:
+        '''
+        return statistics of PTR results merged from `Test_Stats` of heads & sites,
+        keys: `Count`   `Mean`  `SDev`  `Min`   `Max`   `FailCount` `NaNCount`  `InfCount`
+              `Median`  `P1`    `P99`   `RobustSDev`
+        
+        Only finite results are in statistics, percentiles are estimated from t-digests.
+        Empty dict is returned if the test is not a PTR or
+        the session doesn't have `Test_Stats`.
+        '''
+        if self.cursor is None: raise RuntimeError("No database is connected")
+        if not self.hasTestStats: return {}
+        
+        head_condition = f" AND s.HEAD_NUM IN ({commaJoin(heads)})"
+        if -1 in sites:
+            site_condition = " AND s.SITE_NUM >= 0"
+        else:
+            site_condition = f" AND s.SITE_NUM IN ({commaJoin(sites)})"
+        rows = self.cursor.execute(f'''SELECT
+                                            s.Count, s.Shift, s.Sum, s.SumSq, s.Min, s.Max,
+                                            s.FailCount, s.NaNCount, s.InfCount, s.Digest
+                                        FROM
+                                            Test_Stats s
+                                        JOIN
+                                            Test_Info t ON s.TEST_ID = t.TEST_ID
+                                        WHERE
+                                            t.Fid=? AND t.TEST_NUM=? AND t.TEST_NAME=? AND t.recHeader=?{head_condition}{site_condition}''',
+                                        [fileId, *testTup, REC.PTR]).fetchall()
+        if not rows:
+            return {}
+        
+        # merge (count, mean, M2) of each (head, site), M2 is the
+        # sum of squared deviations, see Chan's parallel algorithm
+        count, mean, m2 = 0, 0.0, 0.0
+        minVal, maxVal = np.inf, -np.inf
+        failCount, nanCount, infCount = 0, 0, 0
+        digests = []
+        for cnt, shift, s, ss, mn, mx, fcnt, ncnt, icnt, digest in rows:
+            failCount += fcnt
+            nanCount += ncnt
+            infCount += icnt
+            if cnt == 0:
+                continue
+            # sums are of (result - shift)
+            m = shift + s / cnt
+            q = max(ss - s * s / cnt, 0.0)
+            delta = m - mean
+            total = count + cnt
+            mean += delta * cnt / total
+            m2 += q + delta * delta * count * cnt / total
+            count = total
+            minVal = min(minVal, mn)
+            maxVal = max(maxVal, mx)
+            # little-endian f64 (mean, weight)
+            digests.append(np.frombuffer(digest, dtype="<f8").reshape(-1, 2))
+        
+        if count == 0:
+            mean, sdev, minVal, maxVal = np.nan, np.nan, np.nan, np.nan
+            P1, P25, Median, P75, P99 = [np.nan] * 5
+        else:
+            sdev = np.sqrt(m2 / count)
+            P1, P25, Median, P75, P99 = digestQuantiles(np.concatenate(digests), minVal, maxVal,
+                                                        [0.01, 0.25, 0.5, 0.75, 0.99])
+        return {"Count": count, "Mean": mean, "SDev": sdev,
+                "Min": minVal, "Max": maxVal, "FailCount": failCount,
+                "NaNCount": nanCount, "InfCount": infCount,
+                "Median": Median, "P1": P1, "P99": P99,
+                "RobustSDev": (P75 - P25) / IQR_PER_SIGMA}
+    
+    
+    def getTestDataFromHeadSite(self, testTup: tuple, heads: list[int], sites: list[int], fileId: int, validDuts: np.ndarray | None = None) -> dict:
         '''
         return a dict contains test data, the keys are different for PTR / MPR / FTR
         PTR:    `dutList`   `dataList`  `flagList` 
         MPR:    `dutList`   `dataList`  `flagList`  `stateList`
         FTR:    `dutList`               `flagList`
+        
+        if `validDuts` (DUTIndex of `heads` and `sites` that are not superseded) 
+        is given, the whole test is read and filtered in memory, instead of 
+        selecting duts of `heads` and `sites` in the query
         '''
         if self.cursor is None: raise RuntimeError("No database is connected")
         
@@ -528,12 +788,51 @@ class DatabaseFetcher:
             site_condition = " AND SITE_NUM >= 0"
         else:
             site_condition = f" AND SITE_NUM IN ({commaJoin(sites)})"
-        # only retrieve data from valid duts (not superseded)
-        dut_condition = f''' AND DUTIndex IN (SELECT 
-                                                DUTIndex 
-                                            FROM 
-                                                Dut_Info 
-                                            WHERE Supersede=0{head_condition}{site_condition})'''
+        
+        if recHeader == REC.PTR and self.columnStore is not None:
+            columns = self.columnStore.getTestData(testID)
+            if columns is not None:
+                # columns contain all duts of the test, including superseded duts
+                if validDuts is None:
+                    validDuts = np.array(self.cursor.execute(f'''SELECT 
+                                                                    DUTIndex 
+                                                                FROM 
+                                                                    Dut_Info 
+                                                                WHERE Fid={fileId} AND Supersede=0{head_condition}{site_condition}''').fetchall(), 
+                                         dtype=np.uint32).reshape(-1)
+                dutList, dataList, flagList = columns
+                # mapped columns are read only, selected data is a copy
+                return selectDuts({"dutList": dutList, 
+                                   "dataList": dataList, 
+                                   "flagList": flagList}, validDuts)
+        
+        # rows are read and converted to arrays natively, 
+        # MPR arrays that cannot be stacked are decoded below
+        if validDuts is None:
+            testData = rust_stdf_helper.fetch_test_data(self.dbPath, fileId, testID, recHeader, heads, sites)
+        else:
+            testData = rust_stdf_helper.fetch_test_data(self.dbPath, fileId, testID, recHeader)
+        
+        if testData is None:
+            testData = self.readTestData(testID, recHeader, fileId, head_condition, site_condition, validDuts is None)
+        return testData if validDuts is None else selectDuts(testData, validDuts)
+    
+    
+    def readTestData(self, testID: int, recHeader: int, fileId: int, head_condition: str, site_condition: str, filterDuts: bool) -> dict:
+        '''
+        Read test data of `testID` row by row, duts are selected by 
+        `head_condition` and `site_condition` of `fileId` if `filterDuts` is True
+        '''
+        if filterDuts:
+            # only retrieve data from valid duts (not superseded)
+            dut_condition = f''' AND DUTIndex IN (SELECT 
+                                                    DUTIndex 
+                                                FROM 
+                                                    Dut_Info 
+                                                WHERE Fid={fileId} AND Supersede=0{head_condition}{site_condition})'''
+        else:
+            dut_condition = ""
+        
         dutList = []
         dataList = []
         flagList = []
@@ -555,7 +854,7 @@ class DatabaseFetcher:
                     "flagList": np.array(flagList, dtype=np.uint8)}
         
         elif recHeader == REC.MPR:
-            for dutIndex, rslts_hex, stats_hex, flag in self.cursor.execute(f'''
+            for dutIndex, rslts, stats, flag in self.cursor.execute(f'''
                                                             SELECT
                                                                 DUTIndex, RTN_RSLT, RTN_STAT, TEST_FLAG
                                                             FROM
@@ -564,13 +863,13 @@ class DatabaseFetcher:
                                                             ORDER By DUTIndex
                                                             '''):
                 dutList.append(dutIndex)
-                dataList.append(np.frombuffer(bytearray.fromhex(rslts_hex), dtype=np.float32))
-                stateList.append(np.frombuffer(bytearray.fromhex(stats_hex), dtype=np.uint8))
+                dataList.append(rslts)
+                stateList.append(stats)
                 flagList.append(flag)
             return {"dutList": np.array(dutList, dtype=np.uint32), 
                     # after transpose, row: pmr, col: dutIndex
-                    "dataList": np.array(dataList).T, 
-                    "stateList": np.array(stateList).T,
+                    "dataList": decodeMPRArrays(dataList, np.float32).T, 
+                    "stateList": decodeMPRArrays(stateList, np.uint8).T,
                     "flagList": np.array(flagList, dtype=np.uint8)}
         
         else:
@@ -664,7 +963,10 @@ class DatabaseFetcher:
                 dataList = np.array([])
                 stateList = np.array([])
                 
-            for dutIndex, rslts_hex, stats_hex, flag in self.cursor.execute(f'''
+            arrayInds = []
+            rsltRows = []
+            statRows = []
+            for dutIndex, rslts, stats, flag in self.cursor.execute(f'''
                                                             SELECT
                                                                 DUTIndex, RTN_RSLT, RTN_STAT, TEST_FLAG
                                                             FROM
@@ -677,8 +979,12 @@ class DatabaseFetcher:
                 arrayInd = dutMap[dutIndex]
                 flagList[arrayInd] = flag
                 if mprRsltCnt > 0:
-                    dataList[arrayInd] = np.frombuffer(bytearray.fromhex(rslts_hex), dtype=np.float32)
-                    stateList[arrayInd] = np.frombuffer(bytearray.fromhex(stats_hex), dtype=np.uint8)
+                    arrayInds.append(arrayInd)
+                    rsltRows.append(rslts)
+                    statRows.append(stats)
+            if arrayInds:
+                dataList[arrayInds] = decodeMPRArrays(rsltRows, np.float32)
+                stateList[arrayInds] = decodeMPRArrays(statRows, np.uint8)
             return {"dutList": dutList, 
                     # after transpose, row: pmr, col: dutIndex
                     "dataList": dataList.T, 
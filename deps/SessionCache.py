@@ -0,0 +1,210 @@
+#
+# SessionCache.py - STDF Viewer
+#
+# Author: noonchen - chennoon233@foxmail.com
+# Created Date: October 18th 2026
+# -----
+# Last Modified: Sun Oct 18 2026
+# Modified By: noonchen
+# -----
+# Copyright (c) 2026 noonchen
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os, sys, json, uuid, shutil, sqlite3, hashlib, logging
+import rust_stdf_helper
+from deps.SharedSrc import validateSession
+from deps.ColumnarStore import getStorePath
+
+
+# bump this number whenever the database
+# layout generated by the parser is changed,
+# it is stored as `user_version` of a cached session
+CACHE_FORMAT_VERSION = 4
+# number and size of the blocks hashed in a file
+SAMPLE_COUNT = 8
+SAMPLE_SIZE = 64 * 1024
+
+logger = logging.getLogger("STDF Viewer")
+
+
+def getCacheFolder() -> str:
+    '''
+    Session databases of parsed files are stored in `logs/cache`,
+    they are not removed by the clean up of `logs/*.db` on exit.
+    '''
+    folder = os.path.join(sys.rootFolder, "logs", "cache")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def sampledHash(path: str, size: int) -> str:
+    '''
+    Hash `SAMPLE_COUNT` blocks evenly spaced in the file,
+    including the head and the tail, instead of the whole file.
+    '''
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        if size <= SAMPLE_COUNT * SAMPLE_SIZE:
+            h.update(f.read())
+        else:
+            step = (size - SAMPLE_SIZE) // (SAMPLE_COUNT - 1)
+            for i in range(SAMPLE_COUNT):
+                f.seek(i * step)
+                h.update(f.read(SAMPLE_SIZE))
+    return h.hexdigest()
+
+
+def fileIdentity(path: str) -> dict:
+    st = os.stat(path)
+    return {"path": os.path.abspath(path),
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "hash": sampledHash(path, st.st_size)}
+
+
+def getCacheKey(stdPaths: list[list[str]], idType, genIdx: bool, mprBlob: bool = False, profile: dict | None = None) -> str:
+    '''
+    Cache key of a load request, any change of the files,
+    the merge grouping, test identifier, ingest profile 
+    or parser version results in a different key.
+    '''
+    desc = {"format": CACHE_FORMAT_VERSION,
+            "parser": getattr(rust_stdf_helper, "__version__", ""),
+            "id_type": int(idType),
+            "index": bool(genIdx),
+            "mpr_blob": bool(mprBlob),
+            "profile": profile,
+            "groups": [[fileIdentity(p) for p in group] for group in stdPaths]}
+    return hashlib.sha256(json.dumps(desc, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def getCachePath(key: str) -> str:
+    return os.path.join(getCacheFolder(), f"{key}.db")
+
+
+def getPartialPath(key: str) -> str:
+    '''
+    Parser writes to this path, it is renamed to
+    the cache path after the session is complete.
+    '''
+    return os.path.join(getCacheFolder(), f"{key}.partial")
+
+
+def lookupCache(key: str) -> str | None:
+    '''
+    Return the database path if `key` is cached,
+    the entry is marked as recently used.
+    '''
+    dbPath = getCachePath(key)
+    if not os.path.isfile(dbPath):
+        return None
+
+    valid, msg = validateSession(dbPath, CACHE_FORMAT_VERSION)
+    if not valid:
+        logger.warning(f"Invalid cached session is removed: {msg}")
+        removeCacheEntry(dbPath)
+        return None
+    # mtime is used as the last access time of LRU
+    os.utime(dbPath)
+    return dbPath
+
+
+def stampCacheVersion(dbPath: str):
+    '''
+    Write `CACHE_FORMAT_VERSION` to a complete session 
+    before it is published to the cache.
+    '''
+    con = sqlite3.connect(dbPath)
+    try:
+        con.execute(f"PRAGMA user_version = {CACHE_FORMAT_VERSION}")
+        con.commit()
+    finally:
+        con.close()
+
+
+def getEntryFiles(dbPath: str) -> list[str]:
+    '''
+    Files of a cached session, including WAL files 
+    left by readers and the columnar store.
+    '''
+    return [dbPath, dbPath + "-wal", dbPath + "-shm", getStorePath(dbPath)]
+
+
+def removeCacheEntry(dbPath: str):
+    for p in getEntryFiles(dbPath):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def detachFromCache(dbPath: str) -> str:
+    '''
+    Return a copy of `dbPath` outside of the cache folder if it is 
+    a cached session, a cached session must not be modified.
+    '''
+    if os.path.dirname(os.path.abspath(dbPath)) != os.path.abspath(getCacheFolder()):
+        return dbPath
+    newPath = os.path.join(sys.rootFolder, "logs", f"{uuid.uuid4().hex}.db")
+    shutil.copyfile(dbPath, newPath)
+    return newPath
+
+
+def evictCache(maxSizeMB: int, keep: set[str] = set()):
+    '''
+    Remove least recently used sessions until the cache folder
+    is no larger than `maxSizeMB`, sessions in `keep` are never removed.
+    '''
+    folder = getCacheFolder()
+    keep = set(os.path.abspath(p) for p in keep)
+    entries = []
+    for f in os.listdir(folder):
+        # sessions being generated are not `.db` yet
+        if not f.endswith(".db"):
+            continue
+        p = os.path.abspath(os.path.join(folder, f))
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        size = st.st_size
+        # WAL files and columnar store are evicted with its session
+        for ep in getEntryFiles(p)[1:]:
+            if os.path.isfile(ep):
+                size += os.path.getsize(ep)
+        entries.append((st.st_mtime, size, p))
+
+    total = sum(size for _, size, _ in entries)
+    limit = max(maxSizeMB, 0) * 2**20
+    # oldest first
+    for _, size, p in sorted(entries):
+        if total <= limit:
+            break
+        if p in keep:
+            continue
+        try:
+            os.remove(p)
+            total -= size
+        except OSError:
+            # might be opened by others
+            continue
+        for ep in getEntryFiles(p)[1:]:
+            try:
+                os.remove(ep)
+            except OSError:
+                pass
+
+
+__all__ = ["getCacheKey", "getCachePath", "getPartialPath", "lookupCache", "stampCacheVersion", "removeCacheEntry", "detachFromCache", "evictCache"]
@@ -4,14 +4,14 @@
 # Author: noonchen - chennoon233@foxmail.com
 # Created Date: November 5th 2022
 # -----
-# Last Modified: Fri Oct 10 2025
+# Last Modified: Sun Oct 18 2026
 # Modified By: noonchen
 # -----
 # Copyright (c) 2022 noonchen
 # <<licensetext>>
 #
 
-import io, os, sys, logging, datetime
+import io, os, sys, json, logging, datetime
 import subprocess, platform, sqlite3
 import numpy as np
 import tomlkit, tomllib
@@ -109,6 +109,15 @@ class GeneralConfig(BaseModel):
     hide_inf: bool = Field(True, alias="Hide Infinite Value")
     vert_bar: bool = Field(False, alias="Vertical BarGraph")
     gen_db_idx: bool = Field(False, alias="Create DB Index")
+    mpr_blob: bool = Field(False, alias="Store MPR As Binary")
+    cache_size: int = Field(2048, alias="Parse Cache Size (MB)")    # 0 disables the cache, config file only
+    follow_interval: float = Field(2.0, alias="Follow Poll Interval (s)")
+    summary_first: int = Field(512, alias="Summary First Size (MB)")    # summary records are shown first for larger files, 0 disables
+    progressive: bool = Field(False, alias="Progressive Loading")    # browse committed parts while parsing, sessions are not cached
+    exact_stats: bool = Field(False, alias="Exact Test Statistics")    # read raw data instead of Test_Stats and digests
+    mmap_reader: bool = Field(True, alias="Memory Mapped Reading")    # uncompressed files are read by memory mapping
+    columnar_store: bool = Field(False, alias="Columnar Test Store")    # PTR data is also stored per test next to the session
+    data_cache_size: int = Field(512, alias="Test Data Cache Size (MB)")    # processed test data kept in memory, 0 disables
     file_symbols: dict[int, str] = Field(
         default_factory=lambda: {0: "o"},
         alias="File Symbols (Scatter Points)"
@@ -136,12 +145,47 @@ class GeneralConfig(BaseModel):
         return {str(k): v for k, v in v.items()}
 
 
+class IngestProfileConfig(BaseModel):
+    skip_records: list[str] = Field(default_factory=list, alias="Skip Records")    # record types, e.g. FTR, MPR
+    include_tests: str = Field("", alias="Include Test Numbers")    # e.g. 1000-1999, 3000; empty for all tests
+    exclude_tests: str = Field("", alias="Exclude Test Numbers")
+    include_names: str = Field("", alias="Include Test Names (Regex)")
+    exclude_names: str = Field("", alias="Exclude Test Names (Regex)")
+    sites: str = Field("", alias="Site Whitelist")     # e.g. 0, 1; empty for all sites
+    sample_every: int = Field(10, alias="Quick Look Every Nth Part")    # parts kept per head/site in quick look
+    sample_fraction: float = Field(0.0, alias="Quick Look Fraction")    # 0 ~ 1, random parts instead of every Nth if > 0
+    
+    def get_profile(self, sampled: bool = False) -> dict | None:
+        '''
+        Profile for the parser, None if nothing is filtered, 
+        raises ValueError if numbers are invalid. 
+        
+        Parts are sampled if `sampled` is True (quick look)
+        '''
+        profile = {"skip_records": list(self.skip_records), 
+                   "include_tests": parseNumberRanges(self.include_tests), 
+                   "exclude_tests": parseNumberRanges(self.exclude_tests), 
+                   "include_names": self.include_names, 
+                   "exclude_names": self.exclude_names, 
+                   "sites": [site for lo, hi in parseNumberRanges(self.sites, 255) 
+                             for site in range(lo, hi + 1)]}
+        if sampled:
+            if not 0 <= self.sample_fraction <= 1:
+                raise ValueError(f"Quick look fraction must be in [0, 1], got {self.sample_fraction}")
+            profile["sample_every"] = max(self.sample_every, 1)
+            profile["sample_fraction"] = self.sample_fraction
+        if not any(profile.values()):
+            return None
+        return profile
+
+
 class SettingParams(BaseModel):
     gen: GeneralConfig = Field(default_factory=GeneralConfig, alias="General")
     trend: TrendPlotConfig = Field(default_factory=TrendPlotConfig, alias="Trend Plot")
     histo: HistoPlotConfig = Field(default_factory=HistoPlotConfig, alias="Histo Plot")
     ppqq: PPQQPlotConfig = Field(default_factory=PPQQPlotConfig, alias="PP/QQ Plot")
     color: ColorSettingConfig = Field(default_factory=ColorSettingConfig, alias="Color Setting")
+    ingest: IngestProfileConfig = Field(default_factory=IngestProfileConfig, alias="Ingest Profile")
 
     class Config:
         validate_by_name = True  # allow dumping with field names
@@ -152,6 +196,7 @@ class SettingParams(BaseModel):
         self.trend = new.trend
         self.histo = new.histo
         self.ppqq = new.ppqq
+        self.ingest = new.ingest
         # need to merge instead of replacing
         self.color.site_colors.update(new.color.site_colors)
         self.color.sbin_colors.update(new.color.sbin_colors)
@@ -467,6 +512,10 @@ def init_logger(rootFolder):
     _ = [os.remove(allLogFiles[i]) for i in range(len(allLogFiles)-5)] if len(allLogFiles) > 5 else []
 
 
+# interquartile range of normal distribution in sigma
+IQR_PER_SIGMA = 1.3489795003921634
+
+
 def calc_cpk(L:float, H:float, data:np.ndarray) -> tuple:
     '''return mean, sdev and Cpk of given data series, 
     discarding np.nan values'''
@@ -475,9 +524,13 @@ def calc_cpk(L:float, H:float, data:np.ndarray) -> tuple:
     
     sdev = np.nanstd(data)
     mean = np.nanmean(data)
-    
-    if np.isnan(L) or np.isnan(H) or np.isinf(sdev):
-        return mean, sdev, np.nan
+    return mean, sdev, calc_cpk_from_stats(L, H, mean, sdev)
+
+
+def calc_cpk_from_stats(L:float, H:float, mean:float, sdev:float) -> float:
+    '''return Cpk of given mean and sdev'''
+    if np.isnan(mean) or np.isnan(L) or np.isnan(H) or np.isinf(sdev):
+        return np.nan
     
     T = H - L
     if sdev == 0:
@@ -487,7 +540,7 @@ def calc_cpk(L:float, H:float, data:np.ndarray) -> tuple:
         CP = T / (6 * sdev)
         # Ca = (mean - U) / (T/2)
         Cpk = CP - abs(mean - U)/(3 * sdev)
-    return mean, sdev, Cpk
+    return Cpk
 
 
 def deleteWidget(w2delete):
@@ -588,6 +641,25 @@ def wafer_direction_name(symbol: str) -> str:
     return direction_symbol.get(symbol, symbol)
 
 
+def parseNumberRanges(text: str, maxValue: int = 2**32 - 1) -> list[tuple[int, int]]:
+    '''
+    Parse "1000-1999, 3000" into [(1000, 1999), (3000, 3000)], 
+    raises ValueError if a number is invalid or out of [0, maxValue]
+    '''
+    ranges = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        lo, _, hi = item.partition("-")
+        lo = int(lo)
+        hi = int(hi) if hi.strip() else lo
+        if not (0 <= lo <= hi <= maxValue):
+            raise ValueError(f"Invalid range: {item}")
+        ranges.append((lo, hi))
+    return ranges
+
+
 def parseTestString(test_name_string: str, isWaferName: bool = False) -> tuple:
     '''
     Parse string from 
@@ -760,13 +832,55 @@ def showCompleteMessage(transFunc, outPath: str, title=None, infoText=None, icon
         openFileInOS(outPath)
     
 
-def validateSession(dbPath: str):
-    tableSet = set(["File_List", "File_Info", "Wafer_Info", "Dut_Info", "Dut_Counts", 
-                    "Test_Info", "PTR_Data", "MPR_Data", "FTR_Data", "Bin_Info", 
-                    "Pin_Map", "Pin_Info", "TestPin_Map", "Dynamic_Limits", "Datalog"])
+# table -> columns read by STDF Viewer, same as `rust_stdf_helper/src/database_context.rs`
+SESSION_SCHEMA = {
+    "File_List": ["Fid", "SubFid", "Filename", "Lot_ID", "Sublot_ID", "Product_ID", "Flow_ID"], 
+    "File_Info": ["Fid", "SubFid", "Field", "Value"], 
+    "Wafer_Info": ["Fid", "HEAD_NUM", "WaferIndex", "PART_CNT", "RTST_CNT", "ABRT_CNT", "GOOD_CNT", "FUNC_CNT", 
+                   "WAFER_ID", "FABWF_ID", "FRAME_ID", "MASK_ID", "USR_DESC", "EXC_DESC"], 
+    "Dut_Info": ["Fid", "HEAD_NUM", "SITE_NUM", "DUTIndex", "TestCount", "TestTime", "PartID", 
+                 "HBIN", "SBIN", "Flag", "WaferIndex", "XCOORD", "YCOORD", "Supersede"], 
+    "Dut_Counts": ["Fid", "HEAD_NUM", "SITE_NUM", "PART_CNT", "RTST_CNT", "ABRT_CNT", "GOOD_CNT", "FUNC_CNT"], 
+    "Bin_Counts": ["Fid", "HEAD_NUM", "SITE_NUM", "BIN_TYPE", "BIN_NUM", "BIN_CNT"], 
+    "Test_Info": ["Fid", "TEST_ID", "TEST_NUM", "recHeader", "TEST_NAME", "RES_SCAL", "LLimit", "HLimit", "Unit", 
+                  "OPT_FLAG", "FailCount", "RTN_ICNT", "RSLT_PGM_CNT", "LSpec", "HSpec", "VECT_NAM", "SEQ_NAME"], 
+    "Test_Stats": ["Fid", "TEST_ID", "HEAD_NUM", "SITE_NUM", "Count", "Shift", "Sum", "SumSq", 
+                   "Min", "Max", "FailCount", "NaNCount", "InfCount", "Digest"], 
+    "PTR_Data": ["DUTIndex", "TEST_ID", "RESULT", "TEST_FLAG"], 
+    "MPR_Data": ["DUTIndex", "TEST_ID", "RTN_RSLT", "RTN_STAT", "TEST_FLAG"], 
+    "FTR_Data": ["DUTIndex", "TEST_ID", "TEST_FLAG"], 
+    "Bin_Info": ["Fid", "BIN_TYPE", "BIN_NUM", "BIN_NAME", "BIN_PF"], 
+    "Pin_Map": ["Fid", "HEAD_NUM", "SITE_NUM", "PMR_INDX", "CHAN_TYP", "CHAN_NAM", "PHY_NAM", "LOG_NAM", "From_GRP"], 
+    "Pin_Info": ["Fid", "P_PG_INDX", "GRP_NAM", "GRP_MODE", "GRP_RADX", "PGM_CHAR", "PGM_CHAL", "RTN_CHAR", "RTN_CHAL"], 
+    "TestPin_Map": ["TEST_ID", "PMR_INDX", "PIN_TYPE"], 
+    "Dynamic_Limits": ["DUTIndex", "TEST_ID", "LLimit", "HLimit"], 
+    "Datalog": ["Fid", "RecordType", "Value", "AfterDUTIndex", "isBeforePRR"], 
+    "Follow_State": ["Fid", "isBeforePRR", "ProgramSections", "SampledParts"], 
+    "Session_Info": ["Field", "Value"], 
+    }
+# sessions saved by older versions don't have these tables, 
+# Follow_State only exists in sessions of followed files
+OPTIONAL_TABLES = set(["Bin_Counts", "Test_Stats", "Follow_State", "Session_Info"])
+
+
+def validateSession(dbPath: str, version: int | None = None):
+    '''
+    Check tables and columns of a session, a session of the parse cache
+    must have all tables except Follow_State, and its `user_version` 
+    must be `version`.
+    '''
+    if version is None:
+        required = set(SESSION_SCHEMA) - OPTIONAL_TABLES
+    else:
+        required = set(SESSION_SCHEMA) - set(["Follow_State"])
+    con = None
     try:
         con = sqlite3.connect(dbPath)
         cur = con.cursor()
+        if version is not None:
+            userVersion = cur.execute("PRAGMA user_version").fetchone()[0]
+            if userVersion != version:
+                return False, f"Mismatched cache version {userVersion}, expected {version}"
         currentTable = set([name 
                             for name,
                             in cur.execute('''SELECT 
@@ -775,13 +889,65 @@ def validateSession(dbPath: str):
                                                     sqlite_master 
                                                 WHERE 
                                                     type="table"''')])
-        diff = currentTable.difference(tableSet)
+        diff = currentTable.difference(SESSION_SCHEMA)
         if diff:
             return False, f"Mismatched tables {','.join(diff)}"
-        else:
-            return True, ""
+        missing = required.difference(currentTable)
+        if missing:
+            return False, f"Missing tables {','.join(missing)}"
+        for table in currentTable:
+            columns = set([row[1] for row in cur.execute(f"PRAGMA table_info({table})")])
+            missingCols = [c for c in SESSION_SCHEMA[table] if c not in columns]
+            if missingCols:
+                return False, f"Missing columns {','.join(missingCols)} in {table}"
+        return True, ""
     except Exception as e:
         return False, repr(e)
+    finally:
+        if con:
+            con.close()
+
+
+def writeSessionSettings(dbPath: str, idType: int, profile: dict | None):
+    '''
+    Save the test identifier and ingest profile a session 
+    is parsed with, files appended later must use the same
+    '''
+    con = sqlite3.connect(dbPath)
+    try:
+        con.execute('''CREATE TABLE IF NOT EXISTS Session_Info (
+                            Field TEXT PRIMARY KEY, 
+                            Value TEXT)''')
+        con.executemany("INSERT OR REPLACE INTO Session_Info VALUES (?, ?)", 
+                        [("ID_TYPE", str(int(idType))), 
+                         ("PROFILE", json.dumps(profile))])
+        con.commit()
+    finally:
+        con.close()
+
+
+def readSessionSettings(dbPath: str) -> tuple[int, dict | None] | None:
+    '''
+    Return (test identifier, ingest profile) of a session, 
+    `None` if the session is saved by older versions
+    '''
+    con = sqlite3.connect(dbPath)
+    try:
+        info = dict(con.execute("SELECT Field, Value FROM Session_Info").fetchall())
+    except sqlite3.OperationalError:
+        # no such table
+        return None
+    finally:
+        con.close()
+    if "ID_TYPE" not in info:
+        return None
+    profile = json.loads(info.get("PROFILE", "null"))
+    if profile:
+        # number ranges are tuples for the parser
+        for key in ["include_tests", "exclude_tests"]:
+            if key in profile:
+                profile[key] = [tuple(r) for r in profile[key]]
+    return int(info["ID_TYPE"]), profile
 
 
 __all__ = ["SettingParams", "tab", "REC", "symbolName", "symbolChar", "symbolChar2Name", 
@@ -792,10 +958,11 @@ __all__ = ["SettingParams", "tab", "REC", "symbolName", "symbolChar", "symbolCha
            "WHITE_COLOR", "FAIL_DUT_COLOR", "OVRD_DUT_COLOR", "UNKN_DUT_COLOR", 
            "FILE_FILTER", "DUT_SUMMARY_QUERY", "DATALOG_QUERY", "mirFieldNames", "mirDict", "isMac", 
            
-           "parseTestString", "isHexColor", "getProperFontColor", "init_logger", "runInQThread", 
+           "parseTestString", "parseNumberRanges", "isHexColor", "getProperFontColor", "init_logger", "runInQThread", 
            "loadFonts", "getLoadedFontNames", "rSymbol", "getIcon", "get_png_size", 
-           "calc_cpk", "deleteWidget", "isPass", "isValidSymbol", "pyqtGraphPlot2Bytes", 
+           "IQR_PER_SIGMA", "calc_cpk", "calc_cpk_from_stats", "deleteWidget", "isPass", "isValidSymbol", "pyqtGraphPlot2Bytes", 
            "showCompleteMessage", "rHEX", "get_file_size", "validateSession", 
+           "writeSessionSettings", "readSessionSettings", 
            
            "translate_const_dicts", "dut_flag_parser", "test_flag_parser", "return_state_parser", 
            "wafer_direction_name",
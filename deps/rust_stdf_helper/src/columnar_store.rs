@@ -0,0 +1,152 @@
+//
+// columnar_store.rs
+// Author: noonchen - chennoon233@foxmail.com
+// Created Date: October 18th 2026
+// -----
+// Last Modified: Sun Oct 18 2026
+// Modified By: noonchen
+// -----
+// Copyright (c) 2026 noonchen
+//
+
+//! PTR data of a session stored per test, next to the session database.
+//!
+//! All numbers are little-endian:
+//!
+//! | section | layout |
+//! | ------- | ------ |
+//! | header  | magic `[u8; 8]`, version `u32`, test count `u32`, file count `u32`, reserved `u32`, File_List rows `u64` |
+//! | files   | per Fid: Fid `u32`, reserved `u32`, dut count `u64` |
+//! | index   | per test: TEST_ID `u32`, reserved `u32`, dut count `u64`, offset `u64` |
+//! | columns | per test at `offset` (8-byte aligned): DUTIndex `[u32; n]`, RESULT `[f32; n]`, TEST_FLAG `[u8; n]` |
+//!
+//! DUTIndex of a test is sorted. DUTIndex restarts in every file,
+//! the dut count of each file and File_List rows tell if the store
+//! is outdated, e.g. files are appended or merged into a file.
+
+use crate::StdfHelperError;
+use memmap2::MmapMut;
+use rusqlite::Connection;
+use std::collections::HashMap;
+use std::fs::{self, OpenOptions};
+
+/// magic is written after all columns, a store
+/// that is not completely written is invalid
+pub const STORE_MAGIC: &[u8; 8] = b"STDFVCOL";
+pub const STORE_VERSION: u32 = 2;
+const HEADER_SIZE: usize = 32;
+const FILE_ENTRY_SIZE: usize = 16;
+const INDEX_ENTRY_SIZE: usize = 24;
+
+/// position of a test in the store
+struct TestColumn {
+    test_id: u32,
+    count: usize,
+    offset: usize,
+    filled: usize,
+}
+
+pub fn write_columnar_store(conn: &Connection, store_path: &str) -> Result<(), StdfHelperError> {
+    let rslt = write_store(conn, store_path);
+    if rslt.is_err() {
+        let _ = fs::remove_file(store_path);
+    }
+    rslt
+}
+
+fn write_store(conn: &Connection, store_path: &str) -> Result<(), StdfHelperError> {
+    let mut columns: Vec<TestColumn> = vec![];
+    {
+        let mut stmt = conn.prepare(
+            "SELECT TEST_ID, COUNT(*) FROM PTR_Data GROUP BY TEST_ID ORDER BY TEST_ID",
+        )?;
+        let mut rows = stmt.query([])?;
+        while let Some(row) = rows.next()? {
+            columns.push(TestColumn {
+                test_id: row.get(0)?,
+                count: row.get::<_, i64>(1)? as usize,
+                offset: 0,
+                filled: 0,
+            });
+        }
+    }
+    let mut dut_counts: Vec<(u32, u64)> = vec![];
+    {
+        let mut stmt =
+            conn.prepare("SELECT Fid, COUNT(*) FROM Dut_Info GROUP BY Fid ORDER BY Fid")?;
+        let mut rows = stmt.query([])?;
+        while let Some(row) = rows.next()? {
+            dut_counts.push((row.get(0)?, row.get::<_, i64>(1)? as u64));
+        }
+    }
+    let num_files: i64 = conn.query_row("SELECT COUNT(*) FROM File_List", [], |r| r.get(0))?;
+
+    let index_start = HEADER_SIZE + FILE_ENTRY_SIZE * dut_counts.len();
+    let mut store_size = index_start + INDEX_ENTRY_SIZE * columns.len();
+    for col in columns.iter_mut() {
+        store_size = (store_size + 7) & !7;
+        col.offset = store_size;
+        store_size += col.count * 9;
+    }
+    let fp = OpenOptions::new()
+        .read(true)
+        .write(true)
+        .create(true)
+        .truncate(true)
+        .open(store_path)?;
+    fp.set_len(store_size as u64)?;
+    let mut mmap = unsafe { MmapMut::map_mut(&fp)? };
+
+    for (i, (fid, count)) in dut_counts.iter().enumerate() {
+        let pos = HEADER_SIZE + i * FILE_ENTRY_SIZE;
+        mmap[pos..pos + 4].copy_from_slice(&fid.to_le_bytes());
+        mmap[pos + 8..pos + 16].copy_from_slice(&count.to_le_bytes());
+    }
+    for (i, col) in columns.iter().enumerate() {
+        let pos = index_start + i * INDEX_ENTRY_SIZE;
+        mmap[pos..pos + 4].copy_from_slice(&col.test_id.to_le_bytes());
+        mmap[pos + 8..pos + 16].copy_from_slice(&(col.count as u64).to_le_bytes());
+        mmap[pos + 16..pos + 24].copy_from_slice(&(col.offset as u64).to_le_bytes());
+    }
+
+    let lookup: HashMap<u32, usize> = columns
+        .iter()
+        .enumerate()
+        .map(|(i, col)| (col.test_id, i))
+        .collect();
+    {
+        // PTR_Data is clustered on (DUTIndex, TEST_ID), a sequential
+        // scan writes DUTIndex of every test in sorted order
+        let mut stmt = conn.prepare(
+            "SELECT DUTIndex, TEST_ID, RESULT, TEST_FLAG FROM PTR_Data ORDER BY DUTIndex, TEST_ID",
+        )?;
+        let mut rows = stmt.query([])?;
+        while let Some(row) = rows.next()? {
+            let col = match lookup.get(&row.get::<_, u32>(1)?) {
+                Some(&i) => &mut columns[i],
+                None => continue,
+            };
+            let (base, n, i) = (col.offset, col.count, col.filled);
+            if i >= n {
+                continue;
+            }
+            let dut: u32 = row.get(0)?;
+            // NaN is stored as NULL in sqlite
+            let rslt = row.get::<_, Option<f64>>(2)?.unwrap_or(f64::NAN) as f32;
+            let flag: u8 = row.get(3)?;
+            mmap[base + 4 * i..base + 4 * i + 4].copy_from_slice(&dut.to_le_bytes());
+            mmap[base + 4 * (n + i)..base + 4 * (n + i) + 4].copy_from_slice(&rslt.to_le_bytes());
+            mmap[base + 8 * n + i] = flag;
+            col.filled += 1;
+        }
+    }
+    mmap.flush()?;
+
+    mmap[8..12].copy_from_slice(&STORE_VERSION.to_le_bytes());
+    mmap[12..16].copy_from_slice(&(columns.len() as u32).to_le_bytes());
+    mmap[16..20].copy_from_slice(&(dut_counts.len() as u32).to_le_bytes());
+    mmap[24..32].copy_from_slice(&(num_files as u64).to_le_bytes());
+    mmap[0..8].copy_from_slice(STORE_MAGIC);
+    mmap.flush()?;
+    Ok(())
+}
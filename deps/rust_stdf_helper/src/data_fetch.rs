@@ -0,0 +1,216 @@
+//
+// data_fetch.rs
+// Author: noonchen - chennoon233@foxmail.com
+// Created Date: October 18th 2026
+// -----
+// Last Modified: Sun Oct 18 2026
+// Modified By: noonchen
+// -----
+// Copyright (c) 2026 noonchen
+//
+
+use crate::StdfHelperError;
+use lazy_static::lazy_static;
+use numpy::ndarray::Array2;
+use rusqlite::types::ValueRef;
+use rusqlite::{Connection, OpenFlags};
+use std::collections::HashMap;
+use std::sync::Mutex;
+
+lazy_static! {
+    /// dbpath -> read only connection, reused by every fetch
+    /// until the session is closed by `close_read_connection`
+    static ref READ_CONNECTIONS: Mutex<HashMap<String, Connection>> = Mutex::new(HashMap::new());
+}
+
+/// call `f` with the cached read only connection of `dbpath`,
+/// the session may be written by the parser in progressive loading
+pub fn with_read_connection<T, F>(dbpath: &str, f: F) -> Result<T, StdfHelperError>
+where
+    F: FnOnce(&Connection) -> Result<T, StdfHelperError>,
+{
+    let mut connections = READ_CONNECTIONS.lock().map_err(|e| StdfHelperError {
+        msg: e.to_string(),
+    })?;
+    if !connections.contains_key(dbpath) {
+        let conn = Connection::open_with_flags(
+            dbpath,
+            OpenFlags::SQLITE_OPEN_READ_ONLY | OpenFlags::SQLITE_OPEN_NO_MUTEX,
+        )?;
+        connections.insert(dbpath.to_string(), conn);
+    }
+    f(&connections[dbpath])
+}
+
+/// close the cached connection of `dbpath`, the file can be
+/// removed or replaced afterwards
+pub fn close_read_connection(dbpath: &str) {
+    if let Ok(mut connections) = READ_CONNECTIONS.lock() {
+        connections.remove(dbpath);
+    }
+}
+
+/// `recHeader` in Test_Info
+const REC_HEADER_PTR: u8 = 10;
+const REC_HEADER_MPR: u8 = 15;
+
+/// data of a test from valid duts, sorted by DUTIndex
+pub enum TestData {
+    Ptr {
+        duts: Vec<u32>,
+        data: Vec<f32>,
+        flags: Vec<u8>,
+    },
+    /// row: pmr, col: dut
+    Mpr {
+        duts: Vec<u32>,
+        data: Array2<f32>,
+        states: Array2<u8>,
+        flags: Vec<u8>,
+    },
+    Ftr {
+        duts: Vec<u32>,
+        flags: Vec<u8>,
+    },
+}
+
+/// an array of MPR in little-endian BLOB or hex string (older sessions)
+fn mpr_array_bytes(value: ValueRef) -> Result<Vec<u8>, StdfHelperError> {
+    match value {
+        ValueRef::Blob(b) => Ok(b.to_vec()),
+        ValueRef::Text(t) => hex::decode(t).map_err(|e| StdfHelperError {
+            msg: format!("Invalid MPR array: {}", e),
+        }),
+        _ => Err(StdfHelperError {
+            msg: "Invalid MPR array: not a BLOB or hex string".to_string(),
+        }),
+    }
+}
+
+/// stack arrays of duts into a 2D array, row: pmr, col: dut
+fn stack_mpr_arrays<T>(
+    values: Vec<T>,
+    num_duts: usize,
+    row_len: usize,
+) -> Result<Array2<T>, StdfHelperError> {
+    let arr = Array2::from_shape_vec((num_duts, row_len), values).map_err(|e| StdfHelperError {
+        msg: e.to_string(),
+    })?;
+    Ok(arr.reversed_axes())
+}
+
+/// query data of `test_id` from valid duts (not superseded)
+/// of `heads` and `sites` in file `fid`, -1 in `sites` means
+/// all sites. All duts of the test are returned if `head_site`
+/// is `None`, DUTIndex of other files are never matched since
+/// `test_id` is unique across files.
+///
+/// Returns `None` if MPR arrays cannot be stacked, e.g. no dut is
+/// found or the pin count is different between duts.
+pub fn fetch_test_data(
+    conn: &Connection,
+    fid: i64,
+    test_id: i64,
+    rec_header: u8,
+    head_site: Option<(&[i64], &[i64])>,
+) -> Result<Option<TestData>, StdfHelperError> {
+    let join = |l: &[i64]| {
+        l.iter()
+            .map(|x| x.to_string())
+            .collect::<Vec<String>>()
+            .join(",")
+    };
+    let dut_condition = match head_site {
+        Some((heads, sites)) => {
+            let site_condition = if sites.contains(&-1) {
+                "SITE_NUM >= 0".to_string()
+            } else {
+                format!("SITE_NUM IN ({})", join(sites))
+            };
+            format!(
+                " AND DUTIndex IN (SELECT DUTIndex FROM Dut_Info WHERE Fid={} AND Supersede=0 AND HEAD_NUM IN ({}) AND {})",
+                fid,
+                join(heads),
+                site_condition
+            )
+        }
+        None => String::new(),
+    };
+
+    let mut duts: Vec<u32> = vec![];
+    let mut flags: Vec<u8> = vec![];
+    match rec_header {
+        REC_HEADER_PTR => {
+            let mut data: Vec<f32> = vec![];
+            let mut stmt = conn.prepare(&format!(
+                "SELECT DUTIndex, RESULT, TEST_FLAG FROM PTR_Data
+                WHERE TEST_ID=?1{} ORDER By DUTIndex",
+                dut_condition
+            ))?;
+            let mut rows = stmt.query([test_id])?;
+            while let Some(row) = rows.next()? {
+                duts.push(row.get(0)?);
+                // NaN is stored as NULL in sqlite
+                data.push(row.get::<_, Option<f64>>(1)?.unwrap_or(f64::NAN) as f32);
+                flags.push(row.get(2)?);
+            }
+            Ok(Some(TestData::Ptr { duts, data, flags }))
+        }
+        REC_HEADER_MPR => {
+            let mut rslt: Vec<f32> = vec![];
+            let mut stat: Vec<u8> = vec![];
+            // (result count, state count) of the 1st dut
+            let mut row_lens: Option<(usize, usize)> = None;
+            let mut stmt = conn.prepare(&format!(
+                "SELECT DUTIndex, RTN_RSLT, RTN_STAT, TEST_FLAG FROM MPR_Data
+                WHERE TEST_ID=?1{} ORDER By DUTIndex",
+                dut_condition
+            ))?;
+            let mut rows = stmt.query([test_id])?;
+            while let Some(row) = rows.next()? {
+                let rslt_bytes = mpr_array_bytes(row.get_ref(1)?)?;
+                let stat_bytes = mpr_array_bytes(row.get_ref(2)?)?;
+                let lens = (rslt_bytes.len() / 4, stat_bytes.len());
+                match row_lens {
+                    None => row_lens = Some(lens),
+                    Some(l) if l != lens => return Ok(None),
+                    _ => {}
+                }
+                rslt.extend(
+                    rslt_bytes
+                        .chunks_exact(4)
+                        .map(|b| f32::from_le_bytes([b[0], b[1], b[2], b[3]])),
+                );
+                stat.extend(stat_bytes);
+                duts.push(row.get(0)?);
+                flags.push(row.get(3)?);
+            }
+            let (rslt_len, stat_len) = match row_lens {
+                Some(l) => l,
+                None => return Ok(None),
+            };
+            let num_duts = duts.len();
+            let data = stack_mpr_arrays(rslt, num_duts, rslt_len)?;
+            let states = stack_mpr_arrays(stat, num_duts, stat_len)?;
+            Ok(Some(TestData::Mpr {
+                duts,
+                data,
+                states,
+                flags,
+            }))
+        }
+        _ => {
+            let mut stmt = conn.prepare(&format!(
+                "SELECT DUTIndex, TEST_FLAG FROM FTR_Data
+                WHERE TEST_ID=?1{} ORDER By DUTIndex",
+                dut_condition
+            ))?;
+            let mut rows = stmt.query([test_id])?;
+            while let Some(row) = rows.next()? {
+                duts.push(row.get(0)?);
+                flags.push(row.get(1)?);
+            }
+            Ok(Some(TestData::Ftr { duts, flags }))
+        }
+    }
+}
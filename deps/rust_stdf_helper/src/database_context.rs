@@ -3,24 +3,53 @@
 // Author: noonchen - chennoon233@foxmail.com
 // Created Date: October 29th 2022
 // -----
-// Last Modified: Sun Sep 21 2025
+// Last Modified: Sun Oct 18 2026
 // Modified By: noonchen
 // -----
 // Copyright (c) 2022 noonchen
 //
 
 use crate::StdfHelperError;
-use rusqlite::{Connection, Statement, ToSql};
+use lazy_static::lazy_static;
+use rusqlite::types::{ToSqlOutput, Value};
+use rusqlite::{params_from_iter, Connection, Statement, ToSql};
+use std::sync::Mutex;
+use std::time::{Duration, Instant};
+
+/// at most this many stats are kept if they are never taken
+const MAX_KEPT_INSERT_STATS: usize = 256;
+
+lazy_static! {
+    /// (label + table, rows, rows/sec) of finished databases,
+    /// taken by python via `take_insert_stats`
+    static ref INSERT_STATS: Mutex<Vec<(String, u64, f64)>> = Mutex::new(Vec::new());
+}
+
+/// drain the recorded insert stats
+pub fn take_insert_stats() -> Vec<(String, u64, f64)> {
+    match INSERT_STATS.lock() {
+        Ok(mut stats) => std::mem::take(&mut *stats),
+        Err(_) => vec![],
+    }
+}
+
+/// default number of rows per multi-row insert of
+/// PTR_Data, MPR_Data and FTR_Data
+pub const DEFAULT_INSERT_BATCH_SIZE: usize = 256;
+/// bundled sqlite allows at most 32766 host parameters
+const MAX_SQL_VARIABLES: usize = 32766;
 
 static CREATE_TABLE_SQL: &str = "DROP TABLE IF EXISTS File_List;
                                 DROP TABLE IF EXISTS File_Info;
                                 DROP TABLE IF EXISTS Dut_Info;
                                 DROP TABLE IF EXISTS Dut_Counts;
                                 DROP TABLE IF EXISTS Test_Info;
+                                DROP TABLE IF EXISTS Test_Stats;
                                 DROP TABLE IF EXISTS PTR_Data;
                                 DROP TABLE IF EXISTS MPR_Data;
                                 DROP TABLE IF EXISTS FTR_Data;
                                 DROP TABLE IF EXISTS Bin_Info;
+                                DROP TABLE IF EXISTS Bin_Counts;
                                 DROP TABLE IF EXISTS Wafer_Info;
                                 DROP TABLE IF EXISTS Pin_Map;
                                 DROP TABLE IF EXISTS Pin_Info;
@@ -96,6 +125,14 @@ static CREATE_TABLE_SQL: &str = "DROP TABLE IF EXISTS File_List;
                                                         GOOD_CNT INTEGER,
                                                         FUNC_CNT INTEGER);
 
+                                CREATE TABLE IF NOT EXISTS Bin_Counts (
+                                                        Fid INTEGER,
+                                                        HEAD_NUM INTEGER, 
+                                                        SITE_NUM INTEGER, 
+                                                        BIN_TYPE TEXT,
+                                                        BIN_NUM INTEGER,
+                                                        BIN_CNT INTEGER);
+
                                 CREATE TABLE IF NOT EXISTS Test_Info (
                                                         Fid INTEGER,
                                                         TEST_ID INTEGER,
@@ -115,6 +152,23 @@ static CREATE_TABLE_SQL: &str = "DROP TABLE IF EXISTS File_List;
                                                         VECT_NAM TEXT,
                                                         SEQ_NAME TEXT,
                                                         PRIMARY KEY (Fid, TEST_NUM, TEST_NAME)) WITHOUT ROWID;
+
+                                CREATE TABLE IF NOT EXISTS Test_Stats (
+                                                        Fid INTEGER,
+                                                        TEST_ID INTEGER,
+                                                        HEAD_NUM INTEGER,
+                                                        SITE_NUM INTEGER,
+                                                        Count INTEGER,
+                                                        Shift REAL,
+                                                        Sum REAL,
+                                                        SumSq REAL,
+                                                        Min REAL,
+                                                        Max REAL,
+                                                        FailCount INTEGER,
+                                                        NaNCount INTEGER,
+                                                        InfCount INTEGER,
+                                                        Digest BLOB,
+                                                        PRIMARY KEY (TEST_ID, HEAD_NUM, SITE_NUM)) WITHOUT ROWID;
                                                         
                                 CREATE TABLE IF NOT EXISTS PTR_Data (
                                                         DUTIndex INTEGER,
@@ -204,6 +258,44 @@ static CREATE_TABLE_SQL: &str = "DROP TABLE IF EXISTS File_List;
 
                                 BEGIN;";
 
+// journal mode is not changed, a followed session stays in WAL,
+// sessions saved before Bin_Counts was added get an empty one
+static OPEN_FOR_APPEND: &str = "PRAGMA synchronous = OFF;
+                                BEGIN;
+                                CREATE TABLE IF NOT EXISTS Bin_Counts (
+                                                        Fid INTEGER,
+                                                        HEAD_NUM INTEGER, 
+                                                        SITE_NUM INTEGER, 
+                                                        BIN_TYPE TEXT,
+                                                        BIN_NUM INTEGER,
+                                                        BIN_CNT INTEGER);";
+
+static ENABLE_WAL: &str = "PRAGMA journal_mode = WAL;";
+
+// committed transactions can be read by other connections,
+// journal mode cannot be changed inside a transaction
+static START_PROGRESSIVE: &str = "COMMIT;
+                                PRAGMA locking_mode = NORMAL;
+                                PRAGMA journal_mode = WAL;
+                                BEGIN;";
+
+/// (isBeforePRR, program sections, (head, site, part count) seen by the sampler)
+pub type FollowState = (Option<bool>, Vec<String>, Vec<(u8, u8, u64)>);
+
+// parser state of a followed file that cannot be
+// restored from the parsed records, e.g. open BPS
+// or part counts of skipped parts in the sampling mode
+static CREATE_FOLLOW_STATE: &str = "CREATE TABLE IF NOT EXISTS Follow_State (
+                                                        Fid INTEGER PRIMARY KEY,
+                                                        isBeforePRR INTEGER,
+                                                        ProgramSections TEXT,
+                                                        SampledParts TEXT);";
+
+static UPDATE_FOLLOW_STATE: &str = "INSERT OR REPLACE INTO 
+                                        Follow_State 
+                                    VALUES 
+                                        (?,?,?,?)";
+
 static INSERT_FILE_NAME: &str = "INSERT INTO 
                                     File_List (Fid, SubFid, Filename)
                                 VALUES 
@@ -233,23 +325,10 @@ static UPDATE_DUT: &str = "UPDATE Dut_Info SET
                             WHERE 
                                 Fid=:Fid AND DUTIndex=:DUTIndex;";
 
-static UPDATE_SUPERSEDE_DUT: &str = "UPDATE Dut_Info SET
-                                        Supersede=1
-                                    WHERE
-                                        Fid=:Fid AND 
-                                        HEAD_NUM=:HEAD_NUM AND 
-                                        SITE_NUM=:SITE_NUM AND
-                                        PartID=:PartID;";
-
-static UPDATE_SUPERSEDE_DIE: &str = "UPDATE Dut_Info SET
-                                        Supersede=1
-                                    WHERE
-                                        Fid=:Fid AND 
-                                        HEAD_NUM=:HEAD_NUM AND 
-                                        SITE_NUM=:SITE_NUM AND
-                                        WaferIndex=:WaferIndex AND
-                                        XCOORD=:XCOORD AND
-                                        YCOORD=:YCOORD;";
+static UPDATE_SUPERSEDE: &str = "UPDATE Dut_Info SET
+                                    Supersede=1
+                                WHERE
+                                    Fid=:Fid AND DUTIndex=:DUTIndex;";
 
 static INSERT_PTR_DATA: &str = "INSERT OR REPLACE INTO 
                                     PTR_Data 
@@ -266,6 +345,12 @@ static INSERT_FTR_DATA: &str = "INSERT OR REPLACE INTO
                                 VALUES 
                                     (:DUTIndex, :TEST_ID, :TEST_FLAG);";
 
+// prefix of the multi-row version of the above inserts,
+// `(?,?,...)` groups will be appended
+static INSERT_PTR_DATA_BATCH: &str = "INSERT OR REPLACE INTO PTR_Data VALUES ";
+static INSERT_MPR_DATA_BATCH: &str = "INSERT OR REPLACE INTO MPR_Data VALUES ";
+static INSERT_FTR_DATA_BATCH: &str = "INSERT OR REPLACE INTO FTR_Data VALUES ";
+
 static INSERT_TEST_INFO: &str = "INSERT OR IGNORE INTO 
                                     Test_Info 
                                 VALUES 
@@ -282,6 +367,38 @@ static UPDATE_FAIL_COUNT: &str = "UPDATE
                                 WHERE 
                                     TEST_ID=:TEST_ID";
 
+// statistics of PTR results of non-superseded duts
+static INSERT_TEST_STAT: &str = "INSERT OR REPLACE INTO 
+                                    Test_Stats 
+                                VALUES 
+                                    (:Fid, :TEST_ID, :HEAD_NUM, :SITE_NUM, :Count, :Shift, :Sum, 
+                                    :SumSq, :Min, :Max, :FailCount, :NaNCount, :InfCount, :Digest);";
+
+// PTR_Data rows of other files share the DUTIndex, caller
+// should filter them by TEST_ID, `{dut_indexes}` is replaced
+// before execution
+static SELECT_PTR_OF_DUTS: &str = "SELECT 
+                                    DUTIndex, TEST_ID, RESULT, TEST_FLAG 
+                                FROM 
+                                    PTR_Data 
+                                WHERE 
+                                    DUTIndex IN ({dut_indexes})";
+
+/// max number of DUTIndex in a `SELECT_PTR_OF_DUTS`
+const DUTS_PER_SELECT: usize = 10000;
+
+// finite PTR results of non-superseded duts, NaN is stored as NULL,
+// rows of other files share the DUTIndex, they are excluded by TEST_ID
+// of the file, `{test_ids}` is replaced before execution
+static SELECT_PTR_OF_TESTS: &str = "SELECT 
+                                        p.TEST_ID, d.HEAD_NUM, d.SITE_NUM, p.RESULT 
+                                    FROM 
+                                        Dut_Info d 
+                                    JOIN 
+                                        PTR_Data p ON p.DUTIndex = d.DUTIndex AND p.TEST_ID IN ({test_ids}) 
+                                    WHERE 
+                                        d.Fid=:Fid AND d.Supersede=0 AND ABS(p.RESULT) <= 3.5e38";
+
 static INSERT_HBIN: &str = "INSERT OR REPLACE INTO 
                                 Bin_Info 
                             VALUES 
@@ -298,6 +415,11 @@ static INSERT_DUT_COUNT: &str = "INSERT INTO
                                     (:Fid, :HEAD_NUM, :SITE_NUM, :PART_CNT, 
                                     :RTST_CNT, :ABRT_CNT, :GOOD_CNT, :FUNC_CNT);";
 
+static INSERT_BIN_COUNT: &str = "INSERT INTO 
+                                    Bin_Counts 
+                                VALUES 
+                                    (:Fid, :HEAD_NUM, :SITE_NUM, :BIN_TYPE, :BIN_NUM, :BIN_CNT);";
+
 static INSERT_WAFER: &str = "INSERT OR REPLACE INTO 
                                     Wafer_Info 
                                 VALUES 
@@ -373,6 +495,199 @@ static COMMIT_AND_SET_LOCKING: &str = "COMMIT;
 
 static START_NEW_TRANSACTION: &str = "COMMIT; BEGIN;";
 
+// copy all rows from an attached shard database,
+// `{test_id_offset}` is replaced before execution
+static MERGE_SHARD: &str = "BEGIN;
+                            INSERT OR REPLACE INTO main.File_List SELECT * FROM shard.File_List;
+                            INSERT OR REPLACE INTO main.File_Info SELECT * FROM shard.File_Info;
+                            INSERT INTO main.Wafer_Info SELECT * FROM shard.Wafer_Info;
+                            INSERT INTO main.Dut_Info SELECT * FROM shard.Dut_Info;
+                            INSERT INTO main.Dut_Counts SELECT * FROM shard.Dut_Counts;
+                            INSERT INTO main.Bin_Counts SELECT * FROM shard.Bin_Counts;
+                            INSERT INTO main.Bin_Info SELECT * FROM shard.Bin_Info;
+                            INSERT INTO main.Pin_Map SELECT * FROM shard.Pin_Map;
+                            INSERT INTO main.Pin_Info SELECT * FROM shard.Pin_Info;
+                            INSERT INTO main.Datalog SELECT * FROM shard.Datalog;
+
+                            INSERT INTO 
+                                main.Test_Info 
+                            SELECT 
+                                Fid, TEST_ID + {test_id_offset}, TEST_NUM, recHeader, TEST_NAME, 
+                                RES_SCAL, LLimit, HLimit, Unit, OPT_FLAG, 
+                                FailCount, RTN_ICNT, RSLT_PGM_CNT, LSpec, 
+                                HSpec, VECT_NAM, SEQ_NAME 
+                            FROM 
+                                shard.Test_Info;
+
+                            INSERT INTO 
+                                main.Test_Stats 
+                            SELECT 
+                                Fid, TEST_ID + {test_id_offset}, HEAD_NUM, SITE_NUM, Count, 
+                                Shift, Sum, SumSq, Min, Max, FailCount, NaNCount, InfCount, Digest 
+                            FROM 
+                                shard.Test_Stats;
+
+                            INSERT INTO 
+                                main.PTR_Data 
+                            SELECT 
+                                DUTIndex, TEST_ID + {test_id_offset}, RESULT, TEST_FLAG 
+                            FROM 
+                                shard.PTR_Data;
+
+                            INSERT INTO 
+                                main.MPR_Data 
+                            SELECT 
+                                DUTIndex, TEST_ID + {test_id_offset}, RTN_RSLT, RTN_STAT, TEST_FLAG 
+                            FROM 
+                                shard.MPR_Data;
+
+                            INSERT INTO 
+                                main.FTR_Data 
+                            SELECT 
+                                DUTIndex, TEST_ID + {test_id_offset}, TEST_FLAG 
+                            FROM 
+                                shard.FTR_Data;
+
+                            INSERT INTO 
+                                main.TestPin_Map 
+                            SELECT 
+                                TEST_ID + {test_id_offset}, PMR_INDX, PIN_TYPE 
+                            FROM 
+                                shard.TestPin_Map;
+
+                            INSERT INTO 
+                                main.Dynamic_Limits 
+                            SELECT 
+                                DUTIndex, TEST_ID + {test_id_offset}, LLimit, HLimit 
+                            FROM 
+                                shard.Dynamic_Limits;
+                            COMMIT;";
+
+/// write speed of a batched table
+pub struct InsertStat {
+    pub table: &'static str,
+    pub rows: u64,
+    pub elapsed: Duration,
+}
+
+impl InsertStat {
+    pub fn rows_per_sec(&self) -> f64 {
+        let secs = self.elapsed.as_secs_f64();
+        if secs > 0.0 {
+            self.rows as f64 / secs
+        } else {
+            0.0
+        }
+    }
+}
+
+/// buffer rows of a table and write them by a single
+/// multi-row `INSERT` once `batch_size` rows are collected,
+/// it saves the per-statement VM overhead of sqlite
+struct BatchInsert<'con> {
+    table: &'static str,
+    num_cols: usize,
+    batch_size: usize,
+    // insert `batch_size` rows at once
+    batch_stmt: Option<Statement<'con>>,
+    // insert a single row, used for the remaining rows
+    single_stmt: Statement<'con>,
+    buffer: Vec<Value>,
+    rows: u64,
+    elapsed: Duration,
+}
+
+impl<'con> BatchInsert<'con> {
+    fn new(
+        conn: &'con Connection,
+        table: &'static str,
+        num_cols: usize,
+        batch_size: usize,
+        single_sql: &str,
+        batch_prefix: &str,
+    ) -> Result<Self, StdfHelperError> {
+        let batch_size = batch_size.clamp(1, MAX_SQL_VARIABLES / num_cols);
+        let batch_stmt = if batch_size > 1 {
+            let row = format!("({})", vec!["?"; num_cols].join(","));
+            let sql = format!("{}{};", batch_prefix, vec![row; batch_size].join(","));
+            Some(conn.prepare(&sql)?)
+        } else {
+            None
+        };
+        Ok(BatchInsert {
+            table,
+            num_cols,
+            batch_size,
+            batch_stmt,
+            single_stmt: conn.prepare(single_sql)?,
+            buffer: Vec::with_capacity(batch_size * num_cols),
+            rows: 0,
+            elapsed: Duration::ZERO,
+        })
+    }
+
+    #[inline(always)]
+    fn push(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
+        for v in p {
+            // statement parameters are borrowed,
+            // must be copied before buffering
+            let owned = match v.to_sql()? {
+                ToSqlOutput::Borrowed(v) => Value::from(v),
+                ToSqlOutput::Owned(v) => v,
+                #[allow(unreachable_patterns)]
+                _ => {
+                    return Err(StdfHelperError {
+                        msg: format!("Unsupported value type for batch insert of {}", self.table),
+                    })
+                }
+            };
+            self.buffer.push(owned);
+        }
+        if self.buffer.len() >= self.batch_size * self.num_cols {
+            self.flush()?;
+        }
+        Ok(())
+    }
+
+    fn flush(&mut self) -> Result<(), StdfHelperError> {
+        if self.buffer.is_empty() {
+            return Ok(());
+        }
+        let start = Instant::now();
+        let num_rows = self.buffer.len() / self.num_cols;
+        match self.batch_stmt.as_mut() {
+            Some(stmt) if num_rows == self.batch_size => {
+                stmt.execute(params_from_iter(self.buffer.iter()))?;
+            }
+            _ => {
+                for row in self.buffer.chunks(self.num_cols) {
+                    self.single_stmt.execute(params_from_iter(row.iter()))?;
+                }
+            }
+        }
+        self.buffer.clear();
+        self.rows += num_rows as u64;
+        self.elapsed += start.elapsed();
+        Ok(())
+    }
+
+    fn stat(&self) -> InsertStat {
+        InsertStat {
+            table: self.table,
+            rows: self.rows,
+            elapsed: self.elapsed,
+        }
+    }
+
+    fn finalize(self) -> Result<(), StdfHelperError> {
+        if let Some(stmt) = self.batch_stmt {
+            stmt.finalize()?;
+        }
+        self.single_stmt.finalize()?;
+        Ok(())
+    }
+}
+
 pub struct DataBaseCtx<'con> {
     db: &'con Connection,
     insert_file_name_stmt: Statement<'con>,
@@ -380,16 +695,17 @@ pub struct DataBaseCtx<'con> {
     insert_file_info_stmt: Statement<'con>,
     insert_dut_stmt: Statement<'con>,
     update_dut_stmt: Statement<'con>,
-    update_supersede_dut_stmt: Statement<'con>,
-    update_supersede_die_stmt: Statement<'con>,
-    insert_ptr_data_stmt: Statement<'con>,
-    insert_mpr_data_stmt: Statement<'con>,
-    insert_ftr_data_stmt: Statement<'con>,
+    update_supersede_stmt: Statement<'con>,
+    ptr_data_batch: BatchInsert<'con>,
+    mpr_data_batch: BatchInsert<'con>,
+    ftr_data_batch: BatchInsert<'con>,
     insert_test_info_stmt: Statement<'con>,
     update_fail_count_stmt: Statement<'con>,
+    insert_test_stat_stmt: Statement<'con>,
     insert_hbin_stmt: Statement<'con>,
     insert_sbin_stmt: Statement<'con>,
     insert_dut_cnt_stmt: Statement<'con>,
+    insert_bin_cnt_stmt: Statement<'con>,
     insert_wafer_stmt: Statement<'con>,
     insert_pin_map_stmt: Statement<'con>,
     update_from_grp_stmt: Statement<'con>,
@@ -398,26 +714,68 @@ pub struct DataBaseCtx<'con> {
     insert_test_pin_stmt: Statement<'con>,
     insert_dynamic_limit_stmt: Statement<'con>,
     insert_datalog_rec_stmt: Statement<'con>,
+    // store MPR results as BLOB instead of hex TEXT
+    mpr_blob: bool,
 }
 
 impl<'con> DataBaseCtx<'con> {
-    pub fn new(conn: &'con Connection) -> Result<Self, StdfHelperError> {
+    pub fn new(conn: &'con Connection, batch_size: usize) -> Result<Self, StdfHelperError> {
         conn.execute_batch(CREATE_TABLE_SQL)?;
+        DataBaseCtx::prepare_statements(conn, batch_size)
+    }
+
+    /// open a database created by `new` for appending records,
+    /// existing tables are kept and journal is enabled, so that
+    /// a failed append can be rolled back
+    pub fn open_existing(
+        conn: &'con Connection,
+        batch_size: usize,
+    ) -> Result<Self, StdfHelperError> {
+        conn.execute_batch(OPEN_FOR_APPEND)?;
+        DataBaseCtx::prepare_statements(conn, batch_size)
+    }
+
+    fn prepare_statements(
+        conn: &'con Connection,
+        batch_size: usize,
+    ) -> Result<Self, StdfHelperError> {
         let insert_file_name_stmt = conn.prepare(INSERT_FILE_NAME)?;
         let update_file_list_stmt = conn.prepare(UPDATE_FILE_LIST)?;
         let insert_file_info_stmt = conn.prepare(INSERT_FILE_INFO)?;
         let insert_dut_stmt = conn.prepare(INSERT_DUT)?;
         let update_dut_stmt = conn.prepare(UPDATE_DUT)?;
-        let update_supersede_dut_stmt = conn.prepare(UPDATE_SUPERSEDE_DUT)?;
-        let update_supersede_die_stmt = conn.prepare(UPDATE_SUPERSEDE_DIE)?;
-        let insert_ptr_data_stmt = conn.prepare(INSERT_PTR_DATA)?;
-        let insert_mpr_data_stmt = conn.prepare(INSERT_MPR_DATA)?;
-        let insert_ftr_data_stmt = conn.prepare(INSERT_FTR_DATA)?;
+        let update_supersede_stmt = conn.prepare(UPDATE_SUPERSEDE)?;
+        let ptr_data_batch = BatchInsert::new(
+            conn,
+            "PTR_Data",
+            4,
+            batch_size,
+            INSERT_PTR_DATA,
+            INSERT_PTR_DATA_BATCH,
+        )?;
+        let mpr_data_batch = BatchInsert::new(
+            conn,
+            "MPR_Data",
+            5,
+            batch_size,
+            INSERT_MPR_DATA,
+            INSERT_MPR_DATA_BATCH,
+        )?;
+        let ftr_data_batch = BatchInsert::new(
+            conn,
+            "FTR_Data",
+            3,
+            batch_size,
+            INSERT_FTR_DATA,
+            INSERT_FTR_DATA_BATCH,
+        )?;
         let insert_test_info_stmt = conn.prepare(INSERT_TEST_INFO)?;
         let update_fail_count_stmt = conn.prepare(UPDATE_FAIL_COUNT)?;
+        let insert_test_stat_stmt = conn.prepare(INSERT_TEST_STAT)?;
         let insert_hbin_stmt = conn.prepare(INSERT_HBIN)?;
         let insert_sbin_stmt = conn.prepare(INSERT_SBIN)?;
         let insert_dut_cnt_stmt = conn.prepare(INSERT_DUT_COUNT)?;
+        let insert_bin_cnt_stmt = conn.prepare(INSERT_BIN_COUNT)?;
         let insert_wafer_stmt = conn.prepare(INSERT_WAFER)?;
         let insert_pin_map_stmt = conn.prepare(INSERT_PIN_MAP)?;
         let update_from_grp_stmt = conn.prepare(UPDATE_FROM_GRP)?;
@@ -434,16 +792,17 @@ impl<'con> DataBaseCtx<'con> {
             insert_file_info_stmt,
             insert_dut_stmt,
             update_dut_stmt,
-            update_supersede_dut_stmt,
-            update_supersede_die_stmt,
-            insert_ptr_data_stmt,
-            insert_mpr_data_stmt,
-            insert_ftr_data_stmt,
+            update_supersede_stmt,
+            ptr_data_batch,
+            mpr_data_batch,
+            ftr_data_batch,
             insert_test_info_stmt,
             update_fail_count_stmt,
+            insert_test_stat_stmt,
             insert_hbin_stmt,
             insert_sbin_stmt,
             insert_dut_cnt_stmt,
+            insert_bin_cnt_stmt,
             insert_wafer_stmt,
             insert_pin_map_stmt,
             update_from_grp_stmt,
@@ -452,15 +811,157 @@ impl<'con> DataBaseCtx<'con> {
             insert_test_pin_stmt,
             insert_dynamic_limit_stmt,
             insert_datalog_rec_stmt,
+            mpr_blob: false,
         })
     }
 
+    /// readers are not blocked by the writer in WAL mode,
+    /// it is persistent and must be set outside of a transaction
+    pub fn enable_wal(conn: &Connection) -> Result<(), StdfHelperError> {
+        conn.execute_batch(ENABLE_WAL)?;
+        Ok(())
+    }
+
+    /// switch a new database to WAL mode without exclusive lock,
+    /// so that each `start_new_transaction` publishes a consistent
+    /// snapshot that can be read while parsing
+    pub fn enable_progressive(&mut self) -> Result<(), StdfHelperError> {
+        self.flush_batches()?;
+        self.db.execute_batch(START_PROGRESSIVE)?;
+        Ok(())
+    }
+
+    /// MPR_Data accepts both formats, new
+    /// rows are written in the format set here
+    pub fn set_mpr_blob(&mut self, mpr_blob: bool) {
+        self.mpr_blob = mpr_blob;
+    }
+
+    #[inline(always)]
+    pub fn mpr_blob(&self) -> bool {
+        self.mpr_blob
+    }
+
+    /// write all buffered rows into database
+    pub fn flush_batches(&mut self) -> Result<(), StdfHelperError> {
+        self.ptr_data_batch.flush()?;
+        self.mpr_data_batch.flush()?;
+        self.ftr_data_batch.flush()?;
+        Ok(())
+    }
+
+    /// rows written and time spent of the batched tables
+    pub fn insert_stats(&self) -> Vec<InsertStat> {
+        vec![
+            self.ptr_data_batch.stat(),
+            self.mpr_data_batch.stat(),
+            self.ftr_data_batch.stat(),
+        ]
+    }
+
+    /// keep rows/sec of the batched tables for `take_insert_stats`,
+    /// `label` is prepended to table names
+    pub fn record_insert_stats(&self, label: &str) {
+        let Ok(mut stats) = INSERT_STATS.lock() else {
+            return;
+        };
+        for stat in self.insert_stats() {
+            if stat.rows > 0 {
+                stats.push((
+                    format!("{}{}", label, stat.table),
+                    stat.rows,
+                    stat.rows_per_sec(),
+                ));
+            }
+        }
+        let len = stats.len();
+        if len > MAX_KEPT_INSERT_STATS {
+            stats.drain(..len - MAX_KEPT_INSERT_STATS);
+        }
+    }
+
     #[inline(always)]
-    pub fn start_new_transaction(&self) -> Result<(), StdfHelperError> {
+    pub fn start_new_transaction(&mut self) -> Result<(), StdfHelperError> {
+        // buffered rows belong to the current transaction
+        self.flush_batches()?;
         self.db.execute_batch(START_NEW_TRANSACTION)?;
         Ok(())
     }
 
+    /// copy a finalized shard database into this database,
+    /// test ids of the shard are shifted by `test_id_offset`
+    pub fn merge_shard(
+        &mut self,
+        shard_path: &str,
+        test_id_offset: usize,
+    ) -> Result<(), StdfHelperError> {
+        self.flush_batches()?;
+        // ATTACH is not allowed inside a transaction
+        self.db.execute_batch("COMMIT;")?;
+        self.db
+            .execute("ATTACH DATABASE ?1 AS shard;", rusqlite::params![shard_path])?;
+        let merge_rslt = self.db.execute_batch(
+            &MERGE_SHARD.replace("{test_id_offset}", &test_id_offset.to_string()),
+        );
+        if merge_rslt.is_err() {
+            // rollback the partial merge, ignore if no transaction
+            let _ = self.db.execute_batch("ROLLBACK;");
+        }
+        self.db.execute_batch("DETACH DATABASE shard; BEGIN;")?;
+        merge_rslt?;
+        Ok(())
+    }
+
+    /// `true` if the database is created by following a file,
+    /// it is initialized only once when following starts
+    pub fn is_followed(conn: &Connection) -> Result<bool, StdfHelperError> {
+        let cnt: i64 = conn.query_row(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name='Follow_State'",
+            [],
+            |row| row.get(0),
+        )?;
+        Ok(cnt > 0)
+    }
+
+    pub fn init_follow_state(&mut self) -> Result<(), StdfHelperError> {
+        self.db.execute_batch(CREATE_FOLLOW_STATE)?;
+        Ok(())
+    }
+
+    /// written once per poll, in the same transaction as the records
+    pub fn update_follow_state(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
+        self.db.execute(UPDATE_FOLLOW_STATE, p)?;
+        Ok(())
+    }
+
+    /// (isBeforePRR, program sections, sampled parts) saved by the previous poll
+    pub fn read_follow_state(
+        conn: &Connection,
+        file_id: usize,
+    ) -> Result<Option<FollowState>, StdfHelperError> {
+        let mut stmt = conn.prepare(
+            "SELECT isBeforePRR, ProgramSections, SampledParts FROM Follow_State WHERE Fid=?1",
+        )?;
+        let mut rows = stmt.query(rusqlite::params![file_id])?;
+        let state = match rows.next()? {
+            Some(row) => {
+                let sections: Option<String> = row.get(1)?;
+                let sections: Vec<String> = match sections {
+                    Some(s) => serde_json::from_str(&s)?,
+                    None => vec![],
+                };
+                let sampled_parts: Option<String> = row.get(2)?;
+                let sampled_parts: Vec<(u8, u8, u64)> = match sampled_parts {
+                    Some(s) => serde_json::from_str(&s)?,
+                    None => vec![],
+                };
+                Some((row.get(0)?, sections, sampled_parts))
+            }
+            None => None,
+        };
+        Ok(state)
+    }
+
     #[inline(always)]
     pub fn insert_file_name(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
         self.insert_file_name_stmt.execute(p)?;
@@ -516,33 +1017,24 @@ impl<'con> DataBaseCtx<'con> {
     }
 
     #[inline(always)]
-    pub fn update_supersede_dut(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
-        self.update_supersede_dut_stmt.execute(p)?;
-        Ok(())
-    }
-
-    #[inline(always)]
-    pub fn update_supersede_die(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
-        self.update_supersede_die_stmt.execute(p)?;
+    pub fn update_supersede(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
+        self.update_supersede_stmt.execute(p)?;
         Ok(())
     }
 
     #[inline(always)]
     pub fn insert_ptr_data(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
-        self.insert_ptr_data_stmt.execute(p)?;
-        Ok(())
+        self.ptr_data_batch.push(p)
     }
 
     #[inline(always)]
     pub fn insert_mpr_data(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
-        self.insert_mpr_data_stmt.execute(p)?;
-        Ok(())
+        self.mpr_data_batch.push(p)
     }
 
     #[inline(always)]
     pub fn insert_ftr_data(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
-        self.insert_ftr_data_stmt.execute(p)?;
-        Ok(())
+        self.ftr_data_batch.push(p)
     }
 
     #[inline(always)]
@@ -575,6 +1067,12 @@ impl<'con> DataBaseCtx<'con> {
         Ok(())
     }
 
+    #[inline(always)]
+    pub fn insert_bin_cnt(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
+        self.insert_bin_cnt_stmt.execute(p)?;
+        Ok(())
+    }
+
     #[inline(always)]
     pub fn insert_datalog_rec(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
         self.insert_datalog_rec_stmt.execute(p)?;
@@ -600,7 +1098,75 @@ impl<'con> DataBaseCtx<'con> {
     }
 
     #[inline(always)]
-    pub fn finalize(self, build_index: bool) -> Result<(), StdfHelperError> {
+    pub fn insert_test_stat(&mut self, p: &[&dyn ToSql]) -> Result<(), StdfHelperError> {
+        self.insert_test_stat_stmt.execute(p)?;
+        Ok(())
+    }
+
+    /// call `f` with (DUTIndex, TEST_ID, RESULT, TEST_FLAG) of every
+    /// PTR_Data row of `dut_indexes`, buffered rows must be flushed.
+    ///
+    /// Rows are read by a few queries instead of one query per dut
+    pub fn for_each_ptr_of_duts<F>(
+        &mut self,
+        dut_indexes: &[u64],
+        mut f: F,
+    ) -> Result<(), StdfHelperError>
+    where
+        F: FnMut(u64, usize, Option<f64>, u8),
+    {
+        for duts in dut_indexes.chunks(DUTS_PER_SELECT) {
+            let duts = duts
+                .iter()
+                .map(|x| x.to_string())
+                .collect::<Vec<String>>()
+                .join(",");
+            let mut stmt = self
+                .db
+                .prepare(&SELECT_PTR_OF_DUTS.replace("{dut_indexes}", &duts))?;
+            let mut rows = stmt.query([])?;
+            while let Some(row) = rows.next()? {
+                f(row.get(0)?, row.get(1)?, row.get(2)?, row.get(3)?);
+            }
+        }
+        Ok(())
+    }
+
+    /// call `f` with (TEST_ID, HEAD_NUM, SITE_NUM, RESULT) of finite PTR
+    /// results of `test_ids` from non-superseded duts in `file_id`,
+    /// buffered rows must be flushed.
+    ///
+    /// Use it only if the tracked statistics cannot be updated
+    pub fn for_each_ptr_of_tests<F>(
+        &mut self,
+        file_id: usize,
+        test_ids: &[usize],
+        mut f: F,
+    ) -> Result<(), StdfHelperError>
+    where
+        F: FnMut(usize, u8, u8, f64),
+    {
+        if test_ids.is_empty() {
+            return Ok(());
+        }
+        let test_ids = test_ids
+            .iter()
+            .map(|x| x.to_string())
+            .collect::<Vec<String>>()
+            .join(",");
+        let mut stmt = self
+            .db
+            .prepare(&SELECT_PTR_OF_TESTS.replace("{test_ids}", &test_ids))?;
+        let mut rows = stmt.query(rusqlite::params![file_id])?;
+        while let Some(row) = rows.next()? {
+            f(row.get(0)?, row.get(1)?, row.get(2)?, row.get(3)?);
+        }
+        Ok(())
+    }
+
+    #[inline(always)]
+    pub fn finalize(mut self, build_index: bool) -> Result<(), StdfHelperError> {
+        self.flush_batches()?;
         if build_index {
             self.db.execute_batch(CREATE_INDEX_FOR_QUERY)?;
         }
@@ -610,14 +1176,17 @@ impl<'con> DataBaseCtx<'con> {
         self.insert_file_info_stmt.finalize()?;
         self.insert_dut_stmt.finalize()?;
         self.update_dut_stmt.finalize()?;
-        self.insert_ptr_data_stmt.finalize()?;
-        self.insert_mpr_data_stmt.finalize()?;
-        self.insert_ftr_data_stmt.finalize()?;
+        self.update_supersede_stmt.finalize()?;
+        self.ptr_data_batch.finalize()?;
+        self.mpr_data_batch.finalize()?;
+        self.ftr_data_batch.finalize()?;
         self.insert_test_info_stmt.finalize()?;
         self.update_fail_count_stmt.finalize()?;
+        self.insert_test_stat_stmt.finalize()?;
         self.insert_hbin_stmt.finalize()?;
         self.insert_sbin_stmt.finalize()?;
         self.insert_dut_cnt_stmt.finalize()?;
+        self.insert_bin_cnt_stmt.finalize()?;
         self.insert_wafer_stmt.finalize()?;
         self.insert_pin_map_stmt.finalize()?;
         self.update_from_grp_stmt.finalize()?;
@@ -0,0 +1,393 @@
+//
+// decompress.rs
+// Author: noonchen - chennoon233@foxmail.com
+// Created Date: October 18th 2026
+// -----
+// Last Modified: Sun Oct 18 2026
+// Modified By: noonchen
+// -----
+// Copyright (c) 2026 noonchen
+//
+
+use crate::StdfHelperError;
+use bzip2::read::MultiBzDecoder;
+use crossbeam_channel::{Receiver, Sender};
+use flate2::read::MultiGzDecoder;
+use std::collections::VecDeque;
+use std::fs::{self, File};
+use std::io::{self, Read, Seek, SeekFrom};
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::sync::Arc;
+use std::thread;
+use zip::ZipArchive;
+
+/// max size of a decompressed block sent to the reader
+const BLOCK_SIZE: u64 = 4 * 1024 * 1024;
+/// number of decompressed blocks buffered ahead of the reader
+const READ_AHEAD_BLOCKS: usize = 8;
+/// approximate compressed size of a job in the parallel mode,
+/// a job always contains complete gzip members or bzip2 streams
+const JOB_SIZE: u64 = 1024 * 1024;
+const SCAN_BUFFER_SIZE: usize = 1 << 20;
+/// a bzip2 file without a 2nd stream in this many bytes is
+/// decompressed serially without scanning the rest of it
+const BZ2_PROBE_SIZE: u64 = 8 * 1024 * 1024;
+/// magic of a bzip2 block, it follows "BZh1".."BZh9"
+/// at the beginning of a bzip2 stream
+const BZ2_BLOCK_MAGIC: [u8; 6] = [0x31, 0x41, 0x59, 0x26, 0x53, 0x59];
+
+type Block = io::Result<Vec<u8>>;
+
+#[derive(Clone, Copy)]
+enum Compression {
+    Gzip,
+    Bzip2,
+    Zip,
+}
+
+impl Compression {
+    fn from_path(fpath: &str) -> Option<Self> {
+        if fpath.ends_with(".gz") {
+            Some(Compression::Gzip)
+        } else if fpath.ends_with(".bz2") {
+            Some(Compression::Bzip2)
+        } else if fpath.ends_with(".zip") {
+            Some(Compression::Zip)
+        } else {
+            None
+        }
+    }
+}
+
+/// a reader that stores its position into
+/// `consumed` for the reading progress
+struct CountingReader<R> {
+    inner: R,
+    pos: u64,
+    consumed: Arc<AtomicU64>,
+}
+
+impl<R> CountingReader<R> {
+    fn new(inner: R, pos: u64, consumed: Arc<AtomicU64>) -> Self {
+        consumed.store(pos, Ordering::Relaxed);
+        CountingReader {
+            inner,
+            pos,
+            consumed,
+        }
+    }
+}
+
+impl<R: Read> Read for CountingReader<R> {
+    fn read(&mut self, buf: &mut [u8]) -> io::Result<usize> {
+        let n = self.inner.read(buf)?;
+        self.pos += n as u64;
+        self.consumed.store(self.pos, Ordering::Relaxed);
+        Ok(n)
+    }
+}
+
+impl<R: Seek> Seek for CountingReader<R> {
+    fn seek(&mut self, pos: SeekFrom) -> io::Result<u64> {
+        self.pos = self.inner.seek(pos)?;
+        Ok(self.pos)
+    }
+}
+
+/// uncompressed data of a .gz/.bz2/.zip file.
+///
+/// The file is decompressed by a background thread into
+/// a bounded read-ahead buffer, gzip files of BGZF format
+/// and bzip2 files of multiple streams (e.g. created by pbzip2)
+/// are decompressed by multiple threads.
+/// Background threads exit once the stream is dropped.
+pub struct DecompressedStream {
+    rx: Receiver<Block>,
+    block: Vec<u8>,
+    pos: usize,
+    consumed: Arc<AtomicU64>,
+    compressed_size: u64,
+}
+
+impl DecompressedStream {
+    /// `None` if `fpath` is not compressed
+    pub fn open(fpath: &str, num_workers: usize) -> Result<Option<Self>, StdfHelperError> {
+        let Some(compression) = Compression::from_path(fpath) else {
+            return Ok(None);
+        };
+        let compressed_size = fs::metadata(fpath)?.len();
+        let (tx, rx) = crossbeam_channel::bounded::<Block>(READ_AHEAD_BLOCKS);
+        let consumed = Arc::new(AtomicU64::new(0));
+
+        let thread_fpath = fpath.to_string();
+        let thread_consumed = consumed.clone();
+        thread::spawn(move || {
+            if let Err(e) = pump(
+                &thread_fpath,
+                compression,
+                num_workers.max(1),
+                &tx,
+                &thread_consumed,
+            ) {
+                let _ = tx.send(Err(e));
+            }
+        });
+        Ok(Some(DecompressedStream {
+            rx,
+            block: vec![],
+            pos: 0,
+            consumed,
+            compressed_size,
+        }))
+    }
+
+    /// fraction of the compressed file that is decompressed
+    #[inline(always)]
+    pub fn progress(&self) -> f32 {
+        self.consumed.load(Ordering::Relaxed) as f32 / self.compressed_size.max(1) as f32
+    }
+}
+
+impl Read for DecompressedStream {
+    fn read(&mut self, buf: &mut [u8]) -> io::Result<usize> {
+        while self.pos >= self.block.len() {
+            match self.rx.recv() {
+                Ok(block) => {
+                    self.block = block?;
+                    self.pos = 0;
+                }
+                // all blocks are received
+                Err(_) => return Ok(0),
+            }
+        }
+        let n = buf.len().min(self.block.len() - self.pos);
+        buf[..n].copy_from_slice(&self.block[self.pos..self.pos + n]);
+        self.pos += n;
+        Ok(n)
+    }
+}
+
+/// decompress `fpath` and send blocks to `tx` in order
+fn pump(
+    fpath: &str,
+    compression: Compression,
+    num_workers: usize,
+    tx: &Sender<Block>,
+    consumed: &Arc<AtomicU64>,
+) -> io::Result<()> {
+    match compression {
+        Compression::Gzip | Compression::Bzip2 => {
+            let jobs = match compression {
+                Compression::Gzip => scan_bgzf_members(fpath)?,
+                _ => scan_bz2_streams(fpath)?,
+            };
+            let mut start = 0;
+            if num_workers > 1 && jobs.len() > 1 {
+                match pump_parallel(fpath, compression, jobs, num_workers, tx, consumed)? {
+                    Some(failed_start) => start = failed_start,
+                    None => return Ok(()),
+                }
+            }
+            // continue from the first job that cannot be decoded alone,
+            // jobs before it end exactly at a member or stream boundary
+            let mut fp = File::open(fpath)?;
+            fp.seek(SeekFrom::Start(start))?;
+            let fp = CountingReader::new(fp, start, consumed.clone());
+            match compression {
+                Compression::Gzip => pump_serial(MultiGzDecoder::new(fp), tx),
+                _ => pump_serial(MultiBzDecoder::new(fp), tx),
+            }
+        }
+        Compression::Zip => {
+            // only the first file in the archive is read
+            let fp = CountingReader::new(File::open(fpath)?, 0, consumed.clone());
+            let mut archive = ZipArchive::new(fp)?;
+            let fst_file = archive.by_index(0)?;
+            pump_serial(fst_file, tx)
+        }
+    }
+}
+
+/// decompress in the current thread
+fn pump_serial<R: Read>(mut decoder: R, tx: &Sender<Block>) -> io::Result<()> {
+    loop {
+        let mut block = Vec::with_capacity(BLOCK_SIZE as usize);
+        let rslt = (&mut decoder).take(BLOCK_SIZE).read_to_end(&mut block);
+        // data before an error, e.g. truncated file, is still sent
+        if !block.is_empty() && tx.send(Ok(block)).is_err() {
+            // reader has stopped
+            return Ok(());
+        }
+        if rslt? == 0 {
+            return Ok(());
+        }
+    }
+}
+
+/// compressed bytes [start, end) of a job
+type Job = (u64, u64);
+type JobResult = (Job, Option<Vec<u8>>);
+
+/// decompress jobs in `num_workers` threads, and send blocks
+/// in the file order.
+///
+/// Returns the start of the first job that cannot be decoded,
+/// or `None` if all jobs are sent or the reader has stopped.
+fn pump_parallel(
+    fpath: &str,
+    compression: Compression,
+    jobs: Vec<Job>,
+    num_workers: usize,
+    tx: &Sender<Block>,
+    consumed: &Arc<AtomicU64>,
+) -> io::Result<Option<u64>> {
+    let (job_tx, job_rx) = crossbeam_channel::unbounded::<(Job, Sender<JobResult>)>();
+
+    thread::scope(|s| -> io::Result<Option<u64>> {
+        for _ in 0..num_workers {
+            let job_rx = job_rx.clone();
+            s.spawn(move || -> io::Result<()> {
+                let mut fp = File::open(fpath)?;
+                let mut data = vec![];
+                for ((start, end), res_tx) in job_rx {
+                    data.resize((end - start) as usize, 0);
+                    fp.seek(SeekFrom::Start(start))?;
+                    fp.read_exact(&mut data)?;
+                    // a bzip2 job might start at a false signature,
+                    // it's reported as `None` and decoded serially
+                    let mut out = Vec::with_capacity(data.len() * 8);
+                    let rslt = match compression {
+                        Compression::Gzip => MultiGzDecoder::new(&data[..]).read_to_end(&mut out),
+                        _ => MultiBzDecoder::new(&data[..]).read_to_end(&mut out),
+                    };
+                    // receiver is gone if forwarding is stopped
+                    let _ = res_tx.send(((start, end), rslt.ok().map(|_| out)));
+                }
+                Ok(())
+            });
+        }
+        drop(job_rx);
+
+        // at most `2 * num_workers` jobs are in flight
+        let window = 2 * num_workers;
+        let mut pending = VecDeque::with_capacity(window);
+        let mut jobs = jobs.into_iter();
+        // dropped on return, so workers can exit
+        let job_tx = job_tx;
+        loop {
+            while pending.len() < window {
+                let Some(job) = jobs.next() else { break };
+                let (res_tx, res_rx) = crossbeam_channel::bounded(1);
+                if job_tx.send((job, res_tx)).is_err() {
+                    break;
+                }
+                pending.push_back((job, res_rx));
+            }
+            let Some(((start, _), res_rx)) = pending.pop_front() else {
+                return Ok(None);
+            };
+            let Ok(((_, end), Some(data))) = res_rx.recv() else {
+                // decode failed or the worker exited on io error
+                return Ok(Some(start));
+            };
+            if tx.send(Ok(data)).is_err() {
+                return Ok(None);
+            }
+            consumed.store(end, Ordering::Relaxed);
+        }
+    })
+}
+
+/// merge consecutive ranges into jobs of about `JOB_SIZE`
+fn group_jobs(boundaries: &[u64], file_size: u64) -> Vec<Job> {
+    let mut jobs = vec![];
+    let mut job_start = 0;
+    for &b in boundaries.iter().skip(1) {
+        if b - job_start >= JOB_SIZE {
+            jobs.push((job_start, b));
+            job_start = b;
+        }
+    }
+    if file_size > job_start {
+        jobs.push((job_start, file_size));
+    }
+    jobs
+}
+
+/// start of each member of a BGZF file, the size of a member
+/// is stored in the "BC" extra field of its header.
+/// Returns a single job if the file is not BGZF.
+fn scan_bgzf_members(fpath: &str) -> io::Result<Vec<Job>> {
+    let file_size = fs::metadata(fpath)?.len();
+    let mut fp = File::open(fpath)?;
+    let mut header = [0u8; 18];
+    let mut boundaries = vec![];
+    let mut pos = 0;
+    while pos < file_size {
+        fp.seek(SeekFrom::Start(pos))?;
+        let is_bgzf = fp.read_exact(&mut header).is_ok()
+            // ID1, ID2, CM = deflate, FLG = FEXTRA
+            && header[..4] == [0x1f, 0x8b, 8, 4]
+            // XLEN = 6, SI1 = 'B', SI2 = 'C', SLEN = 2
+            && header[10..16] == [6, 0, b'B', b'C', 2, 0];
+        if !is_bgzf {
+            return Ok(vec![(0, file_size)]);
+        }
+        boundaries.push(pos);
+        // BSIZE is the member size minus 1
+        pos += u16::from_le_bytes([header[16], header[17]]) as u64 + 1;
+    }
+    Ok(group_jobs(&boundaries, file_size))
+}
+
+/// start of each stream of a bzip2 file, a stream starts
+/// with "BZh" + block size + block magic.
+///
+/// Streams are byte aligned but blocks inside are not, so a file
+/// created by the bzip2 cli has only one stream and one job,
+/// it is detected in the first `BZ2_PROBE_SIZE` bytes.
+fn scan_bz2_streams(fpath: &str) -> io::Result<Vec<Job>> {
+    let file_size = fs::metadata(fpath)?.len();
+    let mut fp = File::open(fpath)?;
+    let mut buf = vec![0u8; SCAN_BUFFER_SIZE];
+    let mut boundaries = vec![];
+    // start of `buf` in the file, and number of valid bytes
+    let mut buf_start = 0u64;
+    let mut filled = 0;
+    loop {
+        let n = fp.read(&mut buf[filled..])?;
+        filled += n;
+        if filled < 10 {
+            break;
+        }
+        let data = &buf[..filled];
+        for i in 0..=filled - 10 {
+            if data[i] == b'B'
+                && data[i + 1] == b'Z'
+                && data[i + 2] == b'h'
+                && (b'1'..=b'9').contains(&data[i + 3])
+                && data[i + 4..i + 10] == BZ2_BLOCK_MAGIC
+            {
+                boundaries.push(buf_start + i as u64);
+            }
+        }
+        if n == 0 {
+            break;
+        }
+        if boundaries.first() != Some(&0)
+            || (boundaries.len() < 2 && buf_start + filled as u64 >= BZ2_PROBE_SIZE)
+        {
+            // not a multi-stream file, e.g. created by the bzip2 cli
+            return Ok(vec![(0, file_size)]);
+        }
+        // keep the last 9 bytes, a signature might cross buffers
+        let keep = 9;
+        buf.copy_within(filled - keep..filled, 0);
+        buf_start += (filled - keep) as u64;
+        filled = keep;
+    }
+    if boundaries.first() != Some(&0) {
+        return Ok(vec![(0, file_size)]);
+    }
+    Ok(group_jobs(&boundaries, file_size))
+}
@@ -0,0 +1,1445 @@
+//
+// ingest.rs
+// Author: noonchen - chennoon233@foxmail.com
+// Created Date: October 18th 2026
+// -----
+// Last Modified: Sun Oct 18 2026
+// Modified By: noonchen
+// -----
+// Copyright (c) 2026 noonchen
+//
+
+use crate::database_context::DataBaseCtx;
+use crate::decompress::DecompressedStream;
+use crate::mapped_file::{MappedStdf, RawRecord};
+use crate::rust_functions::{
+    get_file_size, process_incoming_record, process_summary_data, process_summary_record,
+    IngestProfile, RecordTracker, TestIDType,
+};
+use crate::StdfHelperError;
+use crossbeam_channel::{Receiver, Sender};
+use rusqlite::Connection;
+use rust_stdf::{stdf_file::*, stdf_record_type::*, ByteOrder, StdfRecord};
+use std::collections::{HashMap, VecDeque};
+use std::fs::{self, File};
+use std::io::{self, BufReader, Read, Seek, SeekFrom};
+use std::sync::atomic::{AtomicBool, AtomicU16, Ordering};
+use std::thread::{self, JoinHandle};
+use std::time;
+
+/// uncompressed files larger than this will be split
+/// into segments and decoded in parallel
+const SEGMENT_MODE_MIN_SIZE: u64 = 64 * 1024 * 1024;
+/// approximate size of a segment, a segment can only
+/// be closed at a part or wafer boundary, so it may be larger
+const SEGMENT_TARGET_SIZE: u64 = 4 * 1024 * 1024;
+const READ_BUFFER_SIZE: usize = 1 << 20;
+/// commit and begin a new transaction after this many records
+pub const RECORDS_PER_TRANSACTION: u64 = 1_000_000;
+/// commit interval in progressive mode, each commit is a snapshot
+pub const SNAPSHOT_INTERVAL: time::Duration = time::Duration::from_secs(5);
+/// at most this many sub files of a file group are read at the same time
+pub const PARALLEL_SUBFILES: usize = 4;
+/// max number of chunks of a sub file that are sent but not written
+pub const SUBFILE_CREDITS: usize = 32;
+/// records are sent between threads in chunks of this size,
+/// channels are synchronized per chunk instead of per record
+pub const RECORDS_PER_CHUNK: usize = 1024;
+/// initial capacity of the data buffer of a raw chunk
+const RAW_CHUNK_BYTES: usize = 256 * 1024;
+/// a summary session reads at most this many bytes
+/// from the file head before the first part
+const SUMMARY_HEAD_LIMIT: u64 = 16 * 1024 * 1024;
+/// size of the first tail window of a summary session, it grows
+/// until the last part is found or the max size is reached
+const SUMMARY_TAIL_WINDOW: u64 = 1024 * 1024;
+const SUMMARY_TAIL_WINDOW_MAX: u64 = 64 * 1024 * 1024;
+
+/// a bounded pool of recycled buffers shared by threads.
+///
+/// A buffer is created if the pool is empty, and
+/// dropped if the pool is full when it is given back.
+pub struct BufferPool<T> {
+    tx: Sender<T>,
+    rx: Receiver<T>,
+}
+
+impl<T> Clone for BufferPool<T> {
+    fn clone(&self) -> Self {
+        BufferPool {
+            tx: self.tx.clone(),
+            rx: self.rx.clone(),
+        }
+    }
+}
+
+impl<T> BufferPool<T> {
+    pub fn new(capacity: usize) -> Self {
+        let (tx, rx) = crossbeam_channel::bounded(capacity);
+        BufferPool { tx, rx }
+    }
+
+    /// take a recycled buffer, or create one by `new_buf`
+    #[inline(always)]
+    pub fn take_or<F: FnOnce() -> T>(&self, new_buf: F) -> T {
+        self.rx.try_recv().unwrap_or_else(|_| new_buf())
+    }
+
+    #[inline(always)]
+    pub fn give_back(&self, buf: T) {
+        let _ = self.tx.try_send(buf);
+    }
+}
+
+/// raw records of a sub file packed into one buffer,
+/// sent from reader threads to decode workers
+pub struct RawChunk {
+    pub file_id: usize,
+    pub subfile_id: usize,
+    /// sequence of the first record in the sub file
+    pub first_seq: u64,
+    byte_order: ByteOrder,
+    /// (offset, record type code, end of data in `data`, progress x100)
+    records: Vec<(u64, u64, usize, f32)>,
+    data: Vec<u8>,
+}
+
+impl RawChunk {
+    fn new() -> Self {
+        RawChunk {
+            file_id: 0,
+            subfile_id: 0,
+            first_seq: 0,
+            byte_order: ByteOrder::LittleEndian,
+            records: Vec::with_capacity(RECORDS_PER_CHUNK),
+            data: Vec::with_capacity(RAW_CHUNK_BYTES),
+        }
+    }
+
+    /// an empty chunk from `pool` whose first record is `first_seq`
+    pub fn take(
+        pool: &BufferPool<RawChunk>,
+        file_id: usize,
+        subfile_id: usize,
+        first_seq: u64,
+    ) -> Self {
+        let mut chunk = pool.take_or(RawChunk::new);
+        chunk.file_id = file_id;
+        chunk.subfile_id = subfile_id;
+        chunk.first_seq = first_seq;
+        chunk.records.clear();
+        chunk.data.clear();
+        chunk
+    }
+
+    #[inline(always)]
+    pub fn is_empty(&self) -> bool {
+        self.records.is_empty()
+    }
+
+    #[inline(always)]
+    pub fn is_full(&self) -> bool {
+        self.records.len() >= RECORDS_PER_CHUNK
+    }
+
+    /// append a raw record, all records
+    /// of a sub file share the same byte order
+    #[inline(always)]
+    pub fn push(
+        &mut self,
+        offset: u64,
+        rec_code: u64,
+        byte_order: ByteOrder,
+        raw_data: &[u8],
+        progress_x100: f32,
+    ) {
+        self.byte_order = byte_order;
+        self.data.extend_from_slice(raw_data);
+        self.records
+            .push((offset, rec_code, self.data.len(), progress_x100));
+    }
+
+    /// decode all records and append them to `out`
+    pub fn decode_into(&self, out: &mut Vec<DecodedRecord>) {
+        let mut start = 0;
+        for (i, &(offset, rec_code, end, progress_x100)) in self.records.iter().enumerate() {
+            let mut record = StdfRecord::new(rec_code);
+            record.read_from_bytes(&self.data[start..end], &self.byte_order);
+            out.push(DecodedRecord {
+                file_id: self.file_id,
+                subfile_id: self.subfile_id,
+                seq: self.first_seq + i as u64,
+                progress_x100,
+                byte_order: self.byte_order,
+                offset,
+                data_len: end - start,
+                record,
+            });
+            start = end;
+        }
+    }
+}
+
+/// a record decoded by a worker, ready to be
+/// consumed by the database writer
+pub struct DecodedRecord {
+    pub file_id: usize,
+    pub subfile_id: usize,
+    /// monotonic sequence number inside a sub file,
+    /// used for restoring the original record order
+    pub seq: u64,
+    pub progress_x100: f32,
+    pub byte_order: ByteOrder,
+    pub offset: u64,
+    pub data_len: usize,
+    pub record: StdfRecord,
+}
+
+/// decoded records of a sub file with consecutive sequence numbers
+pub type DecodedChunk = Vec<DecodedRecord>;
+
+/// an empty decoded chunk from `pool`
+#[inline(always)]
+pub fn take_decoded_chunk(pool: &BufferPool<DecodedChunk>) -> DecodedChunk {
+    let mut chunk = pool.take_or(|| Vec::with_capacity(RECORDS_PER_CHUNK));
+    chunk.clear();
+    chunk
+}
+
+impl DecodedRecord {
+    #[inline(always)]
+    pub fn into_rec_info(self) -> (usize, usize, ByteOrder, u64, usize, StdfRecord) {
+        (
+            self.file_id,
+            self.subfile_id,
+            self.byte_order,
+            self.offset,
+            self.data_len,
+            self.record,
+        )
+    }
+}
+
+/// reading progress x100 of a file inside a file group,
+/// `file_progress` is the progress of the file in [0, 1]
+#[inline(always)]
+pub fn read_progress(file_progress: f32, subfile_id: usize, num_files: usize) -> f32 {
+    10000.0 * (file_progress + subfile_id as f32) / num_files as f32
+}
+
+/// read until `buf` is full or EOF, returns number of bytes read
+fn read_full<R: Read>(reader: &mut R, buf: &mut [u8]) -> io::Result<usize> {
+    let mut n = 0;
+    while n < buf.len() {
+        match reader.read(&mut buf[n..]) {
+            Ok(0) => break,
+            Ok(m) => n += m,
+            Err(e) if e.kind() == io::ErrorKind::Interrupted => {}
+            Err(e) => return Err(e),
+        }
+    }
+    Ok(n)
+}
+
+/// read records of `fpath` in order without decoding, and pass each
+/// record and the reading progress of the file in [0, 1] to `f`,
+/// stop if `f` returns `false`.
+///
+/// uncompressed files are mapped into memory, see `MappedStdf`,
+/// compressed files are decompressed by `num_workers` background
+/// threads, see `DecompressedStream`, otherwise `StdfReader` is used.
+///
+/// Returns `false` if reading stopped at an unexpected EOF or broken data.
+pub fn visit_raw_records<F, E>(
+    fpath: &str,
+    file_size: u64,
+    num_workers: usize,
+    mut f: F,
+) -> Result<bool, E>
+where
+    F: FnMut(&RawRecord, f32) -> Result<bool, E>,
+    E: From<StdfHelperError>,
+{
+    if let Some(mapped) = MappedStdf::open(fpath) {
+        let file_size = mapped.file_size() as f32;
+        let mut records = mapped.records();
+        for rec in records.by_ref() {
+            if !f(&rec, rec.offset as f32 / file_size)? {
+                return Ok(true);
+            }
+        }
+        return Ok(records.is_complete());
+    }
+
+    let Some(mut stream) = DecompressedStream::open(fpath, num_workers)? else {
+        let file_size = file_size as f32;
+        let mut stdf_reader = match StdfReader::new(fpath) {
+            Ok(r) => r,
+            Err(e) => {
+                return Err(StdfHelperError {
+                    msg: format!("Cannot parse this file:\n{}\n\nMessage:\n{}", fpath, e),
+                }
+                .into())
+            }
+        };
+        for raw_rec in stdf_reader.get_rawdata_iter() {
+            let Ok(raw_rec) = raw_rec else {
+                // there is only one error, that is unexpected EOF
+                return Ok(false);
+            };
+            let rec = RawRecord {
+                offset: raw_rec.offset,
+                typ: raw_rec.header.typ,
+                sub: raw_rec.header.sub,
+                byte_order: raw_rec.byte_order,
+                data: &raw_rec.raw_data,
+            };
+            if !f(&rec, rec.offset as f32 / file_size)? {
+                break;
+            }
+        }
+        return Ok(true);
+    };
+
+    // first record must be FAR, whose REC_LEN is always 2,
+    // it's how the byte order is determined
+    let mut header = [0u8; 4];
+    if !matches!(read_full(&mut stream, &mut header), Ok(4)) || header[2] != 0 || header[3] != 10 {
+        return Err(StdfHelperError {
+            msg: format!(
+                "Cannot parse this file:\n{}\n\nMessage:\n{}",
+                fpath, "FAR is not found at the beginning of the file"
+            ),
+        }
+        .into());
+    }
+    let order = if u16::from_le_bytes([header[0], header[1]]) == 2 {
+        ByteOrder::LittleEndian
+    } else {
+        ByteOrder::BigEndian
+    };
+    let mut raw_data = Vec::with_capacity(u16::MAX as usize);
+    let mut offset = 0u64;
+    loop {
+        let len = header_len(&header, &order) as usize;
+        raw_data.resize(len, 0);
+        if !matches!(read_full(&mut stream, &mut raw_data), Ok(n) if n == len) {
+            return Ok(false);
+        }
+        let rec = RawRecord {
+            offset,
+            typ: header[2],
+            sub: header[3],
+            byte_order: order,
+            data: &raw_data,
+        };
+        if !f(&rec, stream.progress())? {
+            return Ok(true);
+        }
+        offset += 4 + len as u64;
+        match read_full(&mut stream, &mut header) {
+            Ok(0) => return Ok(true),
+            Ok(4) => {}
+            // truncated header or broken stream
+            _ => return Ok(false),
+        }
+    }
+}
+
+/// number of decode workers, leave some cores to
+/// reader threads and the sqlite writer
+pub fn default_decode_workers() -> usize {
+    let cores = thread::available_parallelism()
+        .map(|n| n.get())
+        .unwrap_or(2);
+    cores.saturating_sub(2).clamp(1, 8)
+}
+
+/// spawn `num_workers` threads that convert raw chunks into
+/// `StdfRecord`, workers exit when either side of the channel is closed.
+///
+/// Raw chunks are given back to `raw_pool` once decoded,
+/// decoded chunks are taken from `decoded_pool`.
+pub fn spawn_decode_workers(
+    num_workers: usize,
+    raw_rx: Receiver<RawChunk>,
+    decoded_tx: Sender<DecodedChunk>,
+    raw_pool: BufferPool<RawChunk>,
+    decoded_pool: BufferPool<DecodedChunk>,
+) -> Vec<JoinHandle<Result<(), StdfHelperError>>> {
+    (0..num_workers.max(1))
+        .map(|_| {
+            let raw_rx = raw_rx.clone();
+            let decoded_tx = decoded_tx.clone();
+            let raw_pool = raw_pool.clone();
+            let decoded_pool = decoded_pool.clone();
+            thread::spawn(move || -> Result<(), StdfHelperError> {
+                for raw_chunk in raw_rx {
+                    let mut decoded = take_decoded_chunk(&decoded_pool);
+                    raw_chunk.decode_into(&mut decoded);
+                    raw_pool.give_back(raw_chunk);
+                    if decoded_tx.send(decoded).is_err() {
+                        // writer has stopped
+                        break;
+                    }
+                }
+                Ok(())
+            })
+        })
+        .collect()
+}
+
+/// decode workers may finish chunks out of order, and sub files
+/// of a file id are read in parallel, this buffer holds early
+/// arrivals until the chunk starting at the expected sub file
+/// and sequence of the file id shows up.
+///
+/// The writer moves to the next sub file once the end of
+/// the current one is reported by `end_subfile`.
+pub struct ReorderBuffer {
+    // (sub file id, sequence) expected next
+    next: Vec<(usize, u64)>,
+    // sub file id -> number of records of a finished sub file
+    ends: Vec<HashMap<usize, u64>>,
+    // (sub file id, first sequence of a chunk) -> chunk
+    pending: Vec<HashMap<(usize, u64), DecodedChunk>>,
+}
+
+impl ReorderBuffer {
+    pub fn new(num_files: usize) -> Self {
+        ReorderBuffer {
+            next: vec![(0, 0); num_files],
+            ends: (0..num_files).map(|_| HashMap::new()).collect(),
+            pending: (0..num_files).map(|_| HashMap::new()).collect(),
+        }
+    }
+
+    /// returns the file id of `chunk`, empty chunks are ignored
+    #[inline(always)]
+    pub fn push(&mut self, chunk: DecodedChunk) -> Option<usize> {
+        let (file_id, key) = match chunk.first() {
+            Some(first) => (first.file_id, (first.subfile_id, first.seq)),
+            None => return None,
+        };
+        self.pending[file_id].insert(key, chunk);
+        Some(file_id)
+    }
+
+    /// `num_records` were sent from the sub file,
+    /// returns the file id
+    pub fn end_subfile(&mut self, (file_id, subfile_id, num_records): SubfileEnd) -> usize {
+        self.ends[file_id].insert(subfile_id, num_records);
+        file_id
+    }
+
+    /// pop the next in-order chunk of `file_id`, if arrived
+    #[inline(always)]
+    pub fn pop_ready(&mut self, file_id: usize) -> Option<DecodedChunk> {
+        loop {
+            let (subfile_id, seq) = self.next[file_id];
+            if let Some(chunk) = self.pending[file_id].remove(&(subfile_id, seq)) {
+                self.next[file_id].1 += chunk.len() as u64;
+                return Some(chunk);
+            }
+            if self.ends[file_id].get(&subfile_id) != Some(&seq) {
+                return None;
+            }
+            // all records of this sub file are written
+            self.ends[file_id].remove(&subfile_id);
+            self.next[file_id] = (subfile_id + 1, 0);
+        }
+    }
+}
+
+/// (file id, sub file id, number of records sent)
+pub type SubfileEnd = (usize, usize, u64);
+
+/// read a sub file of a file group, and send its records to the
+/// decode workers, or to the writer directly in the segment mode.
+///
+/// Records are numbered from 0 in each sub file. A chunk is sent only
+/// after a credit is put into `credits`, the writer takes the credit
+/// back when the chunk is written, so a sub file that is read ahead
+/// of the writer holds a bounded number of chunks.
+///
+/// Returns the number of records sent, or `None` if the writer has stopped.
+#[allow(clippy::too_many_arguments)]
+pub fn read_subfile(
+    fpath: &str,
+    file_id: usize,
+    subfile_id: usize,
+    num_files: usize,
+    num_workers: usize,
+    raw_tx: &Sender<RawChunk>,
+    decoded_tx: &Sender<DecodedChunk>,
+    raw_pool: &BufferPool<RawChunk>,
+    decoded_pool: &BufferPool<DecodedChunk>,
+    credits: &Sender<()>,
+    profile: &IngestProfile,
+) -> Result<Option<u64>, StdfHelperError> {
+    let file_size = get_file_size(fpath)?;
+    if file_size == 0 {
+        return Err(StdfHelperError {
+            msg: format!("Empty file detected!\n\n{}", fpath),
+        });
+    }
+    let mut seq: u64 = 0;
+    // large uncompressed files are split by PIR/PRR
+    // segments and decoded on all cores, the writer
+    // still receives records in the file order
+    if let Some((order, segments)) = scan_segments(fpath, file_size)? {
+        let writer_alive = parse_segments(
+            fpath,
+            file_id,
+            subfile_id,
+            num_files,
+            order,
+            segments,
+            num_workers,
+            &mut seq,
+            decoded_tx,
+            decoded_pool,
+            credits,
+            profile,
+        )?;
+        return Ok(writer_alive.then_some(seq));
+    }
+    // a chunk never spans two sub files
+    let mut chunk = RawChunk::take(raw_pool, file_id, subfile_id, seq);
+    let mut sampler = profile.sampler(subfile_id as u64, &[]);
+    let mut writer_alive = true;
+    // same as `StdfReader`, stop silently at unexpected EOF
+    visit_raw_records::<_, StdfHelperError>(
+        fpath,
+        file_size,
+        num_workers,
+        |rec, file_progress| {
+            let rec_code = rec.rec_code();
+            if profile.skip_raw(rec_code, rec.data, &rec.byte_order)
+                || sampler.skip_raw(rec_code, rec.data)
+            {
+                return Ok(true);
+            }
+            // calculate the reading progress in each thread
+            let progress_x100 = read_progress(file_progress, subfile_id, num_files);
+            // copy into the chunk, the file buffer is
+            // reused in this thread instead of the workers
+            chunk.push(rec.offset, rec_code, rec.byte_order, rec.data, progress_x100);
+            seq += 1;
+            // send
+            if chunk.is_full() {
+                let full = std::mem::replace(
+                    &mut chunk,
+                    RawChunk::take(raw_pool, file_id, subfile_id, seq),
+                );
+                writer_alive = credits.send(()).is_ok() && raw_tx.send(full).is_ok();
+            }
+            Ok(writer_alive)
+        },
+    )?;
+    if !writer_alive
+        || (!chunk.is_empty() && (credits.send(()).is_err() || raw_tx.send(chunk).is_err()))
+    {
+        return Ok(None);
+    }
+    Ok(Some(seq))
+}
+
+/// byte range [start, end) of a stdf file
+pub struct FileSegment {
+    pub start: u64,
+    pub end: u64,
+    /// (head, site, PIR count) before `start`, the
+    /// sampler of a segment continues from these counts
+    pub parts_before: Vec<(u8, u8, u64)>,
+}
+
+/// decoded records of a segment, (offset, data length, record)
+type SegmentRecords = Vec<(u64, usize, StdfRecord)>;
+type SegmentJob = (FileSegment, Sender<Result<SegmentRecords, StdfHelperError>>);
+
+#[inline(always)]
+fn header_len(header: &[u8; 4], order: &ByteOrder) -> u16 {
+    match order {
+        ByteOrder::LittleEndian => u16::from_le_bytes([header[0], header[1]]),
+        ByteOrder::BigEndian => u16::from_be_bytes([header[0], header[1]]),
+    }
+}
+
+/// byte order of an uncompressed stdf file, `None` if
+/// the file does not start with a FAR
+fn read_byte_order(fpath: &str) -> Result<Option<ByteOrder>, StdfHelperError> {
+    let mut header = [0u8; 4];
+    match File::open(fpath)?.read_exact(&mut header) {
+        Ok(_) => {}
+        Err(e) if e.kind() == io::ErrorKind::UnexpectedEof => return Ok(None),
+        Err(e) => return Err(e.into()),
+    }
+    // first record must be FAR, whose REC_LEN is always 2,
+    // it's how the byte order is determined
+    if header[2] != 0 || header[3] != 10 {
+        return Ok(None);
+    }
+    if u16::from_le_bytes([header[0], header[1]]) == 2 {
+        Ok(Some(ByteOrder::LittleEndian))
+    } else {
+        Ok(Some(ByteOrder::BigEndian))
+    }
+}
+
+/// 1st pass of the segment mode, only record headers are read.
+///
+/// A segment is closed right before a PIR when no part is open,
+/// or before a WIR/WRR, so a PIR...PRR group is never split.
+/// Returns `None` if the file should be parsed serially,
+/// e.g. compressed, small or contains invalid records.
+pub fn scan_segments(
+    fpath: &str,
+    file_size: u64,
+) -> Result<Option<(ByteOrder, Vec<FileSegment>)>, StdfHelperError> {
+    if file_size < SEGMENT_MODE_MIN_SIZE
+        || [".gz", ".bz2", ".zip"].iter().any(|ext| fpath.ends_with(ext))
+    {
+        return Ok(None);
+    }
+
+    let Some(order) = read_byte_order(fpath)? else {
+        return Ok(None);
+    };
+    let mut reader = BufReader::with_capacity(READ_BUFFER_SIZE, File::open(fpath)?);
+    let mut header = [0u8; 4];
+
+    let mut segments = vec![];
+    let mut seg_start = 0u64;
+    let mut pos = 0u64;
+    let mut open_parts = 0u32;
+    // (head, site, PIR count) so far
+    let mut parts_seen: Vec<(u8, u8, u64)> = vec![];
+    let mut seg_parts_before = vec![];
+    let mut head_site = [0u8; 2];
+    loop {
+        match reader.read_exact(&mut header) {
+            Ok(_) => {}
+            Err(e) if e.kind() == io::ErrorKind::UnexpectedEof => break,
+            Err(e) => return Err(e.into()),
+        }
+        let len = header_len(&header, &order) as u64;
+        let rec_code = get_code_from_typ_sub(header[2], header[3]);
+        if rec_code == REC_INVALID {
+            // let the serial path report the error
+            return Ok(None);
+        }
+        let rec_end = pos + 4 + len;
+        if rec_end > file_size {
+            // truncated record, serial path stops here as well
+            break;
+        }
+
+        let is_boundary = (rec_code == REC_PIR && open_parts == 0)
+            || rec_code == REC_WIR
+            || rec_code == REC_WRR;
+        if is_boundary && pos - seg_start >= SEGMENT_TARGET_SIZE {
+            segments.push(FileSegment {
+                start: seg_start,
+                end: pos,
+                parts_before: std::mem::replace(&mut seg_parts_before, parts_seen.clone()),
+            });
+            seg_start = pos;
+        }
+        let mut skip_len = len as i64;
+        if rec_code == REC_PIR {
+            open_parts += 1;
+            // HEAD_NUM, SITE_NUM
+            if len >= 2 {
+                reader.read_exact(&mut head_site)?;
+                skip_len -= 2;
+                let [head, site] = head_site;
+                match parts_seen.iter_mut().find(|p| p.0 == head && p.1 == site) {
+                    Some(p) => p.2 += 1,
+                    None => parts_seen.push((head, site, 1)),
+                }
+            }
+        } else if rec_code == REC_PRR {
+            open_parts = open_parts.saturating_sub(1);
+        }
+
+        reader.seek_relative(skip_len)?;
+        pos = rec_end;
+    }
+    if pos > seg_start {
+        segments.push(FileSegment {
+            start: seg_start,
+            end: pos,
+            parts_before: seg_parts_before,
+        });
+    }
+
+    if segments.len() < 2 {
+        return Ok(None);
+    }
+    Ok(Some((order, segments)))
+}
+
+/// 2nd pass of the segment mode, decode all records
+/// in a segment that are not skipped by `profile`
+fn decode_segment(
+    fpath: &str,
+    order: ByteOrder,
+    seg: &FileSegment,
+    profile: &IngestProfile,
+    mapped: Option<&MappedStdf>,
+) -> Result<SegmentRecords, StdfHelperError> {
+    let mut records = Vec::with_capacity(4096);
+    visit_segment(fpath, order, seg, profile, mapped, |offset, len, rec| {
+        records.push((offset, len, rec));
+        Ok(true)
+    })?;
+    Ok(records)
+}
+
+/// decode records in a segment one by one and pass
+/// (offset, data length, record) to `f`, stop if `f` returns `false`.
+///
+/// records are read from `mapped` if given, records skipped by
+/// `profile` are not decoded, a segment never splits a part,
+/// its parts are sampled after `parts_before` of the segment.
+///
+/// returns (head, site, part count) at the end of the segment
+fn visit_segment<F>(
+    fpath: &str,
+    order: ByteOrder,
+    seg: &FileSegment,
+    profile: &IngestProfile,
+    mapped: Option<&MappedStdf>,
+    mut f: F,
+) -> Result<Vec<(u8, u8, u64)>, StdfHelperError>
+where
+    F: FnMut(u64, usize, StdfRecord) -> Result<bool, StdfHelperError>,
+{
+    let mut sampler = profile.sampler(seg.start, &seg.parts_before);
+    let mut visit = |rec: RawRecord| -> Result<bool, StdfHelperError> {
+        let rec_code = rec.rec_code();
+        if profile.skip_raw(rec_code, rec.data, &rec.byte_order)
+            || sampler.skip_raw(rec_code, rec.data)
+        {
+            return Ok(true);
+        }
+        f(rec.offset, rec.data.len(), rec.decode())
+    };
+    if let Some(mapped) = mapped {
+        for rec in mapped.records_in(seg.start, seg.end) {
+            if !visit(rec)? {
+                break;
+            }
+        }
+        return Ok(sampler.parts_seen());
+    }
+
+    let mut fp = File::open(fpath)?;
+    fp.seek(SeekFrom::Start(seg.start))?;
+    let mut reader = BufReader::with_capacity(READ_BUFFER_SIZE, fp.take(seg.end - seg.start));
+
+    let mut header = [0u8; 4];
+    let mut raw_data = Vec::with_capacity(u16::MAX as usize);
+    let mut offset = seg.start;
+    while offset < seg.end {
+        reader.read_exact(&mut header)?;
+        let len = header_len(&header, &order) as usize;
+        raw_data.resize(len, 0);
+        reader.read_exact(&mut raw_data)?;
+
+        let rec = RawRecord {
+            offset,
+            typ: header[2],
+            sub: header[3],
+            byte_order: order,
+            data: &raw_data,
+        };
+        offset += 4 + len as u64;
+        if !visit(rec)? {
+            break;
+        }
+    }
+    Ok(sampler.parts_seen())
+}
+
+/// decode segments of a file in `num_workers` threads, and forward
+/// decoded records to the writer in the original order,
+/// packed in chunks taken from `decoded_pool`.
+///
+/// `seq` is the sequence number of the sub file, it is
+/// updated after each record is sent, a credit is put
+/// into `credits` before each chunk is sent.
+/// Returns `false` if the writer has stopped.
+#[allow(clippy::too_many_arguments)]
+pub fn parse_segments(
+    fpath: &str,
+    file_id: usize,
+    subfile_id: usize,
+    num_files: usize,
+    order: ByteOrder,
+    segments: Vec<FileSegment>,
+    num_workers: usize,
+    seq: &mut u64,
+    decoded_tx: &Sender<DecodedChunk>,
+    decoded_pool: &BufferPool<DecodedChunk>,
+    credits: &Sender<()>,
+    profile: &IngestProfile,
+) -> Result<bool, StdfHelperError> {
+    let file_size = segments.last().map(|s| s.end).unwrap_or(1) as f32;
+    let num_workers = num_workers.max(1);
+    let (job_tx, job_rx) = crossbeam_channel::unbounded::<SegmentJob>();
+    // workers share one mapping of the file if possible
+    let mapped = MappedStdf::open(fpath);
+    let mapped = mapped.as_ref();
+
+    thread::scope(|s| -> Result<bool, StdfHelperError> {
+        for _ in 0..num_workers {
+            let job_rx = job_rx.clone();
+            s.spawn(move || {
+                for (seg, res_tx) in job_rx {
+                    // receiver is gone if forwarding is stopped
+                    let _ = res_tx.send(decode_segment(fpath, order, &seg, profile, mapped));
+                }
+            });
+        }
+        drop(job_rx);
+
+        // at most `2 * num_workers` segments are in flight,
+        // which bounds the memory of decoded records
+        let window = 2 * num_workers;
+        let mut pending = VecDeque::with_capacity(window);
+        let mut segments = segments.into_iter();
+        // move job_tx into this closure, it is dropped on return
+        // so workers can exit before the scope joins them
+        let job_tx = job_tx;
+        loop {
+            while pending.len() < window {
+                let Some(seg) = segments.next() else { break };
+                let (res_tx, res_rx) = crossbeam_channel::bounded(1);
+                if job_tx.send((seg, res_tx)).is_err() {
+                    break;
+                }
+                pending.push_back(res_rx);
+            }
+            let Some(res_rx) = pending.pop_front() else {
+                return Ok(true);
+            };
+            let records = match res_rx.recv() {
+                Ok(r) => r?,
+                Err(_) => {
+                    return Err(StdfHelperError {
+                        msg: format!("Segment decoder exited unexpectedly:\n{}", fpath),
+                    })
+                }
+            };
+            let mut chunk = take_decoded_chunk(decoded_pool);
+            for (offset, data_len, record) in records {
+                chunk.push(DecodedRecord {
+                    file_id,
+                    subfile_id,
+                    seq: *seq,
+                    progress_x100: read_progress(offset as f32 / file_size, subfile_id, num_files),
+                    byte_order: order,
+                    offset,
+                    data_len,
+                    record,
+                });
+                *seq += 1;
+                if chunk.len() >= RECORDS_PER_CHUNK {
+                    let full = std::mem::replace(&mut chunk, take_decoded_chunk(decoded_pool));
+                    if credits.send(()).is_err() || decoded_tx.send(full).is_err() {
+                        return Ok(false);
+                    }
+                }
+            }
+            if !chunk.is_empty()
+                && (credits.send(()).is_err() || decoded_tx.send(chunk).is_err())
+            {
+                return Ok(false);
+            }
+        }
+    })
+}
+
+/// parse a file group into its own shard database,
+/// returns number of test ids used in the shard
+fn ingest_shard(
+    shard_path: &str,
+    file_id: usize,
+    fgroup: &[String],
+    test_id_type: TestIDType,
+    batch_size: usize,
+    mpr_blob: bool,
+    profile: &IngestProfile,
+    num_workers: usize,
+    progress: &AtomicU16,
+    stop: &AtomicBool,
+) -> Result<usize, StdfHelperError> {
+    let conn = Connection::open(shard_path)?;
+    let mut db_ctx = DataBaseCtx::new(&conn, batch_size)?;
+    db_ctx.set_mpr_blob(mpr_blob);
+    for (sub_fid, fpath) in fgroup.iter().enumerate() {
+        db_ctx.insert_file_name(rusqlite::params![file_id, sub_fid, fpath])?;
+        if let Some(desc) = profile.sample_desc() {
+            db_ctx.insert_file_info(rusqlite::params![file_id, sub_fid, "SAMPLED", desc])?;
+        }
+    }
+
+    let mut record_tracker = RecordTracker::new(test_id_type);
+    record_tracker.set_profile(profile.clone());
+    ingest_files_serial(
+        &mut db_ctx,
+        &mut record_tracker,
+        file_id,
+        0,
+        fgroup,
+        RECORDS_PER_TRANSACTION,
+        num_workers,
+        progress,
+        stop,
+    )?;
+    process_summary_data(&mut db_ctx, &mut record_tracker)?;
+    progress.store(10000, Ordering::Relaxed);
+    db_ctx.flush_batches()?;
+    db_ctx.record_insert_stats(&format!("File[{}] ", file_id));
+    // indexes are built once in the merged database
+    db_ctx.finalize(false)?;
+    if let Err((_, err)) = conn.close() {
+        return Err(StdfHelperError::from(err));
+    };
+    Ok(record_tracker.num_test_ids())
+}
+
+/// parse `fpaths` in order and write them as sub files of `file_id`,
+/// sub file ids start from `first_subfile_id`.
+///
+/// Files are read by `read_subfile` in a reader thread, records are
+/// decoded by `num_workers` threads or in the segment mode, same as a
+/// file group of a new session, only the writer runs in this thread.
+///
+/// summary data is not written, caller should
+/// call `process_summary_data` when all files are done.
+/// A new transaction is started every `transaction_size` records.
+/// Records are filtered by the profile of `record_tracker`.
+#[allow(clippy::too_many_arguments)]
+pub fn ingest_files_serial(
+    db_ctx: &mut DataBaseCtx,
+    record_tracker: &mut RecordTracker,
+    file_id: usize,
+    first_subfile_id: usize,
+    fpaths: &[String],
+    transaction_size: u64,
+    num_workers: usize,
+    progress: &AtomicU16,
+    stop: &AtomicBool,
+) -> Result<(), StdfHelperError> {
+    const CHANNEL_CAP: usize = 16;
+    let num_workers = num_workers.max(1);
+    let num_files = fpaths.len();
+    let (raw_tx, raw_rx) = crossbeam_channel::bounded::<RawChunk>(CHANNEL_CAP);
+    let (decoded_tx, decoded_rx) = crossbeam_channel::bounded::<DecodedChunk>(CHANNEL_CAP);
+    let pool_size = 2 * CHANNEL_CAP + num_workers + 1;
+    let raw_pool = BufferPool::<RawChunk>::new(pool_size);
+    let decoded_pool = BufferPool::<DecodedChunk>::new(pool_size);
+    // sub files are read one by one, they share the credits
+    let (credit_tx, credit_rx) = crossbeam_channel::bounded::<()>(SUBFILE_CREDITS);
+    let (end_tx, end_rx) =
+        crossbeam_channel::unbounded::<Result<SubfileEnd, StdfHelperError>>();
+
+    let mut thread_handles = spawn_decode_workers(
+        num_workers,
+        raw_rx,
+        decoded_tx.clone(),
+        raw_pool.clone(),
+        decoded_pool.clone(),
+    );
+    {
+        let fpaths = fpaths.to_vec();
+        let profile = record_tracker.profile().clone();
+        let decoded_pool = decoded_pool.clone();
+        // sub file ids start from 0 in the reader, which
+        // is the order expected by the reorder buffer
+        thread_handles.push(thread::spawn(move || -> Result<(), StdfHelperError> {
+            for (i, fpath) in fpaths.iter().enumerate() {
+                let num_records = match read_subfile(
+                    fpath,
+                    file_id,
+                    i,
+                    num_files,
+                    num_workers,
+                    &raw_tx,
+                    &decoded_tx,
+                    &raw_pool,
+                    &decoded_pool,
+                    &credit_tx,
+                    &profile,
+                ) {
+                    Ok(Some(n)) => n,
+                    // writer has stopped
+                    Ok(None) => return Ok(()),
+                    Err(e) => {
+                        let _ = end_tx.send(Err(e));
+                        return Ok(());
+                    }
+                };
+                if end_tx.send(Ok((file_id, i, num_records))).is_err() {
+                    return Ok(());
+                }
+            }
+            Ok(())
+        }));
+    }
+
+    let write_rslt = (|| -> Result<(), StdfHelperError> {
+        let mut transaction_count_up = 0;
+        let mut reorder_buffer = ReorderBuffer::new(file_id + 1);
+        let mut sel = crossbeam_channel::Select::new();
+        let chunk_op = sel.recv(&decoded_rx);
+        let end_op = sel.recv(&end_rx);
+        let mut open_channels = 2;
+        'writer: while open_channels > 0 {
+            let oper = sel.select();
+            if oper.index() == chunk_op {
+                match oper.recv(&decoded_rx) {
+                    Ok(decoded_chunk) => {
+                        reorder_buffer.push(decoded_chunk);
+                    }
+                    Err(_) => {
+                        sel.remove(chunk_op);
+                        open_channels -= 1;
+                    }
+                }
+            } else {
+                match oper.recv(&end_rx) {
+                    Ok(subfile_end) => {
+                        reorder_buffer.end_subfile(subfile_end?);
+                    }
+                    Err(_) => {
+                        sel.remove(end_op);
+                        open_channels -= 1;
+                    }
+                }
+            }
+            while let Some(mut decoded_chunk) = reorder_buffer.pop_ready(file_id) {
+                for mut decoded_rec in decoded_chunk.drain(..) {
+                    let progress_x100 = decoded_rec.progress_x100;
+                    decoded_rec.subfile_id += first_subfile_id;
+                    process_incoming_record(db_ctx, record_tracker, decoded_rec.into_rec_info())?;
+
+                    transaction_count_up += 1;
+                    if transaction_count_up % 4096 == 0 {
+                        progress.store(progress_x100 as u16, Ordering::Relaxed);
+                        if stop.load(Ordering::Relaxed) {
+                            break 'writer;
+                        }
+                    }
+                    if transaction_count_up > transaction_size {
+                        transaction_count_up = 0;
+                        db_ctx.start_new_transaction()?;
+                    }
+                }
+                decoded_pool.give_back(decoded_chunk);
+                // the reader can send another chunk
+                let _ = credit_rx.try_recv();
+            }
+        }
+        Ok(())
+    })();
+    // blocked reader and workers exit once the receivers are dropped
+    drop(decoded_rx);
+    drop(end_rx);
+    drop(credit_rx);
+    for handle in thread_handles {
+        handle.join().unwrap()?;
+    }
+    write_rslt
+}
+
+/// end offset of the last complete record after which no part
+/// is open, records beyond it might be still being written
+fn scan_complete_end(
+    fpath: &str,
+    order: ByteOrder,
+    start: u64,
+    file_size: u64,
+) -> Result<u64, StdfHelperError> {
+    let mut fp = File::open(fpath)?;
+    fp.seek(SeekFrom::Start(start))?;
+    let mut reader = BufReader::with_capacity(READ_BUFFER_SIZE, fp);
+    let mut header = [0u8; 4];
+    let mut pos = start;
+    let mut complete_end = start;
+    let mut open_parts = 0u32;
+    loop {
+        match reader.read_exact(&mut header) {
+            Ok(_) => {}
+            Err(e) if e.kind() == io::ErrorKind::UnexpectedEof => break,
+            Err(e) => return Err(e.into()),
+        }
+        let len = header_len(&header, &order) as u64;
+        let rec_end = pos + 4 + len;
+        if rec_end > file_size {
+            break;
+        }
+        let rec_code = get_code_from_typ_sub(header[2], header[3]);
+        if rec_code == REC_PIR {
+            open_parts += 1;
+        } else if rec_code == REC_PRR {
+            open_parts = open_parts.saturating_sub(1);
+        }
+        reader.seek_relative(len as i64)?;
+        pos = rec_end;
+        if open_parts == 0 {
+            complete_end = pos;
+        }
+    }
+    Ok(complete_end)
+}
+
+/// ingest records of a file that is still being written by the tester,
+/// from `offset` to the end of the last complete part.
+///
+/// `offset` must be 0 or a value returned by a previous call,
+/// returns the offset where the next call should start.
+#[allow(clippy::too_many_arguments)]
+pub fn ingest_follow(
+    db_ctx: &mut DataBaseCtx,
+    record_tracker: &mut RecordTracker,
+    file_id: usize,
+    subfile_id: usize,
+    fpath: &str,
+    offset: u64,
+    progress: &AtomicU16,
+    stop: &AtomicBool,
+) -> Result<u64, StdfHelperError> {
+    if [".gz", ".bz2", ".zip"].iter().any(|ext| fpath.ends_with(ext)) {
+        return Err(StdfHelperError {
+            msg: format!("Compressed file cannot be followed:\n{}", fpath),
+        });
+    }
+    let Some(order) = read_byte_order(fpath)? else {
+        // FAR is not written yet
+        return Ok(offset);
+    };
+    let file_size = get_file_size(fpath)?;
+    let end = scan_complete_end(fpath, order, offset, file_size)?;
+    if end == offset {
+        return Ok(offset);
+    }
+
+    let total = (end - offset) as f32;
+    let mut count = 0u64;
+    let profile = record_tracker.profile().clone();
+    // parts are sampled across polls
+    let seg = FileSegment {
+        start: offset,
+        end,
+        parts_before: record_tracker.sampled_parts(file_id),
+    };
+    let parts_seen = visit_segment(
+        fpath,
+        order,
+        &seg,
+        &profile,
+        // the file is growing, it is not mapped
+        None,
+        |rec_offset, data_len, rec| {
+            let rec_info = (file_id, subfile_id, order, rec_offset, data_len, rec);
+            process_incoming_record(db_ctx, record_tracker, rec_info)?;
+            count += 1;
+            if count % 4096 == 0 {
+                progress.store(
+                    (10000.0 * (rec_offset - offset) as f32 / total) as u16,
+                    Ordering::Relaxed,
+                );
+                return Ok(!stop.load(Ordering::Relaxed));
+            }
+            Ok(true)
+        },
+    )?;
+    record_tracker.set_sampled_parts(file_id, parts_seen);
+    Ok(end)
+}
+
+/// each file group is parsed into a shard database by its own thread,
+/// with its own `DataBaseCtx` and `RecordTracker`. Shards are merged
+/// into `db_ctx` in file id order when all of them are done.
+///
+/// Fid is kept in shards, test ids are shifted by the total
+/// test count of previous shards in the merge.
+#[allow(clippy::too_many_arguments)]
+pub fn ingest_sharded(
+    db_ctx: &mut DataBaseCtx,
+    dbpath: &str,
+    stdf_paths: &[Vec<String>],
+    test_id_type: TestIDType,
+    batch_size: usize,
+    mpr_blob: bool,
+    profile: &IngestProfile,
+    total_progress: &AtomicU16,
+    global_stop: &AtomicBool,
+) -> Result<(), StdfHelperError> {
+    let num_groups = stdf_paths.len();
+    let shard_paths: Vec<String> = (0..num_groups)
+        .map(|fid| format!("{}.shard{}", dbpath, fid))
+        .collect();
+    let group_progress: Vec<AtomicU16> = (0..num_groups).map(|_| AtomicU16::new(0)).collect();
+    // shards run at the same time, they share the cores
+    let num_workers = (default_decode_workers() / num_groups).max(1);
+
+    let shard_rslt = thread::scope(|s| -> Result<Vec<usize>, StdfHelperError> {
+        let handles: Vec<_> = stdf_paths
+            .iter()
+            .enumerate()
+            .map(|(fid, fgroup)| {
+                let shard_path = &shard_paths[fid];
+                let progress = &group_progress[fid];
+                s.spawn(move || {
+                    ingest_shard(
+                        shard_path,
+                        fid,
+                        fgroup,
+                        test_id_type,
+                        batch_size,
+                        mpr_blob,
+                        profile,
+                        num_workers,
+                        progress,
+                        global_stop,
+                    )
+                })
+            })
+            .collect();
+
+        // parsing takes most of the time, merging is
+        // shown as complete for the "creating index" message
+        while !handles.iter().all(|h| h.is_finished()) {
+            let sum: u32 = group_progress
+                .iter()
+                .map(|p| p.load(Ordering::Relaxed) as u32)
+                .sum();
+            total_progress.store(
+                (sum / num_groups as u32).min(9999) as u16,
+                Ordering::Relaxed,
+            );
+            thread::sleep(time::Duration::from_millis(100));
+        }
+
+        handles
+            .into_iter()
+            .map(|h| match h.join() {
+                Ok(r) => r,
+                Err(_) => Err(StdfHelperError {
+                    msg: "Shard thread panicked".to_string(),
+                }),
+            })
+            .collect()
+    });
+
+    let merge_rslt = shard_rslt.and_then(|test_counts| {
+        // shards of a cancelled session are discarded
+        if global_stop.load(Ordering::Relaxed) {
+            return Ok(());
+        }
+        let mut test_id_offset = 0;
+        for (shard_path, test_count) in shard_paths.iter().zip(test_counts) {
+            db_ctx.merge_shard(shard_path, test_id_offset)?;
+            test_id_offset += test_count;
+        }
+        Ok(())
+    });
+    // shards are temporary files
+    for shard_path in shard_paths.iter() {
+        let _ = fs::remove_file(shard_path);
+    }
+    merge_rslt
+}
+
+/// a MRR has FINISH_T `U4`, DISP_COD `C1`, USR_DESC and EXC_DESC `Cn`
+const MRR_MAX_LEN: usize = 4 + 1 + 2 * 256;
+/// a record must start in the first (header + max data length) bytes
+const TAIL_SYNC_RANGE: usize = 4 + u16::MAX as usize;
+
+/// records expected after the head of a file, parts and summary
+#[inline(always)]
+fn is_tail_record(rec_code: u64) -> bool {
+    matches!(
+        rec_code,
+        REC_PIR
+            | REC_PTR
+            | REC_MPR
+            | REC_FTR
+            | REC_PRR
+            | REC_WIR
+            | REC_WRR
+            | REC_DTR
+            | REC_GDR
+            | REC_BPS
+            | REC_EPS
+            | REC_TSR
+            | REC_HBR
+            | REC_SBR
+            | REC_PCR
+            | REC_MRR
+    )
+}
+
+/// offsets of a record chain in `buf` that ends exactly at the end
+/// of `buf` with a MRR, starting from the first such position.
+///
+/// `buf` may start in the middle of a record, a chain only contains
+/// part and summary records, and must start within `TAIL_SYNC_RANGE`.
+/// Every position is walked at most once, a position is known to
+/// reach the MRR or not after its first walk.
+fn find_tail_chain(buf: &[u8], order: &ByteOrder) -> Option<Vec<usize>> {
+    let header_at = |p: usize| -> Option<(u64, usize)> {
+        let header: [u8; 4] = buf.get(p..p + 4)?.try_into().unwrap();
+        let rec_code = get_code_from_typ_sub(header[2], header[3]);
+        is_tail_record(rec_code).then(|| (rec_code, p + 4 + header_len(&header, order) as usize))
+    };
+    // the MRR must end exactly at the end of `buf`
+    let mrr_pos = (buf.len().saturating_sub(4 + MRR_MAX_LEN)..buf.len().saturating_sub(3))
+        .find(|&p| header_at(p) == Some((REC_MRR, buf.len())))?;
+
+    // 0: unknown, 1: reaches the MRR, 2: doesn't
+    let mut state = vec![0u8; buf.len() + 1];
+    state[mrr_pos] = 1;
+    let mut walked = Vec::with_capacity(1024);
+    for start in 0..TAIL_SYNC_RANGE.min(mrr_pos + 1) {
+        if state[start] == 2 {
+            continue;
+        }
+        walked.clear();
+        let mut pos = start;
+        let reached = loop {
+            if pos > buf.len() {
+                break 2;
+            }
+            if state[pos] != 0 {
+                break state[pos];
+            }
+            walked.push(pos);
+            match header_at(pos) {
+                Some((_, next)) => pos = next,
+                None => break 2,
+            }
+        };
+        for &p in &walked {
+            state[p] = reached;
+        }
+        if reached == 1 {
+            let mut chain = Vec::with_capacity(1024);
+            let mut pos = start;
+            while pos < buf.len() {
+                chain.push(pos);
+                pos = header_at(pos)?.1;
+            }
+            return Some(chain);
+        }
+    }
+    None
+}
+
+/// parse the records before the first part or wafer, and the
+/// summary records after the last part, parts are not parsed.
+///
+/// Returns `false` if the summary cannot be read this way, e.g.
+/// compressed or incomplete files, records might have been written.
+pub fn ingest_summary(
+    db_ctx: &mut DataBaseCtx,
+    record_tracker: &mut RecordTracker,
+    file_id: usize,
+    subfile_id: usize,
+    fpath: &str,
+) -> Result<bool, StdfHelperError> {
+    if [".gz", ".bz2", ".zip"].iter().any(|ext| fpath.ends_with(ext)) {
+        return Ok(false);
+    }
+    let Some(order) = read_byte_order(fpath)? else {
+        return Ok(false);
+    };
+    let file_size = get_file_size(fpath)?;
+    let mut fp = File::open(fpath)?;
+
+    // head: FAR, MIR, SDR, pin maps...
+    let mut head_end = 0u64;
+    {
+        let mut reader = BufReader::with_capacity(READ_BUFFER_SIZE, &mut fp);
+        let mut header = [0u8; 4];
+        let mut raw_data = Vec::with_capacity(u16::MAX as usize);
+        while head_end < SUMMARY_HEAD_LIMIT {
+            match reader.read_exact(&mut header) {
+                Ok(_) => {}
+                Err(e) if e.kind() == io::ErrorKind::UnexpectedEof => return Ok(false),
+                Err(e) => return Err(e.into()),
+            }
+            let rec_code = get_code_from_typ_sub(header[2], header[3]);
+            if matches!(
+                rec_code,
+                REC_PIR | REC_WIR | REC_PTR | REC_MPR | REC_FTR | REC_PRR | REC_MRR
+            ) {
+                break;
+            }
+            if rec_code == REC_INVALID {
+                return Ok(false);
+            }
+            let len = header_len(&header, &order) as usize;
+            raw_data.resize(len, 0);
+            reader.read_exact(&mut raw_data)?;
+
+            let mut rec = StdfRecord::new(rec_code);
+            rec.read_from_bytes(&raw_data, &order);
+            process_incoming_record(
+                db_ctx,
+                record_tracker,
+                (file_id, subfile_id, order, head_end, len, rec),
+            )?;
+            head_end += 4 + len as u64;
+        }
+    }
+
+    // tail: summary records are after the last PRR,
+    // search backward from the end of file
+    let mut window = SUMMARY_TAIL_WINDOW;
+    loop {
+        let start = file_size.saturating_sub(window).max(head_end);
+        let mut buf = vec![0u8; (file_size - start) as usize];
+        fp.seek(SeekFrom::Start(start))?;
+        fp.read_exact(&mut buf)?;
+
+        let Some(chain) = find_tail_chain(&buf, &order) else {
+            // no MRR at the end, or invalid records
+            return Ok(false);
+        };
+        let code_at = |p: usize| get_code_from_typ_sub(buf[p + 2], buf[p + 3]);
+        let summary_start = match chain.iter().rposition(|&p| code_at(p) == REC_PRR) {
+            Some(i) => i + 1,
+            // no part in the file
+            None if start == head_end => 0,
+            None if window < SUMMARY_TAIL_WINDOW_MAX => {
+                window *= 4;
+                continue;
+            }
+            None => return Ok(false),
+        };
+
+        for &p in &chain[summary_start..] {
+            let rec_code = code_at(p);
+            // WRR needs its WIR
+            if !matches!(rec_code, REC_TSR | REC_HBR | REC_SBR | REC_PCR | REC_MRR) {
+                continue;
+            }
+            let header: [u8; 4] = buf[p..p + 4].try_into().unwrap();
+            let len = header_len(&header, &order) as usize;
+            let mut rec = StdfRecord::new(rec_code);
+            rec.read_from_bytes(&buf[p + 4..p + 4 + len], &order);
+            process_summary_record(
+                db_ctx,
+                record_tracker,
+                (file_id, subfile_id, order, start + p as u64, len, rec),
+            )?;
+        }
+        return Ok(true);
+    }
+}
@@ -10,23 +10,35 @@ use pyo3::{
     prelude::*,
     types::{PyBool, PyDict},
 };
-use rusqlite::{Connection, Error};
+use rusqlite::{Connection, Error, OpenFlags};
 use rust_stdf::{stdf_file::*, stdf_record_type::*, StdfRecord};
 use rust_xlsxwriter::{Workbook, XlsxError};
 use std::collections::{HashMap, HashSet};
 use std::convert::{From, Infallible};
-use std::sync::atomic::{AtomicBool, AtomicU16, Ordering};
+use std::sync::atomic::{AtomicBool, AtomicU16, AtomicU32, AtomicUsize, Ordering};
 use std::sync::Arc;
 use std::{thread, time, vec};
 
+mod columnar_store;
+mod data_fetch;
 mod database_context;
+mod decompress;
+mod ingest;
+mod mapped_file;
 mod resources;
 mod rust_functions;
 mod statistic_functions;
-use database_context::DataBaseCtx;
+use data_fetch::TestData;
+use database_context::{DataBaseCtx, DEFAULT_INSERT_BATCH_SIZE};
+use ingest::{
+    default_decode_workers, ingest_files_serial, ingest_follow, ingest_sharded, ingest_summary,
+    read_subfile, spawn_decode_workers, visit_raw_records, BufferPool, DecodedChunk, RawChunk,
+    ReorderBuffer, SubfileEnd, PARALLEL_SUBFILES, RECORDS_PER_TRANSACTION, SNAPSHOT_INTERVAL,
+    SUBFILE_CREDITS,
+};
 use rust_functions::{
     get_fields_from_code, get_file_size, process_incoming_record, process_summary_data,
-    write_json_to_sheet, RecordTracker, TestIDType,
+    write_json_to_sheet, IngestProfile, RecordTracker, TestIDType,
 };
 
 #[derive(Debug)]
@@ -87,6 +99,58 @@ impl<'src> FromPyObject<'src> for TestIDType {
     }
 }
 
+// convert an ingest profile dict to IngestProfile, keys are
+// "skip_records": [str], "include_tests"/"exclude_tests": [(int, int)],
+// "include_names"/"exclude_names": str, "sites": [int],
+// "sample_every": int, "sample_fraction": float, all optional
+impl<'src> FromPyObject<'src> for IngestProfile {
+    fn extract_bound(obj: &Bound<'src, PyAny>) -> PyResult<Self> {
+        let dict = obj.downcast::<PyDict>()?;
+        let skip_records: Vec<String> = match dict.get_item("skip_records")? {
+            Some(v) => v.extract()?,
+            None => vec![],
+        };
+        let include_tests: Vec<(u32, u32)> = match dict.get_item("include_tests")? {
+            Some(v) => v.extract()?,
+            None => vec![],
+        };
+        let exclude_tests: Vec<(u32, u32)> = match dict.get_item("exclude_tests")? {
+            Some(v) => v.extract()?,
+            None => vec![],
+        };
+        let include_names: String = match dict.get_item("include_names")? {
+            Some(v) => v.extract()?,
+            None => String::new(),
+        };
+        let exclude_names: String = match dict.get_item("exclude_names")? {
+            Some(v) => v.extract()?,
+            None => String::new(),
+        };
+        let sites: Vec<u8> = match dict.get_item("sites")? {
+            Some(v) => v.extract()?,
+            None => vec![],
+        };
+        let sample_every: u32 = match dict.get_item("sample_every")? {
+            Some(v) => v.extract()?,
+            None => 0,
+        };
+        let sample_fraction: f64 = match dict.get_item("sample_fraction")? {
+            Some(v) => v.extract()?,
+            None => 0.0,
+        };
+        IngestProfile::new(
+            &skip_records,
+            include_tests,
+            exclude_tests,
+            &include_names,
+            &exclude_names,
+            sites,
+        )
+        .and_then(|p| p.with_sampling(sample_every, sample_fraction))
+        .map_err(|e| PyValueError::new_err(e.msg))
+    }
+}
+
 impl<'py> IntoPyObject<'py> for TestIDType {
     type Target = PyInt;
     type Output = Bound<'py, Self::Target>;
@@ -163,188 +227,188 @@ fn analyze_stdf_file(
     let stop_flag: Py<PyAny> = stop_flag.into();
 
     py.detach(|| {
-        let mut reader = match StdfReader::new(filepath) {
-            Ok(r) => r,
-            Err(e) => return Err(PyOSError::new_err(e.to_string())),
-        };
-
-        for rec in reader.get_rawdata_iter() {
-            if stop_flag_rust {
-                break;
-            }
+        let complete = visit_raw_records::<_, PyErr>(
+            filepath,
+            file_size,
+            default_decode_workers(),
+            |rec, file_progress| {
+                if stop_flag_rust {
+                    return Ok(false);
+                }
 
-            let rec = match rec {
-                Ok(r) => r,
-                Err(e) => return Err(PyException::new_err(e.to_string())),
-            };
-            total_record += 1;
-            let rec_code = rec.header.get_type();
-            let rec_name = get_rec_name_from_code(rec_code);
-
-            if rec_code == REC_INVALID {
-                result_log += &format!(
-                    "Invalid STDF V4 Record Detected, len:{}, typ: {}, sub: {}\n",
-                    rec.header.len, rec.header.typ, rec.header.sub
-                );
-                break;
-            }
+                total_record += 1;
+                let rec_code = rec.rec_code();
+                let rec_name = get_rec_name_from_code(rec_code);
 
-            if rec.is_type(REC_PIR | REC_WIR | REC_PRR | REC_WRR) {
-                if dup_cnt != 0 && previous_rec_type != 0 {
-                    // flush previous record info to result_log
+                if rec_code == REC_INVALID {
                     result_log += &format!(
-                        "{} × {}\n",
-                        get_rec_name_from_code(previous_rec_type),
-                        dup_cnt
+                        "Invalid STDF V4 Record Detected, len:{}, typ: {}, sub: {}\n",
+                        rec.data.len(), rec.typ, rec.sub
                     );
+                    return Ok(false);
                 }
 
-                parse_progess = rec.offset * 100 / file_size;
-                let parsed_rec: StdfRecord = rec.into();
-                match parsed_rec {
-                    StdfRecord::PIR(pir_rec) => {
-                        dut_cnt += 1;
-                        result_log += &format!(
-                            "[{}] {} (HEAD: {}, SITE: {})\n",
-                            dut_cnt, rec_name, pir_rec.head_num, pir_rec.site_num
-                        );
-                    }
-                    StdfRecord::WIR(wir_rec) => {
-                        wafer_cnt += 1;
-                        result_log += &format!("{} (HEAD: {})\n", rec_name, wir_rec.head_num);
-                    }
-                    StdfRecord::PRR(prr_rec) => {
-                        result_log += &format!(
-                            "{} (HEAD: {}, SITE: {})\n",
-                            rec_name, prr_rec.head_num, prr_rec.site_num
-                        );
-                        // track all bin numbers appear in PRR
-                        test_bin_tracker
-                            .entry(REC_HBR)
-                            .or_insert_with(HashMap::new)
-                            .entry(prr_rec.hard_bin)
-                            .or_insert(false);
-                        test_bin_tracker
-                            .entry(REC_SBR)
-                            .or_insert_with(HashMap::new)
-                            .entry(prr_rec.soft_bin)
-                            .or_insert(false);
-                        // send or print result_log at PRR
-                        // avoid result_log takes up too much memory...
-                        // println!("{}", result_log);
-                        // send via qt signal..
-                        if is_valid_data_signal || is_valid_stop {
-                            Python::attach(|py| -> PyResult<()> {
-                                if is_valid_data_signal {
-                                    data_signal
-                                        .bind(py)
-                                        .call_method1(intern!(py, "emit"), (&result_log,))?;
-                                }
-                                if is_valid_progress_signal {
-                                    progress_signal
-                                        .bind(py)
-                                        .call_method1(intern!(py, "emit"), (parse_progess,))?;
-                                }
-                                if is_valid_stop {
-                                    stop_flag_rust = stop_flag
-                                        .bind(py)
-                                        .getattr(intern!(py, "stop"))?
-                                        .extract::<bool>()?;
-                                }
-                                Ok(())
-                            })?;
-                        }
-                        // reset to default
-                        result_log.clear();
-                    }
-                    StdfRecord::WRR(wrr_rec) => {
-                        result_log += &format!("{} (HEAD: {})\n", rec_name, wrr_rec.head_num);
-                    }
-                    _ => { /* impossible case */ }
-                }
-                // reset preheader to 0, in order to print every PXR WXR
-                previous_rec_type = 0;
-                dup_cnt = 0;
-            } else {
-                // other record types
-                if previous_rec_type == rec_code {
-                    dup_cnt += 1;
-                } else {
-                    if previous_rec_type != 0 {
-                        // flush previous record
+                if rec.is_type(REC_PIR | REC_WIR | REC_PRR | REC_WRR) {
+                    if dup_cnt != 0 && previous_rec_type != 0 {
+                        // flush previous record info to result_log
                         result_log += &format!(
                             "{} × {}\n",
                             get_rec_name_from_code(previous_rec_type),
                             dup_cnt
                         );
                     }
-                    previous_rec_type = rec_code;
-                    dup_cnt = 1;
-                }
 
-                // track the test number, name and bin of PTR, FTR and MPR
-                if rec.is_type(REC_PTR | REC_FTR | REC_MPR | REC_TSR | REC_HBR | REC_SBR) {
-                    let parsed_rec: StdfRecord = rec.into();
-                    match parsed_rec {
-                        StdfRecord::PTR(ptr_rec) => {
-                            test_id_tracker
-                                .entry(rec_code)
-                                .or_insert_with(HashSet::new)
-                                .insert((ptr_rec.test_num, ptr_rec.test_txt));
+                    parse_progess = (file_progress * 100.0) as u64;
+                    match rec.decode() {
+                        StdfRecord::PIR(pir_rec) => {
+                            dut_cnt += 1;
+                            result_log += &format!(
+                                "[{}] {} (HEAD: {}, SITE: {})\n",
+                                dut_cnt, rec_name, pir_rec.head_num, pir_rec.site_num
+                            );
                         }
-                        StdfRecord::FTR(ftr_rec) => {
-                            test_id_tracker
-                                .entry(rec_code)
-                                .or_insert_with(HashSet::new)
-                                .insert((ftr_rec.test_num, ftr_rec.test_txt));
+                        StdfRecord::WIR(wir_rec) => {
+                            wafer_cnt += 1;
+                            result_log += &format!("{} (HEAD: {})\n", rec_name, wir_rec.head_num);
                         }
-                        StdfRecord::MPR(mpr_rec) => {
-                            test_id_tracker
-                                .entry(rec_code)
-                                .or_insert_with(HashSet::new)
-                                .insert((mpr_rec.test_num, mpr_rec.test_txt));
+                        StdfRecord::PRR(prr_rec) => {
+                            result_log += &format!(
+                                "{} (HEAD: {}, SITE: {})\n",
+                                rec_name, prr_rec.head_num, prr_rec.site_num
+                            );
+                            // track all bin numbers appear in PRR
+                            test_bin_tracker
+                                .entry(REC_HBR)
+                                .or_insert_with(HashMap::new)
+                                .entry(prr_rec.hard_bin)
+                                .or_insert(false);
+                            test_bin_tracker
+                                .entry(REC_SBR)
+                                .or_insert_with(HashMap::new)
+                                .entry(prr_rec.soft_bin)
+                                .or_insert(false);
+                            // send or print result_log at PRR
+                            // avoid result_log takes up too much memory...
+                            // println!("{}", result_log);
+                            // send via qt signal..
+                            if is_valid_data_signal || is_valid_stop {
+                                Python::attach(|py| -> PyResult<()> {
+                                    if is_valid_data_signal {
+                                        data_signal
+                                            .bind(py)
+                                            .call_method1(intern!(py, "emit"), (&result_log,))?;
+                                    }
+                                    if is_valid_progress_signal {
+                                        progress_signal
+                                            .bind(py)
+                                            .call_method1(intern!(py, "emit"), (parse_progess,))?;
+                                    }
+                                    if is_valid_stop {
+                                        stop_flag_rust = stop_flag
+                                            .bind(py)
+                                            .getattr(intern!(py, "stop"))?
+                                            .extract::<bool>()?;
+                                    }
+                                    Ok(())
+                                })?;
+                            }
+                            // reset to default
+                            result_log.clear();
                         }
-                        StdfRecord::TSR(tsr_rec) => {
-                            let rec_code = match tsr_rec.test_typ {
-                                'P' => REC_PTR,
-                                'F' => REC_FTR,
-                                'M' => REC_MPR,
-                                _ => continue,
-                            };
-                            tsr_id_tracker
-                                .entry(rec_code)
-                                .or_insert_with(HashSet::new)
-                                .insert((tsr_rec.test_num, tsr_rec.test_nam));
+                        StdfRecord::WRR(wrr_rec) => {
+                            result_log += &format!("{} (HEAD: {})\n", rec_name, wrr_rec.head_num);
                         }
-                        StdfRecord::HBR(hbr_rec) => {
-                            if let Some(s) = test_bin_tracker.get_mut(&REC_HBR) {
-                                if let Some(b) = s.get_mut(&hbr_rec.hbin_num) {
-                                    *b = true;
+                        _ => { /* impossible case */ }
+                    }
+                    // reset preheader to 0, in order to print every PXR WXR
+                    previous_rec_type = 0;
+                    dup_cnt = 0;
+                } else {
+                    // other record types
+                    if previous_rec_type == rec_code {
+                        dup_cnt += 1;
+                    } else {
+                        if previous_rec_type != 0 {
+                            // flush previous record
+                            result_log += &format!(
+                                "{} × {}\n",
+                                get_rec_name_from_code(previous_rec_type),
+                                dup_cnt
+                            );
+                        }
+                        previous_rec_type = rec_code;
+                        dup_cnt = 1;
+                    }
+
+                    // track the test number, name and bin of PTR, FTR and MPR
+                    if rec.is_type(REC_PTR | REC_FTR | REC_MPR | REC_TSR | REC_HBR | REC_SBR) {
+                        match rec.decode() {
+                            StdfRecord::PTR(ptr_rec) => {
+                                test_id_tracker
+                                    .entry(rec_code)
+                                    .or_insert_with(HashSet::new)
+                                    .insert((ptr_rec.test_num, ptr_rec.test_txt));
+                            }
+                            StdfRecord::FTR(ftr_rec) => {
+                                test_id_tracker
+                                    .entry(rec_code)
+                                    .or_insert_with(HashSet::new)
+                                    .insert((ftr_rec.test_num, ftr_rec.test_txt));
+                            }
+                            StdfRecord::MPR(mpr_rec) => {
+                                test_id_tracker
+                                    .entry(rec_code)
+                                    .or_insert_with(HashSet::new)
+                                    .insert((mpr_rec.test_num, mpr_rec.test_txt));
+                            }
+                            StdfRecord::TSR(tsr_rec) => {
+                                let rec_code = match tsr_rec.test_typ {
+                                    'P' => REC_PTR,
+                                    'F' => REC_FTR,
+                                    'M' => REC_MPR,
+                                    _ => return Ok(true),
+                                };
+                                tsr_id_tracker
+                                    .entry(rec_code)
+                                    .or_insert_with(HashSet::new)
+                                    .insert((tsr_rec.test_num, tsr_rec.test_nam));
+                            }
+                            StdfRecord::HBR(hbr_rec) => {
+                                if let Some(s) = test_bin_tracker.get_mut(&REC_HBR) {
+                                    if let Some(b) = s.get_mut(&hbr_rec.hbin_num) {
+                                        *b = true;
+                                    }
+                                } else {
+                                    analyze_rst += &format!(
+                                        "\nWarning: HBR (Bin {}) appears before any PRR!\n",
+                                        hbr_rec.hbin_num
+                                    );
                                 }
-                            } else {
-                                analyze_rst += &format!(
-                                    "\nWarning: HBR (Bin {}) appears before any PRR!\n",
-                                    hbr_rec.hbin_num
-                                );
                             }
-                        }
-                        StdfRecord::SBR(sbr_rec) => {
-                            if let Some(s) = test_bin_tracker.get_mut(&REC_SBR) {
-                                if let Some(b) = s.get_mut(&sbr_rec.sbin_num) {
-                                    *b = true;
+                            StdfRecord::SBR(sbr_rec) => {
+                                if let Some(s) = test_bin_tracker.get_mut(&REC_SBR) {
+                                    if let Some(b) = s.get_mut(&sbr_rec.sbin_num) {
+                                        *b = true;
+                                    }
+                                } else {
+                                    analyze_rst += &format!(
+                                        "\nWarning: SBR (Bin {}) appears before any PRR!\n",
+                                        sbr_rec.sbin_num
+                                    );
                                 }
-                            } else {
-                                analyze_rst += &format!(
-                                    "\nWarning: SBR (Bin {}) appears before any PRR!\n",
-                                    sbr_rec.sbin_num
-                                );
                             }
+                            _ => { /* impossible case */ }
                         }
-                        _ => { /* impossible case */ }
                     }
                 }
-            }
-        } // for loop
+                Ok(true)
+            },
+        )?;
+        if !complete {
+            return Err(PyException::new_err(
+                "Unexpected EOF, the file might be truncated or corrupted",
+            ));
+        }
 
         // print last record
         if dup_cnt != 0 && previous_rec_type != 0 {
@@ -520,9 +584,95 @@ fn analyze_stdf_file(
     })
 }
 
+/// send progress to python and read the stop flag every 100ms,
+/// thread exits when progress reaches 10000
+fn spawn_signal_thread(
+    progress_signal: Py<PyAny>,
+    stop_flag: Py<PyAny>,
+    is_valid_progress_signal: bool,
+    is_valid_stop: bool,
+    total_progress: Arc<AtomicU16>,
+    global_stop: Arc<AtomicBool>,
+) -> thread::JoinHandle<Result<(), StdfHelperError>> {
+    thread::spawn(move || -> Result<(), StdfHelperError> {
+        loop {
+            let current_progress = total_progress.load(Ordering::Relaxed);
+            // sleep for 100ms
+            thread::sleep(time::Duration::from_millis(100));
+            // access python object inside a gil block
+            if let Err(py_e) = Python::attach(|py| -> PyResult<()> {
+                if is_valid_progress_signal {
+                    progress_signal
+                        .bind(py)
+                        .call_method1(intern!(py, "emit"), (current_progress,))?;
+                }
+                if is_valid_stop {
+                    global_stop.store(
+                        stop_flag
+                            .bind(py)
+                            .getattr(intern!(py, "stop"))?
+                            .extract::<bool>()?,
+                        Ordering::Relaxed,
+                    );
+                };
+                Ok(())
+            }) {
+                // print python exceptions occured
+                // in this thread and exit...
+                println!("{}", py_e);
+                break;
+            }
+            if current_progress == 10000 {
+                break;
+            }
+        }
+        Ok(())
+    })
+}
+
+/// call `snapshot_signal.emit(count)` every 100ms if a new
+/// snapshot is committed, thread exits when progress reaches 10000
+fn spawn_snapshot_thread(
+    snapshot_signal: Py<PyAny>,
+    snapshot_count: Arc<AtomicU32>,
+    total_progress: Arc<AtomicU16>,
+) -> thread::JoinHandle<Result<(), StdfHelperError>> {
+    thread::spawn(move || -> Result<(), StdfHelperError> {
+        let mut sent_count = 0;
+        loop {
+            thread::sleep(time::Duration::from_millis(100));
+            if total_progress.load(Ordering::Relaxed) == 10000 {
+                break;
+            }
+            let current_count = snapshot_count.load(Ordering::Relaxed);
+            if current_count == sent_count {
+                continue;
+            }
+            sent_count = current_count;
+            if let Err(py_e) = Python::attach(|py| -> PyResult<()> {
+                snapshot_signal
+                    .bind(py)
+                    .call_method1(intern!(py, "emit"), (current_count,))?;
+                Ok(())
+            }) {
+                println!("{}", py_e);
+                break;
+            }
+        }
+        Ok(())
+    })
+}
+
 /// create sqlite3 database for given stdf files
+///
+/// if `snapshot_signal` is given and the database is not sharded,
+/// the database is written in WAL mode and committed every
+/// `SNAPSHOT_INTERVAL`, `snapshot_signal.emit(count)` is called
+/// after a commit, the committed data can be read while parsing.
 #[pyfunction]
 #[pyo3(name = "generate_database")]
+#[pyo3(signature = (dbpath, stdf_paths, test_id_type, build_db_index, progress_signal, stop_flag, insert_batch_size=DEFAULT_INSERT_BATCH_SIZE, sharded=false, mpr_blob=false, profile=None, snapshot_signal=None))]
+#[allow(clippy::too_many_arguments)]
 fn generate_database(
     py: Python,
     dbpath: String,
@@ -531,6 +681,11 @@ fn generate_database(
     build_db_index: bool,
     progress_signal: Bound<'_, PyAny>,
     stop_flag: Bound<'_, PyAny>,
+    insert_batch_size: usize,
+    sharded: bool,
+    mpr_blob: bool,
+    profile: Option<IngestProfile>,
+    snapshot_signal: Option<Bound<'_, PyAny>>,
 ) -> PyResult<()> {
     // stdf_paths is a Vec of Vec<String>, each sub vec
     // indicates a group of stdf files that needs to be merged.
@@ -544,6 +699,10 @@ fn generate_database(
     //
     // "v2_x" is another group with Fid=1.
     //
+    // if `sharded` is true and there are multiple groups,
+    // each group is written to its own database in parallel
+    // and merged at the end, instead of a single writer.
+    //
     // do nothing if empty file group detected
     let num_groups = stdf_paths.len();
     if stdf_paths.iter().map(|v| v.is_empty()).any(|b| b) {
@@ -569,75 +728,114 @@ fn generate_database(
     let progress_signal: Py<PyAny> = progress_signal.into();
     let stop_flag: Py<PyAny> = stop_flag.into();
 
-    // prepare channel for multithreading communication
-    const CHANNEL_CAP: usize = 16_384;
-    let (tx, rx) = crossbeam_channel::bounded(CHANNEL_CAP);
-
+    let use_shards = sharded && num_groups > 1;
+    // shards are only merged at the end
+    let snapshot_signal: Option<Py<PyAny>> = snapshot_signal
+        .filter(|_| !use_shards)
+        .map(|signal| signal.into());
+    let progressive = snapshot_signal.is_some();
+    // records that are not needed are skipped by readers
+    let profile = profile.unwrap_or_default();
+
+    // prepare channels for multithreading communication:
+    // reader threads -> decode workers -> database writer,
+    // records are sent in chunks of `RECORDS_PER_CHUNK`
+    const CHANNEL_CAP: usize = 16;
+    let (raw_tx, raw_rx) = crossbeam_channel::bounded::<RawChunk>(CHANNEL_CAP);
+    let (decoded_tx, decoded_rx) = crossbeam_channel::bounded::<DecodedChunk>(CHANNEL_CAP);
+    // chunk buffers are recycled instead of allocated per record,
+    // readers -> workers for raw chunks, workers -> writer for decoded chunks
+    let num_workers = default_decode_workers();
+    let pool_size = 2 * CHANNEL_CAP + num_workers + num_groups;
+    let raw_pool = BufferPool::<RawChunk>::new(pool_size);
+    let decoded_pool = BufferPool::<DecodedChunk>::new(pool_size);
+    // readers report the end of a sub file, or an error
+    let (end_tx, end_rx) =
+        crossbeam_channel::unbounded::<Result<SubfileEnd, StdfHelperError>>();
+    // receivers of chunk credits for each sub file
+    let mut credit_rxs: Vec<Vec<crossbeam_channel::Receiver<()>>> = vec![vec![]; num_groups];
     let mut thread_handles = vec![];
-    let mut thread_txes = Vec::with_capacity(num_groups);
-    // clone {num_groups-1} sender, and push the `tx` to last
-    (0..num_groups - 1)
-        .map(|_| thread_txes.push(tx.clone()))
-        .count();
-    thread_txes.push(tx);
-
-    // sending parsing work to
-    // other threads.
-    // one file group per thread
-    for (fid, (fgroups, thread_tx)) in stdf_paths
-        .clone()
-        .into_iter()
-        .zip(thread_txes.into_iter())
-        .enumerate()
-    {
-        let handle = thread::spawn(move || -> Result<(), StdfHelperError> {
+
+    if !use_shards {
+        // decoding is the heaviest cpu work besides sqlite,
+        // move it out of the writer thread into a worker pool
+        thread_handles = spawn_decode_workers(
+            num_workers,
+            raw_rx,
+            decoded_tx.clone(),
+            raw_pool.clone(),
+            decoded_pool.clone(),
+        );
+
+        // sending parsing work to
+        // other threads.
+        // up to `PARALLEL_SUBFILES` readers per file group,
+        // sub files are read and decoded in parallel, only the
+        // writer consumes them in the sub file order, since
+        // superseded flag must overwrite all the
+        // DUTs in the previous files
+        for (fid, fgroups) in stdf_paths.clone().into_iter().enumerate() {
             let num_files = fgroups.len();
-            // loop fpath in a group in vector order,
-            // this step CANNOT be parallel, since
-            // superseded flag must overwrite all the
-            // DUTs in the previous files
-            for (sub_fid, fpath) in fgroups.iter().enumerate() {
-                let file_size = get_file_size(fpath)? as f32;
-                if file_size == 0.0 {
-                    return Err(StdfHelperError {
-                        msg: format!("Empty file detected!\n\n{}", fpath),
-                    });
-                }
-                let mut stdf_reader = match StdfReader::new(fpath) {
-                    Ok(r) => r,
-                    Err(e) => {
-                        return Err(StdfHelperError {
-                            msg: format!("Cannot parse this file:\n{}\n\nMessage:\n{}", fpath, e),
-                        })
-                    }
-                };
-                for raw_rec in stdf_reader.get_rawdata_iter() {
-                    let raw_rec = match raw_rec {
-                        Ok(r) => r,
-                        Err(_) => {
-                            // there is only one error, that is
-                            // unexpected EOF, we just sliently
-                            // stop here
-                            break;
+            let next_subfile = Arc::new(AtomicUsize::new(0));
+            let mut group_credits = Vec::with_capacity(num_files);
+            for _ in 0..num_files {
+                let (credit_tx, credit_rx) = crossbeam_channel::bounded::<()>(SUBFILE_CREDITS);
+                group_credits.push(credit_tx);
+                credit_rxs[fid].push(credit_rx);
+            }
+            for _ in 0..num_files.min(PARALLEL_SUBFILES) {
+                let fgroups = fgroups.clone();
+                let next_subfile = next_subfile.clone();
+                let group_credits = group_credits.clone();
+                let thread_tx = raw_tx.clone();
+                let thread_decoded_tx = decoded_tx.clone();
+                let thread_end_tx = end_tx.clone();
+                let thread_raw_pool = raw_pool.clone();
+                let thread_decoded_pool = decoded_pool.clone();
+                let thread_profile = profile.clone();
+                let handle = thread::spawn(move || -> Result<(), StdfHelperError> {
+                    loop {
+                        let sub_fid = next_subfile.fetch_add(1, Ordering::Relaxed);
+                        let Some(fpath) = fgroups.get(sub_fid) else {
+                            return Ok(());
+                        };
+                        let num_records = match read_subfile(
+                            fpath,
+                            fid,
+                            sub_fid,
+                            num_files,
+                            num_workers,
+                            &thread_tx,
+                            &thread_decoded_tx,
+                            &thread_raw_pool,
+                            &thread_decoded_pool,
+                            &group_credits[sub_fid],
+                            &thread_profile,
+                        ) {
+                            Ok(Some(n)) => n,
+                            // writer has stopped
+                            Ok(None) => return Ok(()),
+                            Err(e) => {
+                                // the writer is waiting for this sub file,
+                                // it stops and reports the error
+                                let _ = thread_end_tx.send(Err(e));
+                                return Ok(());
+                            }
+                        };
+                        if thread_end_tx.send(Ok((fid, sub_fid, num_records))).is_err() {
+                            return Ok(());
                         }
-                    };
-                    // calculate the reading progress in each thread
-                    let progress_x100 = 10000.0
-                        * (raw_rec.offset as f32 / file_size + sub_fid as f32)
-                        / num_files as f32;
-                    // send
-                    if thread_tx
-                        .send((fid, sub_fid, progress_x100, raw_rec))
-                        .is_err()
-                    {
-                        break;
                     }
-                }
+                });
+                thread_handles.push(handle);
             }
-            Ok(())
-        });
-        thread_handles.push(handle);
+        }
     }
+    // workers stop once all readers dropped their senders,
+    // and the writer stops once all senders are dropped
+    drop(raw_tx);
+    drop(decoded_tx);
+    drop(end_tx);
 
     // create some atomic var for data communication between threads
     let global_stop = Arc::new(AtomicBool::new(false));
@@ -650,112 +848,605 @@ fn generate_database(
     if is_valid_progress_signal || is_valid_stop {
         // start another thread for updating stop signal
         // and sending progress back to python
-        let gil_th = thread::spawn(move || -> Result<(), StdfHelperError> {
-            loop {
-                let current_progress = total_progress_copy.load(Ordering::Relaxed);
-                // sleep for 100ms
-                thread::sleep(time::Duration::from_millis(100));
-                // access python object inside a gil block
-                if let Err(py_e) = Python::attach(|py| -> PyResult<()> {
-                    if is_valid_progress_signal {
-                        progress_signal
-                            .bind(py)
-                            .call_method1(intern!(py, "emit"), (current_progress,))?;
-                    }
-                    if is_valid_stop {
-                        global_stop_copy.store(
-                            stop_flag
-                                .bind(py)
-                                .getattr(intern!(py, "stop"))?
-                                .extract::<bool>()?,
-                            Ordering::Relaxed,
-                        );
-                    };
-                    Ok(())
-                }) {
-                    // print python exceptions occured
-                    // in this thread and exit...
-                    println!("{}", py_e);
-                    break;
-                }
-                if current_progress == 10000 {
-                    break;
-                }
-            }
-            Ok(())
-        });
-        thread_handles.push(gil_th);
+        thread_handles.push(spawn_signal_thread(
+            progress_signal,
+            stop_flag,
+            is_valid_progress_signal,
+            is_valid_stop,
+            total_progress_copy,
+            global_stop_copy,
+        ));
+    }
+    let snapshot_count = Arc::new(AtomicU32::new(0));
+    if let Some(snapshot_signal) = snapshot_signal {
+        thread_handles.push(spawn_snapshot_thread(
+            snapshot_signal,
+            snapshot_count.clone(),
+            total_progress.clone(),
+        ));
     }
 
-    py.detach(|| -> Result<(), StdfHelperError> {
+    let db_rslt = py.detach(|| -> Result<(), StdfHelperError> {
         // initiate sqlite3 database
         let conn = match Connection::open(&dbpath) {
             Ok(conn) => conn,
             Err(e) => return Err(StdfHelperError { msg: e.to_string() }),
         };
-        let mut db_ctx = DataBaseCtx::new(&conn)?;
+        // test data are written by multi-row inserts,
+        // `insert_batch_size` <= 1 disables batching
+        let mut db_ctx = DataBaseCtx::new(&conn, insert_batch_size)?;
+        db_ctx.set_mpr_blob(mpr_blob);
+        if progressive {
+            db_ctx.enable_progressive()?;
+        }
 
         // store file paths to database
         for (fid, fgroup) in stdf_paths.iter().enumerate() {
             for (sub_fid, fpath) in fgroup.iter().enumerate() {
                 db_ctx.insert_file_name(rusqlite::params![fid, sub_fid, fpath])?;
+                // UI marks a sampled session by this field
+                if let Some(desc) = profile.sample_desc() {
+                    db_ctx.insert_file_info(rusqlite::params![fid, sub_fid, "SAMPLED", desc])?;
+                }
             }
         }
 
-        let mut record_tracker = RecordTracker::new(test_id_type);
-        let mut progress_tracker = vec![0.0f32; num_groups];
-        let mut transaction_count_up = 0;
-        // process and write database in main thread
-        for (fid, sub_fid, progress_x100, raw_rec) in rx {
-            let rec_info = (
-                fid,
-                sub_fid,
-                raw_rec.byte_order,
-                raw_rec.offset,
-                raw_rec.raw_data.len(),
-                StdfRecord::from(raw_rec),
-            );
-            process_incoming_record(&mut db_ctx, &mut record_tracker, rec_info)?;
-
-            if is_valid_progress_signal {
-                // main thread will calculate the `total progress`
-                if let Some(v) = progress_tracker.get_mut(fid) {
-                    *v = progress_x100;
+        if use_shards {
+            ingest_sharded(
+                &mut db_ctx,
+                &dbpath,
+                &stdf_paths,
+                test_id_type,
+                insert_batch_size,
+                mpr_blob,
+                &profile,
+                &total_progress,
+                &global_stop,
+            )?;
+            // write 10000 as the sign of complete...
+            total_progress.store(10000u16, Ordering::Relaxed);
+        } else {
+            let mut record_tracker = RecordTracker::new(test_id_type);
+            record_tracker.set_profile(profile.clone());
+            let mut progress_tracker = vec![0.0f32; num_groups];
+            let mut transaction_count_up = 0;
+            let mut last_commit = time::Instant::now();
+            let mut reorder_buffer = ReorderBuffer::new(num_groups);
+            // wait for decoded chunks and ends of sub files
+            let mut sel = crossbeam_channel::Select::new();
+            let chunk_op = sel.recv(&decoded_rx);
+            let end_op = sel.recv(&end_rx);
+            let mut open_channels = 2;
+            // process and write database in main thread
+            'writer: while open_channels > 0 {
+                let oper = sel.select();
+                let ready_fid = if oper.index() == chunk_op {
+                    match oper.recv(&decoded_rx) {
+                        Ok(decoded_chunk) => reorder_buffer.push(decoded_chunk),
+                        Err(_) => {
+                            sel.remove(chunk_op);
+                            open_channels -= 1;
+                            None
+                        }
+                    }
+                } else {
+                    match oper.recv(&end_rx) {
+                        Ok(subfile_end) => Some(reorder_buffer.end_subfile(subfile_end?)),
+                        Err(_) => {
+                            sel.remove(end_op);
+                            open_channels -= 1;
+                            None
+                        }
+                    }
                 };
-                total_progress.store(
-                    (progress_tracker.iter().sum::<f32>() / num_groups as f32) as u16,
-                    Ordering::Relaxed,
-                );
-            }
+                let Some(fid) = ready_fid else {
+                    continue;
+                };
+                while let Some(mut decoded_chunk) = reorder_buffer.pop_ready(fid) {
+                    let sub_fid = decoded_chunk.first().map_or(0, |r| r.subfile_id);
+                    for decoded_rec in decoded_chunk.drain(..) {
+                        let progress_x100 = decoded_rec.progress_x100;
+                        process_incoming_record(
+                            &mut db_ctx,
+                            &mut record_tracker,
+                            decoded_rec.into_rec_info(),
+                        )?;
+
+                        if is_valid_progress_signal {
+                            // main thread will calculate the `total progress`
+                            if let Some(v) = progress_tracker.get_mut(fid) {
+                                *v = progress_x100;
+                            };
+                            total_progress.store(
+                                (progress_tracker.iter().sum::<f32>() / num_groups as f32) as u16,
+                                Ordering::Relaxed,
+                            );
+                        }
 
-            if is_valid_stop && global_stop.load(Ordering::Relaxed) {
-                break;
-            }
+                        if is_valid_stop && global_stop.load(Ordering::Relaxed) {
+                            break 'writer;
+                        }
 
-            // commit and begin a new transaction after fixed number of records
-            transaction_count_up += 1;
-            if transaction_count_up > 1_000_000 {
-                transaction_count_up = 0;
-                db_ctx.start_new_transaction()?;
+                        // commit and begin a new transaction after fixed number of records,
+                        // or periodically in progressive mode
+                        transaction_count_up += 1;
+                        if transaction_count_up > RECORDS_PER_TRANSACTION
+                            || (progressive
+                                && transaction_count_up % 4096 == 0
+                                && last_commit.elapsed() >= SNAPSHOT_INTERVAL)
+                        {
+                            transaction_count_up = 0;
+                            db_ctx.start_new_transaction()?;
+                            last_commit = time::Instant::now();
+                            if progressive {
+                                snapshot_count.fetch_add(1, Ordering::Relaxed);
+                            }
+                        }
+                    }
+                    decoded_pool.give_back(decoded_chunk);
+                    // the reader of this sub file can send another chunk
+                    let _ = credit_rxs[fid][sub_fid].try_recv();
+                }
             }
+            // blocked readers and workers exit once the receivers are dropped
+            drop(sel);
+            drop(decoded_rx);
+            drop(end_rx);
+            drop(credit_rxs);
+            // write HBR/SBR/TSR into database
+            process_summary_data(&mut db_ctx, &mut record_tracker)?;
+            // write 10000 as the sign of complete...
+            total_progress.store(10000u16, Ordering::Relaxed);
         }
-        // write HBR/SBR/TSR into database
-        process_summary_data(&mut db_ctx, &mut record_tracker)?;
-        // write 10000 as the sign of complete...
-        total_progress.store(10000u16, Ordering::Relaxed);
 
         // join threads
         for handle in thread_handles {
             handle.join().unwrap()?;
         }
         // finalize database
+        db_ctx.flush_batches()?;
+        db_ctx.record_insert_stats("");
         db_ctx.finalize(build_db_index)?;
         if let Err((_, err)) = conn.close() {
             return Err(StdfHelperError::from(err))?;
         };
         Ok(())
+    });
+    // stop the signal threads in any case
+    total_progress.store(10000u16, Ordering::Relaxed);
+    db_rslt?;
+
+    Ok(())
+}
+
+/// append stdf files to a database created by `generate_database`.
+///
+/// if `file_id` is None, `stdf_paths` are merged as a new file,
+/// otherwise they are appended as sub files of `file_id`, and
+/// supersede flags, fail counts and bins of this file are updated.
+///
+/// returns the file id that was written, or None if cancelled,
+/// the database is unchanged if cancelled or failed.
+#[pyfunction]
+#[pyo3(name = "append_database")]
+#[pyo3(signature = (dbpath, stdf_paths, file_id, test_id_type, progress_signal, stop_flag, insert_batch_size=DEFAULT_INSERT_BATCH_SIZE, mpr_blob=false, profile=None))]
+#[allow(clippy::too_many_arguments)]
+fn append_database(
+    py: Python,
+    dbpath: String,
+    stdf_paths: Vec<String>,
+    file_id: Option<usize>,
+    test_id_type: TestIDType,
+    progress_signal: Bound<'_, PyAny>,
+    stop_flag: Bound<'_, PyAny>,
+    insert_batch_size: usize,
+    mpr_blob: bool,
+    profile: Option<IngestProfile>,
+) -> PyResult<Option<usize>> {
+    if stdf_paths.is_empty() {
+        return Err(PyValueError::new_err("Empty STDF file group detected"));
+    }
+
+    let is_valid_progress_signal = match progress_signal.getattr(intern!(py, "emit")) {
+        Ok(p) => p.is_callable(),
+        Err(_) => {
+            println!("progress_signal does not have a method `emit`");
+            false
+        }
+    };
+    let is_valid_stop = match stop_flag.getattr(intern!(py, "stop")) {
+        Ok(p) => p.is_instance_of::<PyBool>(),
+        Err(_) => {
+            println!("stop_flag does not have an bool attr `stop`");
+            false
+        }
+    };
+
+    let global_stop = Arc::new(AtomicBool::new(false));
+    let total_progress = Arc::new(AtomicU16::new(0));
+    let mut thread_handles = vec![];
+    if is_valid_progress_signal || is_valid_stop {
+        thread_handles.push(spawn_signal_thread(
+            progress_signal.into(),
+            stop_flag.into(),
+            is_valid_progress_signal,
+            is_valid_stop,
+            total_progress.clone(),
+            global_stop.clone(),
+        ));
+    }
+
+    let written_fid = py.detach(|| -> Result<Option<usize>, StdfHelperError> {
+        let conn = Connection::open(&dbpath)?;
+        let (fid, first_sub_fid) = match file_id {
+            None => {
+                let fid: usize = conn.query_row(
+                    "SELECT IFNULL(MAX(Fid) + 1, 0) FROM File_List",
+                    [],
+                    |row| row.get(0),
+                )?;
+                (fid, 0)
+            }
+            Some(fid) => {
+                let next_sub_fid: Option<usize> = conn.query_row(
+                    "SELECT MAX(SubFid) + 1 FROM File_List WHERE Fid=?1",
+                    rusqlite::params![fid],
+                    |row| row.get(0),
+                )?;
+                match next_sub_fid {
+                    Some(sub_fid) => (fid, sub_fid),
+                    None => {
+                        return Err(StdfHelperError {
+                            msg: format!("File[{}] is not found in the database", fid),
+                        });
+                    }
+                }
+            }
+        };
+        // continue numbering from the existing records
+        let mut record_tracker = RecordTracker::resume(test_id_type, &conn, fid)?;
+        let profile = profile.unwrap_or_default();
+        let sample_desc = profile.sample_desc();
+        record_tracker.set_profile(profile);
+        let mut db_ctx = DataBaseCtx::open_existing(&conn, insert_batch_size)?;
+        db_ctx.set_mpr_blob(mpr_blob);
+
+        let append_rslt = (|| -> Result<(), StdfHelperError> {
+            for (i, fpath) in stdf_paths.iter().enumerate() {
+                db_ctx.insert_file_name(rusqlite::params![fid, first_sub_fid + i, fpath])?;
+                if let Some(desc) = &sample_desc {
+                    db_ctx.insert_file_info(rusqlite::params![
+                        fid,
+                        first_sub_fid + i,
+                        "SAMPLED",
+                        desc
+                    ])?;
+                }
+            }
+            // a single transaction, so that it can be rolled back
+            ingest_files_serial(
+                &mut db_ctx,
+                &mut record_tracker,
+                fid,
+                first_sub_fid,
+                &stdf_paths,
+                u64::MAX,
+                default_decode_workers(),
+                &total_progress,
+                &global_stop,
+            )?;
+            // only bins and fail counts of `fid` are in the tracker
+            process_summary_data(&mut db_ctx, &mut record_tracker)?;
+            db_ctx.flush_batches()
+        })();
+        let cancelled = is_valid_stop && global_stop.load(Ordering::Relaxed);
+
+        if append_rslt.is_err() || cancelled {
+            drop(db_ctx);
+            conn.execute_batch("ROLLBACK;")?;
+            append_rslt?;
+            return Ok(None);
+        }
+        db_ctx.record_insert_stats(&format!("File[{}] ", fid));
+        db_ctx.finalize(false)?;
+        if let Err((_, err)) = conn.close() {
+            return Err(StdfHelperError::from(err));
+        };
+        Ok(Some(fid))
+    });
+    // stop the signal thread in any case
+    total_progress.store(10000u16, Ordering::Relaxed);
+
+    for handle in thread_handles {
+        handle.join().unwrap()?;
+    }
+    Ok(written_fid?)
+}
+
+/// parse a stdf file that is still being written into a database,
+/// only records of complete parts are parsed.
+///
+/// The database is created by the first call with `offset` 0,
+/// later calls append new parts after `offset` returned by the
+/// previous call. The database is in WAL mode, so that it can be
+/// read while parsing, it is unchanged if cancelled or failed.
+///
+/// returns the offset for the next call
+#[pyfunction]
+#[pyo3(name = "follow_database")]
+#[pyo3(signature = (dbpath, fpath, offset, test_id_type, progress_signal, stop_flag, insert_batch_size=DEFAULT_INSERT_BATCH_SIZE, mpr_blob=false, profile=None))]
+#[allow(clippy::too_many_arguments)]
+fn follow_database(
+    py: Python,
+    dbpath: String,
+    fpath: String,
+    offset: u64,
+    test_id_type: TestIDType,
+    progress_signal: Bound<'_, PyAny>,
+    stop_flag: Bound<'_, PyAny>,
+    insert_batch_size: usize,
+    mpr_blob: bool,
+    profile: Option<IngestProfile>,
+) -> PyResult<u64> {
+    let is_valid_progress_signal = match progress_signal.getattr(intern!(py, "emit")) {
+        Ok(p) => p.is_callable(),
+        Err(_) => {
+            println!("progress_signal does not have a method `emit`");
+            false
+        }
+    };
+    let is_valid_stop = match stop_flag.getattr(intern!(py, "stop")) {
+        Ok(p) => p.is_instance_of::<PyBool>(),
+        Err(_) => {
+            println!("stop_flag does not have an bool attr `stop`");
+            false
+        }
+    };
+
+    let global_stop = Arc::new(AtomicBool::new(false));
+    let total_progress = Arc::new(AtomicU16::new(0));
+    let mut thread_handles = vec![];
+    if is_valid_progress_signal || is_valid_stop {
+        thread_handles.push(spawn_signal_thread(
+            progress_signal.into(),
+            stop_flag.into(),
+            is_valid_progress_signal,
+            is_valid_stop,
+            total_progress.clone(),
+            global_stop.clone(),
+        ));
+    }
+
+    let next_offset = py.detach(|| -> Result<u64, StdfHelperError> {
+        let conn = Connection::open(&dbpath)?;
+        // offset stays 0 until the first part is complete,
+        // the database must not be created again in later polls
+        let is_new = !DataBaseCtx::is_followed(&conn)?;
+        // a followed session contains a single file
+        let (mut record_tracker, mut db_ctx) = if is_new {
+            let mut db_ctx = DataBaseCtx::new(&conn, insert_batch_size)?;
+            db_ctx.insert_file_name(rusqlite::params![0, 0, &fpath])?;
+            db_ctx.init_follow_state()?;
+            (RecordTracker::new(test_id_type), db_ctx)
+        } else {
+            let mut record_tracker = RecordTracker::resume(test_id_type, &conn, 0)?;
+            if let Some((is_before_prr, sections, sampled_parts)) =
+                DataBaseCtx::read_follow_state(&conn, 0)?
+            {
+                record_tracker.restore_follow_state(0, is_before_prr, sections, sampled_parts);
+            }
+            (
+                record_tracker,
+                DataBaseCtx::open_existing(&conn, insert_batch_size)?,
+            )
+        };
+
+        db_ctx.set_mpr_blob(mpr_blob);
+        record_tracker.set_profile(profile.unwrap_or_default());
+
+        let follow_rslt = (|| -> Result<u64, StdfHelperError> {
+            let next_offset = ingest_follow(
+                &mut db_ctx,
+                &mut record_tracker,
+                0,
+                0,
+                &fpath,
+                offset,
+                &total_progress,
+                &global_stop,
+            )?;
+            if next_offset != offset {
+                process_summary_data(&mut db_ctx, &mut record_tracker)?;
+                let (is_before_prr, sections, sampled_parts) = record_tracker.follow_state(0);
+                db_ctx.update_follow_state(rusqlite::params![
+                    0,
+                    is_before_prr,
+                    serde_json::to_string(&sections)?,
+                    serde_json::to_string(&sampled_parts)?
+                ])?;
+            }
+            db_ctx.flush_batches()?;
+            Ok(next_offset)
+        })();
+        let cancelled = is_valid_stop && global_stop.load(Ordering::Relaxed);
+
+        if follow_rslt.is_err() || cancelled {
+            drop(db_ctx);
+            conn.execute_batch("ROLLBACK;")?;
+            follow_rslt?;
+            return Ok(offset);
+        }
+        db_ctx.finalize(false)?;
+        if is_new {
+            DataBaseCtx::enable_wal(&conn)?;
+        }
+        if let Err((_, err)) = conn.close() {
+            return Err(StdfHelperError::from(err));
+        };
+        follow_rslt
+    });
+    // stop the signal thread in any case
+    total_progress.store(10000u16, Ordering::Relaxed);
+
+    for handle in thread_handles {
+        handle.join().unwrap()?;
+    }
+    Ok(next_offset?)
+}
+
+/// build a session from the records at the head and the tail
+/// of the stdf files, which contain file info, bin counts, part
+/// counts and test fail counts, parts are not parsed.
+///
+/// returns `false` if any file doesn't support it, e.g. compressed
+/// or incomplete files, the database should be discarded in this case
+#[pyfunction]
+#[pyo3(name = "generate_summary_database")]
+#[pyo3(signature = (dbpath, stdf_paths, test_id_type))]
+fn generate_summary_database(
+    py: Python,
+    dbpath: String,
+    stdf_paths: Vec<Vec<String>>,
+    test_id_type: TestIDType,
+) -> PyResult<bool> {
+    let rslt = py.detach(|| -> Result<bool, StdfHelperError> {
+        let conn = Connection::open(&dbpath)?;
+        let mut db_ctx = DataBaseCtx::new(&conn, DEFAULT_INSERT_BATCH_SIZE)?;
+        let mut record_tracker = RecordTracker::new(test_id_type);
+        for (fid, fgroup) in stdf_paths.iter().enumerate() {
+            for (sub_fid, fpath) in fgroup.iter().enumerate() {
+                db_ctx.insert_file_name(rusqlite::params![fid, sub_fid, fpath])?;
+                // UI treats it as a sampled session without parts
+                db_ctx.insert_file_info(rusqlite::params![
+                    fid,
+                    sub_fid,
+                    "SAMPLED",
+                    "Summary records only"
+                ])?;
+                if !ingest_summary(&mut db_ctx, &mut record_tracker, fid, sub_fid, fpath)? {
+                    return Ok(false);
+                }
+            }
+        }
+        process_summary_data(&mut db_ctx, &mut record_tracker)?;
+        db_ctx.flush_batches()?;
+        db_ctx.finalize(false)?;
+        if let Err((_, err)) = conn.close() {
+            return Err(StdfHelperError::from(err));
+        };
+        Ok(true)
+    });
+    Ok(rslt?)
+}
+
+/// uncompressed files are mapped into memory by default,
+/// they are read by `StdfReader` if `enabled` is false.
+///
+/// applies to all parsers, `analyzeSTDF` and `stdf_to_xlsx`
+#[pyfunction]
+#[pyo3(name = "set_mmap_reader")]
+fn set_mmap_reader(enabled: bool) {
+    mapped_file::set_mmap_reader(enabled);
+}
+
+/// (table, rows, rows/sec) of batched inserts since the last call,
+/// table names of a file are prefixed by `File[fid] `
+#[pyfunction]
+#[pyo3(name = "take_insert_stats")]
+fn take_insert_stats() -> Vec<(String, u64, f64)> {
+    database_context::take_insert_stats()
+}
+
+/// check an ingest profile dict before it is saved, raises
+/// `ValueError` if a test name regex cannot be compiled by the
+/// parser or the sample fraction is out of range
+#[pyfunction]
+#[pyo3(name = "validate_profile")]
+fn validate_profile(profile: Bound<'_, PyAny>) -> PyResult<()> {
+    if !profile.is_none() {
+        profile.extract::<IngestProfile>()?;
+    }
+    Ok(())
+}
+
+/// fetch data of `test_id` from valid duts of `heads` and `sites`
+/// (-1 for all sites) of file `fid` in a session database, the query
+/// runs without GIL and results are returned as numpy arrays.
+/// All duts of the test are fetched if `heads` or `sites` is `None`.
+///
+/// keys are the same as `DatabaseFetcher.getTestDataFromHeadSite`,
+/// `None` if MPR arrays cannot be stacked into 2D arrays.
+/// The connection is kept until `close_test_data_connection`
+#[pyfunction]
+#[pyo3(name = "fetch_test_data")]
+#[pyo3(signature = (dbpath, fid, test_id, rec_header, heads=None, sites=None))]
+fn fetch_test_data<'py>(
+    py: Python<'py>,
+    dbpath: String,
+    fid: i64,
+    test_id: i64,
+    rec_header: u8,
+    heads: Option<Vec<i64>>,
+    sites: Option<Vec<i64>>,
+) -> PyResult<Option<Bound<'py, PyDict>>> {
+    let test_data = py.detach(|| -> Result<Option<TestData>, StdfHelperError> {
+        let head_site = match (&heads, &sites) {
+            (Some(h), Some(s)) => Some((h.as_slice(), s.as_slice())),
+            _ => None,
+        };
+        data_fetch::with_read_connection(&dbpath, |conn| {
+            data_fetch::fetch_test_data(conn, fid, test_id, rec_header, head_site)
+        })
     })?;
 
+    let dict = PyDict::new(py);
+    match test_data {
+        Some(TestData::Ptr { duts, data, flags }) => {
+            dict.set_item("dutList", duts.into_pyarray(py))?;
+            dict.set_item("dataList", data.into_pyarray(py))?;
+            dict.set_item("flagList", flags.into_pyarray(py))?;
+        }
+        Some(TestData::Mpr {
+            duts,
+            data,
+            states,
+            flags,
+        }) => {
+            dict.set_item("dutList", duts.into_pyarray(py))?;
+            dict.set_item("dataList", data.into_pyarray(py))?;
+            dict.set_item("stateList", states.into_pyarray(py))?;
+            dict.set_item("flagList", flags.into_pyarray(py))?;
+        }
+        Some(TestData::Ftr { duts, flags }) => {
+            dict.set_item("dutList", duts.into_pyarray(py))?;
+            dict.set_item("flagList", flags.into_pyarray(py))?;
+        }
+        None => return Ok(None),
+    }
+    Ok(Some(dict))
+}
+
+/// close the connection of `dbpath` kept by `fetch_test_data`
+#[pyfunction]
+#[pyo3(name = "close_test_data_connection")]
+fn close_test_data_connection(py: Python, dbpath: String) {
+    py.detach(|| data_fetch::close_read_connection(&dbpath));
+}
+
+/// write PTR data of a session database to a columnar store,
+/// DUTIndex, results and flags of a test are contiguous arrays
+/// that can be memory mapped, see `columnar_store.rs` for the layout
+#[pyfunction]
+#[pyo3(name = "generate_columnar_store")]
+#[pyo3(signature = (dbpath, store_path))]
+fn generate_columnar_store(py: Python, dbpath: String, store_path: String) -> PyResult<()> {
+    py.detach(|| -> Result<(), StdfHelperError> {
+        let conn = Connection::open_with_flags(
+            &dbpath,
+            OpenFlags::SQLITE_OPEN_READ_ONLY | OpenFlags::SQLITE_OPEN_NO_MUTEX,
+        )?;
+        columnar_store::write_columnar_store(&conn, &store_path)
+    })?;
     Ok(())
 }
 
@@ -904,121 +1595,123 @@ fn stdf_to_xlsx(
         let mut xlsx = Workbook::new();
         let bold_format = rust_xlsxwriter::Format::new().set_bold();
         let mut next_line_map = HashMap::with_capacity(40);
-        let mut reader = match StdfReader::new(&stdf_path) {
-            Ok(r) => r,
-            Err(e) => {
-                return Err(StdfHelperError {
-                    msg: format!("Cannot parse this file:\n{}\n\nMessage:\n{}", &stdf_path, e),
-                })
-            }
-        };
-        for raw_rec in reader.get_rawdata_iter() {
-            if stop_flag_rust {
-                break;
-            }
-            let raw_rec = match raw_rec {
-                Ok(raw) => raw,
-                Err(e) => return Err(StdfHelperError { msg: e.to_string() }),
-            };
-            // file offset for calculating progress
-            parse_progess = raw_rec.offset * 100 / file_size;
-            let stdf_rec = StdfRecord::from(raw_rec);
-            // use record name as hashmap key
-            let rec_name = get_rec_name_from_code(stdf_rec.get_type());
-            let field_names = get_fields_from_code(stdf_rec.get_type());
-            // get sheet from workbook
-            let sheet = match xlsx.worksheet_from_name(rec_name) {
-                Ok(s) => s,
-                Err(_) => {
-                    // create new if not exist
-                    let s = xlsx.add_worksheet();
-                    s.set_name(rec_name)?;
-                    // based on the record type, write the column header
-                    for (col, field) in field_names.iter().enumerate() {
-                        s.write_string(0, col as u16, field, &bold_format)?;
-                    }
-                    s
-                }
-            };
-            // get row + 1 for writing the new line
-            let &mut row = next_line_map
-                .entry(rec_name)
-                .and_modify(|r| *r += 1)
-                .or_insert(1);
-            // serialize inner record, then write to sheet in field order
-            let mut check_signal = false;
-            let json = match stdf_rec {
-                // rec type 15
-                StdfRecord::PTR(r) => serde_json::to_value(&r)?,
-                StdfRecord::MPR(r) => serde_json::to_value(&r)?,
-                StdfRecord::FTR(r) => serde_json::to_value(&r)?,
-                StdfRecord::STR(r) => serde_json::to_value(&r)?,
-                // rec type 5
-                StdfRecord::PIR(r) => serde_json::to_value(&r)?,
-                StdfRecord::PRR(r) => {
-                    // check stop signal and send progress if we encountered PRR
-                    check_signal = true;
-                    serde_json::to_value(&r)?
+        let complete = visit_raw_records::<_, StdfHelperError>(
+            &stdf_path,
+            file_size,
+            default_decode_workers(),
+            |rec, file_progress| {
+                if stop_flag_rust {
+                    return Ok(false);
                 }
-                // rec type 2
-                StdfRecord::WIR(r) => serde_json::to_value(&r)?,
-                StdfRecord::WRR(r) => serde_json::to_value(&r)?,
-                StdfRecord::WCR(r) => serde_json::to_value(&r)?,
-                // rec type 50
-                StdfRecord::GDR(r) => serde_json::to_value(&r)?,
-                StdfRecord::DTR(r) => serde_json::to_value(&r)?,
-                // rec type 10
-                StdfRecord::TSR(r) => serde_json::to_value(&r)?,
-                // rec type 1
-                StdfRecord::MIR(r) => serde_json::to_value(&r)?,
-                StdfRecord::MRR(r) => serde_json::to_value(&r)?,
-                StdfRecord::PCR(r) => serde_json::to_value(&r)?,
-                StdfRecord::HBR(r) => serde_json::to_value(&r)?,
-                StdfRecord::SBR(r) => serde_json::to_value(&r)?,
-                StdfRecord::PMR(r) => serde_json::to_value(&r)?,
-                StdfRecord::PGR(r) => serde_json::to_value(&r)?,
-                StdfRecord::PLR(r) => serde_json::to_value(&r)?,
-                StdfRecord::RDR(r) => serde_json::to_value(&r)?,
-                StdfRecord::SDR(r) => serde_json::to_value(&r)?,
-                StdfRecord::PSR(r) => serde_json::to_value(&r)?,
-                StdfRecord::NMR(r) => serde_json::to_value(&r)?,
-                StdfRecord::CNR(r) => serde_json::to_value(&r)?,
-                StdfRecord::SSR(r) => serde_json::to_value(&r)?,
-                StdfRecord::CDR(r) => serde_json::to_value(&r)?,
-                // rec type 0
-                StdfRecord::FAR(r) => serde_json::to_value(&r)?,
-                StdfRecord::ATR(r) => serde_json::to_value(&r)?,
-                StdfRecord::VUR(r) => serde_json::to_value(&r)?,
-                // rec type 20
-                StdfRecord::BPS(r) => serde_json::to_value(&r)?,
-                StdfRecord::EPS(r) => serde_json::to_value(&r)?,
-                // rec type 180: Reserved
-                // rec type 181: Reserved
-                StdfRecord::ReservedRec(r) => serde_json::to_value(&r)?,
-                StdfRecord::InvalidRec(h) => {
-                    panic!("Invalid record found! {h:?}");
-                }
-            };
-            write_json_to_sheet(json, field_names, sheet, row)?;
-
-            if check_signal && (is_valid_progress_signal || is_valid_stop) {
-                if let Err(e) = Python::attach(|py| -> PyResult<()> {
-                    if is_valid_progress_signal {
-                        progress_signal
-                            .bind(py)
-                            .call_method1(intern!(py, "emit"), (parse_progess,))?;
+                // file offset for calculating progress
+                parse_progess = (file_progress * 100.0) as u64;
+                let stdf_rec = rec.decode();
+                // use record name as hashmap key
+                let rec_name = get_rec_name_from_code(stdf_rec.get_type());
+                let field_names = get_fields_from_code(stdf_rec.get_type());
+                // get sheet from workbook
+                let sheet = match xlsx.worksheet_from_name(rec_name) {
+                    Ok(s) => s,
+                    Err(_) => {
+                        // create new if not exist
+                        let s = xlsx.add_worksheet();
+                        s.set_name(rec_name)?;
+                        // based on the record type, write the column header
+                        for (col, field) in field_names.iter().enumerate() {
+                            s.write_string(0, col as u16, field, &bold_format)?;
+                        }
+                        s
                     }
-                    if is_valid_stop {
-                        stop_flag_rust = stop_flag
-                            .bind(py)
-                            .getattr(intern!(py, "stop"))?
-                            .extract::<bool>()?;
+                };
+                // get row + 1 for writing the new line
+                let &mut row = next_line_map
+                    .entry(rec_name)
+                    .and_modify(|r| *r += 1)
+                    .or_insert(1);
+                // serialize inner record, then write to sheet in field order
+                let mut check_signal = false;
+                let json = match stdf_rec {
+                    // rec type 15
+                    StdfRecord::PTR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::MPR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::FTR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::STR(r) => serde_json::to_value(&r)?,
+                    // rec type 5
+                    StdfRecord::PIR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::PRR(r) => {
+                        // check stop signal and send progress if we encountered PRR
+                        check_signal = true;
+                        serde_json::to_value(&r)?
+                    }
+                    // rec type 2
+                    StdfRecord::WIR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::WRR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::WCR(r) => serde_json::to_value(&r)?,
+                    // rec type 50
+                    StdfRecord::GDR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::DTR(r) => serde_json::to_value(&r)?,
+                    // rec type 10
+                    StdfRecord::TSR(r) => serde_json::to_value(&r)?,
+                    // rec type 1
+                    StdfRecord::MIR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::MRR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::PCR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::HBR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::SBR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::PMR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::PGR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::PLR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::RDR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::SDR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::PSR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::NMR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::CNR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::SSR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::CDR(r) => serde_json::to_value(&r)?,
+                    // rec type 0
+                    StdfRecord::FAR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::ATR(r) => serde_json::to_value(&r)?,
+                    StdfRecord::VUR(r) => serde_json::to_value(&r)?,
+                    // rec type 20
+                    StdfRecord::BPS(r) => serde_json::to_value(&r)?,
+                    StdfRecord::EPS(r) => serde_json::to_value(&r)?,
+                    // rec type 180: Reserved
+                    // rec type 181: Reserved
+                    StdfRecord::ReservedRec(r) => serde_json::to_value(&r)?,
+                    StdfRecord::InvalidRec(h) => {
+                        panic!("Invalid record found! {h:?}");
+                    }
+                };
+                write_json_to_sheet(json, field_names, sheet, row)?;
+
+                if check_signal && (is_valid_progress_signal || is_valid_stop) {
+                    if let Err(e) = Python::attach(|py| -> PyResult<()> {
+                        if is_valid_progress_signal {
+                            progress_signal
+                                .bind(py)
+                                .call_method1(intern!(py, "emit"), (parse_progess,))?;
+                        }
+                        if is_valid_stop {
+                            stop_flag_rust = stop_flag
+                                .bind(py)
+                                .getattr(intern!(py, "stop"))?
+                                .extract::<bool>()?;
+                        }
+                        Ok(())
+                    }) {
+                        return Err(StdfHelperError { msg: e.to_string() });
                     }
-                    Ok(())
-                }) {
-                    return Err(StdfHelperError { msg: e.to_string() });
                 }
-            }
+                Ok(true)
+            },
+        )?;
+        if !complete {
+            return Err(StdfHelperError {
+                msg: format!(
+                    "Unexpected EOF, the file might be truncated or corrupted:\n{}",
+                    &stdf_path
+                ),
+            });
         }
         // save xlsx to path
         xlsx.save_to_path(std::path::Path::new(&xlsx_path))?;
@@ -1123,8 +1816,19 @@ fn rust_stdf_helper(py: Python, m: &Bound<'_, PyModule>) -> PyResult<()> {
     test_id_type.add("TestNumberOnly", TestIDType::TestNumberOnly)?;
 
     m.add_submodule(&test_id_type)?;
+    // used for identifying databases generated by different parsers
+    m.add("__version__", env!("CARGO_PKG_VERSION"))?;
     m.add_function(wrap_pyfunction!(analyze_stdf_file, m)?)?;
     m.add_function(wrap_pyfunction!(generate_database, m)?)?;
+    m.add_function(wrap_pyfunction!(append_database, m)?)?;
+    m.add_function(wrap_pyfunction!(follow_database, m)?)?;
+    m.add_function(wrap_pyfunction!(generate_summary_database, m)?)?;
+    m.add_function(wrap_pyfunction!(set_mmap_reader, m)?)?;
+    m.add_function(wrap_pyfunction!(take_insert_stats, m)?)?;
+    m.add_function(wrap_pyfunction!(validate_profile, m)?)?;
+    m.add_function(wrap_pyfunction!(fetch_test_data, m)?)?;
+    m.add_function(wrap_pyfunction!(close_test_data_connection, m)?)?;
+    m.add_function(wrap_pyfunction!(generate_columnar_store, m)?)?;
     m.add_function(wrap_pyfunction!(read_mir, m)?)?;
     m.add_function(wrap_pyfunction!(get_icon_src, m)?)?;
     m.add_function(wrap_pyfunction!(stdf_to_xlsx, m)?)?;
@@ -0,0 +1,245 @@
+//
+// mapped_file.rs
+// Author: noonchen - chennoon233@foxmail.com
+// Created Date: October 18th 2026
+// -----
+// Last Modified: Sun Oct 18 2026
+// Modified By: noonchen
+// -----
+// Copyright (c) 2026 noonchen
+//
+
+use memmap2::Mmap;
+use rust_stdf::{stdf_record_type::*, ByteOrder, StdfRecord};
+use std::fs::File;
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::time::Duration;
+
+/// files are read by `StdfReader` if disabled
+static MMAP_READER: AtomicBool = AtomicBool::new(true);
+
+/// a file modified within this duration might be still written by the tester
+const GROWING_FILE_AGE: Duration = Duration::from_secs(10);
+
+pub fn set_mmap_reader(enabled: bool) {
+    MMAP_READER.store(enabled, Ordering::Relaxed);
+}
+
+/// a record that is not decoded yet, `data` is
+/// the record data without the 4-byte header
+pub struct RawRecord<'a> {
+    pub offset: u64,
+    pub typ: u8,
+    pub sub: u8,
+    pub byte_order: ByteOrder,
+    pub data: &'a [u8],
+}
+
+impl RawRecord<'_> {
+    #[inline(always)]
+    pub fn rec_code(&self) -> u64 {
+        get_code_from_typ_sub(self.typ, self.sub)
+    }
+
+    /// `rec_type` can be multiple types, e.g. `REC_PIR | REC_PRR`
+    #[inline(always)]
+    pub fn is_type(&self, rec_type: u64) -> bool {
+        self.rec_code() & rec_type != 0
+    }
+
+    #[inline(always)]
+    pub fn decode(&self) -> StdfRecord {
+        let mut record = StdfRecord::new(self.rec_code());
+        record.read_from_bytes(self.data, &self.byte_order);
+        record
+    }
+}
+
+/// an uncompressed stdf file mapped into memory, records
+/// are visited as slices of the mapping without copy.
+///
+/// Pages are shared with other readers of the
+/// same file through the OS page cache.
+pub struct MappedStdf {
+    mmap: Mmap,
+    order: ByteOrder,
+}
+
+impl MappedStdf {
+    /// `None` if the mmap reader is disabled, `fpath` is compressed,
+    /// is still being written, does not start with a FAR or cannot
+    /// be mapped, caller should fall back to the buffered reader
+    pub fn open(fpath: &str) -> Option<Self> {
+        if !MMAP_READER.load(Ordering::Relaxed)
+            || [".gz", ".bz2", ".zip"].iter().any(|ext| fpath.ends_with(ext))
+        {
+            return None;
+        }
+        let fp = File::open(fpath).ok()?;
+        if is_growing(&fp) {
+            return None;
+        }
+        // SAFETY: reading a mapped file that is truncated raises SIGBUS,
+        // files that are recently modified are not mapped
+        let mmap = unsafe { Mmap::map(&fp) }.ok()?;
+        // first record must be FAR, whose REC_LEN is always 2,
+        // it's how the byte order is determined
+        if mmap.len() < 6 || mmap[2] != 0 || mmap[3] != 10 {
+            return None;
+        }
+        let order = if u16::from_le_bytes([mmap[0], mmap[1]]) == 2 {
+            ByteOrder::LittleEndian
+        } else {
+            ByteOrder::BigEndian
+        };
+        #[cfg(unix)]
+        let _ = mmap.advise(memmap2::Advice::Sequential);
+        Some(MappedStdf { mmap, order })
+    }
+
+    #[inline(always)]
+    pub fn file_size(&self) -> u64 {
+        self.mmap.len() as u64
+    }
+
+    /// records of the whole file
+    pub fn records(&self) -> MappedRecords<'_> {
+        self.records_in(0, self.file_size())
+    }
+
+    /// records in [start, end), `start` must be the offset of a record
+    pub fn records_in(&self, start: u64, end: u64) -> MappedRecords<'_> {
+        MappedRecords {
+            data: &self.mmap[..(end.min(self.file_size()) as usize)],
+            pos: start as usize,
+            order: self.order,
+        }
+    }
+}
+
+/// `true` if `fp` is modified recently or its modified time is unknown
+fn is_growing(fp: &File) -> bool {
+    match fp.metadata().and_then(|m| m.modified()) {
+        // a modified time in the future is not trusted
+        Ok(t) => t.elapsed().map_or(true, |age| age < GROWING_FILE_AGE),
+        Err(_) => true,
+    }
+}
+
+/// iterator of records of a mapped file, it stops at a
+/// truncated record, see `MappedRecords::is_complete`
+pub struct MappedRecords<'a> {
+    data: &'a [u8],
+    pos: usize,
+    order: ByteOrder,
+}
+
+impl MappedRecords<'_> {
+    /// `true` if all records before the end are visited
+    pub fn is_complete(&self) -> bool {
+        self.pos >= self.data.len()
+    }
+}
+
+impl<'a> Iterator for MappedRecords<'a> {
+    type Item = RawRecord<'a>;
+
+    #[inline(always)]
+    fn next(&mut self) -> Option<Self::Item> {
+        let header = self.data.get(self.pos..self.pos + 4)?;
+        let len = match self.order {
+            ByteOrder::LittleEndian => u16::from_le_bytes([header[0], header[1]]),
+            ByteOrder::BigEndian => u16::from_be_bytes([header[0], header[1]]),
+        } as usize;
+        let data_start = self.pos + 4;
+        // truncated record is not returned
+        let data = self.data.get(data_start..data_start + len)?;
+        let record = RawRecord {
+            offset: self.pos as u64,
+            typ: header[2],
+            sub: header[3],
+            byte_order: self.order,
+            data,
+        };
+        self.pos = data_start + len;
+        Some(record)
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use rust_stdf::stdf_file::StdfReader;
+    use std::io::{BufWriter, Write};
+    use std::time::{Instant, SystemTime};
+
+    /// a FAR followed by PTRs of 16 bytes until `size` is reached
+    fn write_stdf(fpath: &std::path::Path, size: u64) {
+        let fp = File::create(fpath).unwrap();
+        let mut writer = BufWriter::with_capacity(1 << 20, &fp);
+        writer.write_all(&[2, 0, 0, 10, 2, 4]).unwrap();
+        let mut written = 6u64;
+        let mut test_num = 0u32;
+        while written < size {
+            writer.write_all(&[12, 0, 15, 10]).unwrap();
+            writer.write_all(&test_num.to_le_bytes()).unwrap();
+            writer.write_all(&[1, 0, 0, 0]).unwrap();
+            writer.write_all(&(test_num as f32).to_le_bytes()).unwrap();
+            test_num = (test_num + 1) % 50000;
+            written += 16;
+        }
+        writer.flush().unwrap();
+        drop(writer);
+        // a file that is just written is treated as growing
+        fp.set_modified(SystemTime::now() - 2 * GROWING_FILE_AGE)
+            .unwrap();
+    }
+
+    /// compare the mmap reader with `StdfReader` on a 1GB file, run by:
+    ///
+    /// `cargo test --release bench_mmap_reader -- --ignored --nocapture`
+    ///
+    /// set `STDF_BENCH_GB=10` for a 10GB file, the 2nd run of each
+    /// reader shows the throughput if the file is in page cache
+    #[test]
+    #[ignore]
+    fn bench_mmap_reader() {
+        let gb: u64 = std::env::var("STDF_BENCH_GB")
+            .ok()
+            .and_then(|v| v.parse().ok())
+            .unwrap_or(1);
+        let fpath = std::env::temp_dir().join(format!("bench_mmap_reader_{}gb.stdf", gb));
+        write_stdf(&fpath, gb << 30);
+        let fpath_str = fpath.to_str().unwrap();
+
+        for round in 0..2 {
+            let start = Instant::now();
+            let mapped = MappedStdf::open(fpath_str).expect("file is not mapped");
+            let mut n_mapped = 0u64;
+            for rec in mapped.records() {
+                n_mapped += rec.data.len() as u64;
+            }
+            let t_mapped = start.elapsed().as_secs_f64();
+
+            let start = Instant::now();
+            let mut reader = StdfReader::new(fpath_str).unwrap();
+            let mut n_buffered = 0u64;
+            for raw_rec in reader.get_rawdata_iter() {
+                n_buffered += raw_rec.unwrap().raw_data.len() as u64;
+            }
+            let t_buffered = start.elapsed().as_secs_f64();
+
+            assert_eq!(n_mapped, n_buffered);
+            println!(
+                "{}GB round {}: mmap {:.2}s ({:.0} MB/s), buffered {:.2}s ({:.0} MB/s)",
+                gb,
+                round,
+                t_mapped,
+                (gb << 10) as f64 / t_mapped,
+                t_buffered,
+                (gb << 10) as f64 / t_buffered,
+            );
+        }
+        let _ = std::fs::remove_file(&fpath);
+    }
+}
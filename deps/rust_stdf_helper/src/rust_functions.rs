@@ -3,16 +3,22 @@
 // Author: noonchen - chennoon233@foxmail.com
 // Created Date: October 29th 2022
 // -----
-// Last Modified: Sun Sep 21 2025
+// Last Modified: Sun Oct 18 2026
 // Modified By: noonchen
 // -----
 // Copyright (c) 2022 noonchen
 //
 
-use crate::{database_context::DataBaseCtx, StdfHelperError};
+use crate::{
+    database_context::DataBaseCtx,
+    statistic_functions::{TDigest, TestStat},
+    StdfHelperError,
+};
 use chrono::{DateTime, Local, NaiveDateTime, TimeZone, Utc};
 use lazy_static::lazy_static;
+use regex::Regex;
 use rust_stdf::*;
+use rusqlite::Connection;
 use rust_xlsxwriter::{Worksheet, XlsxError};
 use std::collections::HashMap;
 use std::io::{Read, Seek, SeekFrom};
@@ -68,12 +74,341 @@ pub enum TestIDType {
     TestNumberOnly = 1,
 }
 
+/// records, tests and sites to keep at parse time,
+/// everything is kept by default.
+///
+/// Record types, test numbers and sites are checked on raw data
+/// before decoding, test names can only be checked after decoding.
+#[derive(Debug, Clone, Default)]
+pub struct IngestProfile {
+    // false if nothing is filtered
+    active: bool,
+    // record type codes that are skipped
+    skip_records: Vec<u64>,
+    // inclusive test number ranges, empty for all tests
+    include_tests: Vec<(u32, u32)>,
+    exclude_tests: Vec<(u32, u32)>,
+    include_names: Option<Regex>,
+    exclude_names: Option<Regex>,
+    // site whitelist, empty for all sites
+    sites: Vec<u8>,
+    // sampling mode, keep every Nth part of a head/site,
+    // or a random fraction of parts if `sample_fraction` > 0
+    sample_every: u32,
+    sample_fraction: f64,
+}
+
+/// record types that can be skipped, records that
+/// define files, parts or wafers are always needed
+#[inline(always)]
+fn get_skippable_code(rec_name: &str) -> Option<u64> {
+    match rec_name.to_uppercase().as_str() {
+        "ATR" => Some(REC_ATR),
+        "VUR" => Some(REC_VUR),
+        "RDR" => Some(REC_RDR),
+        "SDR" => Some(REC_SDR),
+        "PSR" => Some(REC_PSR),
+        "NMR" => Some(REC_NMR),
+        "CNR" => Some(REC_CNR),
+        "SSR" => Some(REC_SSR),
+        "CDR" => Some(REC_CDR),
+        "WCR" => Some(REC_WCR),
+        "PMR" => Some(REC_PMR),
+        "PGR" => Some(REC_PGR),
+        "PLR" => Some(REC_PLR),
+        "PCR" => Some(REC_PCR),
+        "HBR" => Some(REC_HBR),
+        "SBR" => Some(REC_SBR),
+        "TSR" => Some(REC_TSR),
+        "PTR" => Some(REC_PTR),
+        "MPR" => Some(REC_MPR),
+        "FTR" => Some(REC_FTR),
+        "STR" => Some(REC_STR),
+        "BPS" => Some(REC_BPS),
+        "EPS" => Some(REC_EPS),
+        "GDR" => Some(REC_GDR),
+        "DTR" => Some(REC_DTR),
+        _ => None,
+    }
+}
+
+#[inline(always)]
+fn read_u32_at(raw_data: &[u8], pos: usize, order: &ByteOrder) -> Option<u32> {
+    let bytes: [u8; 4] = raw_data.get(pos..pos + 4)?.try_into().ok()?;
+    Some(match order {
+        ByteOrder::LittleEndian => u32::from_le_bytes(bytes),
+        ByteOrder::BigEndian => u32::from_be_bytes(bytes),
+    })
+}
+
+impl IngestProfile {
+    /// empty regex means no filter
+    pub fn new(
+        skip_records: &[String],
+        include_tests: Vec<(u32, u32)>,
+        exclude_tests: Vec<(u32, u32)>,
+        include_names: &str,
+        exclude_names: &str,
+        sites: Vec<u8>,
+    ) -> Result<Self, StdfHelperError> {
+        let skip_records = skip_records
+            .iter()
+            .map(|name| {
+                get_skippable_code(name).ok_or_else(|| StdfHelperError {
+                    msg: format!("Record type [{}] cannot be skipped", name),
+                })
+            })
+            .collect::<Result<Vec<u64>, StdfHelperError>>()?;
+        let compile = |pattern: &str| -> Result<Option<Regex>, StdfHelperError> {
+            if pattern.is_empty() {
+                return Ok(None);
+            }
+            match Regex::new(pattern) {
+                Ok(re) => Ok(Some(re)),
+                Err(e) => Err(StdfHelperError {
+                    msg: format!("Invalid test name regex [{}]:\n{}", pattern, e),
+                }),
+            }
+        };
+        let include_names = compile(include_names)?;
+        let exclude_names = compile(exclude_names)?;
+
+        let active = !skip_records.is_empty()
+            || !include_tests.is_empty()
+            || !exclude_tests.is_empty()
+            || include_names.is_some()
+            || exclude_names.is_some()
+            || !sites.is_empty();
+        Ok(IngestProfile {
+            active,
+            skip_records,
+            include_tests,
+            exclude_tests,
+            include_names,
+            exclude_names,
+            sites,
+            sample_every: 0,
+            sample_fraction: 0.0,
+        })
+    }
+
+    /// enable the sampling mode, `every` <= 1 and `fraction` == 0 keep all parts
+    pub fn with_sampling(mut self, every: u32, fraction: f64) -> Result<Self, StdfHelperError> {
+        if !(0.0..=1.0).contains(&fraction) {
+            return Err(StdfHelperError {
+                msg: format!("Sample fraction must be in [0, 1], got {}", fraction),
+            });
+        }
+        self.sample_every = every;
+        self.sample_fraction = fraction;
+        Ok(self)
+    }
+
+    #[inline(always)]
+    pub fn is_sampled(&self) -> bool {
+        self.sample_fraction > 0.0 || self.sample_every > 1
+    }
+
+    /// description stored in the session, `None` if all parts are kept
+    pub fn sample_desc(&self) -> Option<String> {
+        if self.sample_fraction > 0.0 {
+            Some(format!("{:.2}% of parts", self.sample_fraction * 100.0))
+        } else if self.sample_every > 1 {
+            Some(format!("1 of every {} parts", self.sample_every))
+        } else {
+            None
+        }
+    }
+
+    /// sampler of a record stream, streams that are
+    /// parsed in parallel should use different seeds.
+    ///
+    /// `parts_seen` is (head, site, part count) before the stream,
+    /// so that 1 of every N parts is counted from the file start
+    pub fn sampler(&self, seed: u64, parts_seen: &[(u8, u8, u64)]) -> PartSampler {
+        PartSampler::new(self.sample_every, self.sample_fraction, seed, parts_seen)
+    }
+
+    #[inline(always)]
+    fn keep_site(&self, site_num: u8) -> bool {
+        self.sites.is_empty() || self.sites.contains(&site_num)
+    }
+
+    #[inline(always)]
+    fn keep_test_num(&self, test_num: u32) -> bool {
+        let in_ranges =
+            |ranges: &[(u32, u32)]| ranges.iter().any(|&(lo, hi)| lo <= test_num && test_num <= hi);
+        (self.include_tests.is_empty() || in_ranges(&self.include_tests))
+            && !in_ranges(&self.exclude_tests)
+    }
+
+    #[inline(always)]
+    fn keep_test_name(&self, test_name: &str) -> bool {
+        self.include_names
+            .as_ref()
+            .map_or(true, |re| re.is_match(test_name))
+            && !self
+                .exclude_names
+                .as_ref()
+                .is_some_and(|re| re.is_match(test_name))
+    }
+
+    /// check a record before decoding, by its type,
+    /// and test number and site in the leading fields.
+    ///
+    /// summary records of all sites (HBR, SBR...) are not filtered by site
+    #[inline(always)]
+    pub fn skip_raw(&self, rec_code: u64, raw_data: &[u8], order: &ByteOrder) -> bool {
+        if !self.active {
+            return false;
+        }
+        if self.skip_records.contains(&rec_code) {
+            return true;
+        }
+        match rec_code {
+            // TEST_NUM, HEAD_NUM, SITE_NUM, ...
+            REC_PTR | REC_MPR | REC_FTR => {
+                let site_skipped = raw_data.get(5).is_some_and(|&site| !self.keep_site(site));
+                site_skipped
+                    || read_u32_at(raw_data, 0, order).is_some_and(|num| !self.keep_test_num(num))
+            }
+            // HEAD_NUM, SITE_NUM, ...
+            REC_PIR | REC_PRR => raw_data.get(1).is_some_and(|&site| !self.keep_site(site)),
+            // HEAD_NUM, SITE_NUM, TEST_TYP, TEST_NUM, ...
+            REC_TSR => {
+                read_u32_at(raw_data, 3, order).is_some_and(|num| !self.keep_test_num(num))
+            }
+            _ => false,
+        }
+    }
+
+    /// check test names of a decoded record
+    #[inline(always)]
+    pub fn skip_decoded(&self, rec: &StdfRecord) -> bool {
+        if self.include_names.is_none() && self.exclude_names.is_none() {
+            return false;
+        }
+        match rec {
+            StdfRecord::PTR(r) => !self.keep_test_name(&r.test_txt),
+            StdfRecord::MPR(r) => !self.keep_test_name(&r.test_txt),
+            StdfRecord::FTR(r) => !self.keep_test_name(&r.test_txt),
+            StdfRecord::TSR(r) => !self.keep_test_name(&r.test_nam),
+            _ => false,
+        }
+    }
+}
+
+/// decides which parts are kept in the sampling mode.
+///
+/// A part is kept or skipped at its PIR, the decision applies
+/// to the test records and PRR of the same head/site,
+/// hence a sampler must see the records in file order.
+pub struct PartSampler {
+    every: u32,
+    fraction: f64,
+    rng: u64,
+    // (head, site, parts seen, current part is skipped)
+    sites: Vec<(u8, u8, u64, bool)>,
+}
+
+impl PartSampler {
+    fn new(every: u32, fraction: f64, seed: u64, parts_seen: &[(u8, u8, u64)]) -> Self {
+        // splitmix64, xorshift must not start from 0
+        let mut z = seed.wrapping_add(0x9E37_79B9_7F4A_7C15);
+        z = (z ^ (z >> 30)).wrapping_mul(0xBF58_476D_1CE4_E5B9);
+        z = (z ^ (z >> 27)).wrapping_mul(0x94D0_49BB_1331_11EB);
+        z ^= z >> 31;
+        PartSampler {
+            every,
+            fraction,
+            rng: if z == 0 { 1 } else { z },
+            sites: parts_seen
+                .iter()
+                .map(|&(head, site, count)| (head, site, count, false))
+                .collect(),
+        }
+    }
+
+    /// (head, site, part count) seen so far, including
+    /// the counts the sampler is created with
+    pub fn parts_seen(&self) -> Vec<(u8, u8, u64)> {
+        self.sites
+            .iter()
+            .map(|&(head, site, count, _)| (head, site, count))
+            .collect()
+    }
+
+    #[inline(always)]
+    fn next_f64(&mut self) -> f64 {
+        // xorshift64*
+        self.rng ^= self.rng >> 12;
+        self.rng ^= self.rng << 25;
+        self.rng ^= self.rng >> 27;
+        (self.rng.wrapping_mul(0x2545_F491_4F6C_DD1D) >> 11) as f64 / (1u64 << 53) as f64
+    }
+
+    #[inline(always)]
+    fn is_skipping(&self, head: Option<&u8>, site: Option<&u8>) -> bool {
+        let (Some(&head), Some(&site)) = (head, site) else {
+            return false;
+        };
+        self.sites
+            .iter()
+            .any(|&(h, s, _, skipped)| h == head && s == site && skipped)
+    }
+
+    fn on_part_start(&mut self, head: u8, site: u8) -> bool {
+        let pos = match self.sites.iter().position(|&(h, s, _, _)| h == head && s == site) {
+            Some(pos) => pos,
+            None => {
+                self.sites.push((head, site, 0, false));
+                self.sites.len() - 1
+            }
+        };
+        let count = self.sites[pos].2;
+        let keep = if self.fraction > 0.0 {
+            self.next_f64() < self.fraction
+        } else {
+            count % self.every.max(1) as u64 == 0
+        };
+        self.sites[pos].2 += 1;
+        self.sites[pos].3 = !keep;
+        !keep
+    }
+
+    /// check a record before decoding, `true` if it
+    /// belongs to a part that is not sampled
+    #[inline(always)]
+    pub fn skip_raw(&mut self, rec_code: u64, raw_data: &[u8]) -> bool {
+        if self.fraction <= 0.0 && self.every <= 1 {
+            return false;
+        }
+        match rec_code {
+            // HEAD_NUM, SITE_NUM, ...
+            REC_PIR => match (raw_data.first(), raw_data.get(1)) {
+                (Some(&head), Some(&site)) => self.on_part_start(head, site),
+                _ => false,
+            },
+            REC_PRR => self.is_skipping(raw_data.first(), raw_data.get(1)),
+            // TEST_NUM, HEAD_NUM, SITE_NUM, ...
+            REC_PTR | REC_MPR | REC_FTR => self.is_skipping(raw_data.get(4), raw_data.get(5)),
+            _ => false,
+        }
+    }
+}
+
 pub struct RecordTracker {
     // determines how the unique test id is constructed
     id_type: TestIDType,
+    // records to keep
+    profile: IngestProfile,
 
-    // file id, test num, test name -> unique test id (map size)
-    id_map: HashMap<(usize, u32, String), usize>,
+    // file id, test num -> unique test ids of this test num,
+    // test names are in `id_keys`, a lookup never allocates
+    id_map: HashMap<(usize, u32), Vec<usize>>,
+    // unique test id -> (file id, test num, test name), test name
+    // is empty if not used, ids of other files may be placeholders
+    id_keys: Vec<(usize, u32, String)>,
 
     // unique test id -> result scale
     scale_map: HashMap<usize, i32>,
@@ -86,12 +421,29 @@ pub struct RecordTracker {
     // unique test id -> fail count
     test_fail_count: HashMap<usize, u32>,
 
-    // file id, head, site -> dut index
-    dut_index_tracker: HashMap<(usize, u8, u8), u64>,
+    // file id, head, site -> (dut index, test id of the last result),
+    // ids are assigned in test order, the next test is likely `last + 1`
+    dut_index_tracker: HashMap<(usize, u8, u8), (u64, usize)>,
 
     // file id, head -> wafer index
     wafer_index_tracker: HashMap<(usize, u8), u64>,
 
+    // (file id, head, site, part id) -> dut indexes not superseded yet
+    part_id_tracker: HashMap<(usize, u8, u8, String), Vec<u64>>,
+    // (file id, head, site, wafer index, x, y) -> dut indexes not superseded yet
+    die_tracker: HashMap<(usize, u8, u8, u64, i16, i16), Vec<u64>>,
+    // (file id, head, site, dut index) superseded by retest,
+    // written to database in `process_summary_data`
+    superseded_duts: Vec<(usize, u8, u8, u64)>,
+
+    // (file id, test id, head, site) -> statistics of PTR results
+    test_stats: HashMap<(usize, usize, u8, u8), TestStat>,
+    // (file id, head, site) -> (test id, result, test flag) of the
+    // dut in test, added to `test_stats` in PRR
+    pending_results: HashMap<(usize, u8, u8), Vec<(usize, f32, u8)>>,
+    // test id -> last dut index + 1 added to `test_stats`
+    last_result_dut: Vec<u64>,
+
     // (file id, HBIN) -> (bin name, bin type)
     hbin_tracker: HashMap<(usize, u16), (String, char)>,
     // (file id, SBIN) -> (bin name, bin type)
@@ -103,6 +455,10 @@ pub struct RecordTracker {
     // program section tracker
     program_sections: HashMap<usize, Vec<String>>,
 
+    // file id -> (head, site, part count) seen by the sampler,
+    // a followed file is sampled across polls
+    sampled_parts: HashMap<usize, Vec<(u8, u8, u64)>>,
+
     // for counting
     // file id -> dut count
     dut_total: HashMap<usize, u64>,
@@ -114,26 +470,236 @@ impl RecordTracker {
     pub fn new(id_type: TestIDType) -> Self {
         RecordTracker {
             id_type,
+            profile: IngestProfile::default(),
             id_map: HashMap::with_capacity(1024),
+            id_keys: Vec::with_capacity(1024),
             scale_map: HashMap::with_capacity(1024),
             default_llimit: HashMap::with_capacity(1024),
             default_hlimit: HashMap::with_capacity(1024),
             test_fail_count: HashMap::with_capacity(1024),
             dut_index_tracker: HashMap::with_capacity(128),
             wafer_index_tracker: HashMap::with_capacity(128),
+            part_id_tracker: HashMap::with_capacity(1024),
+            die_tracker: HashMap::with_capacity(1024),
+            superseded_duts: Vec::new(),
+            test_stats: HashMap::with_capacity(1024),
+            pending_results: HashMap::with_capacity(128),
+            last_result_dut: Vec::new(),
             hbin_tracker: HashMap::with_capacity(128),
             sbin_tracker: HashMap::with_capacity(1024),
             datalog_pos_tracker: HashMap::with_capacity(32),
             program_sections: HashMap::with_capacity(32),
+            sampled_parts: HashMap::new(),
             dut_total: HashMap::with_capacity(32),
             wafer_total: HashMap::with_capacity(32),
         }
     }
 
+    pub fn set_profile(&mut self, profile: IngestProfile) {
+        self.profile = profile;
+    }
+
+    #[inline(always)]
+    pub fn profile(&self) -> &IngestProfile {
+        &self.profile
+    }
+
+    /// number of unique test ids assigned so far,
+    /// ids are always in `0..num_test_ids()`
+    #[inline(always)]
+    pub fn num_test_ids(&self) -> usize {
+        self.id_keys.len()
+    }
+
+    /// restore the tracker of `file_id` from an existing database,
+    /// so that records appended to this file continue the
+    /// DUTIndex, WaferIndex and TEST_ID numbering.
+    ///
+    /// `file_id` that is not in database is a new file,
+    /// only the test id numbering is restored.
+    pub fn resume(
+        id_type: TestIDType,
+        conn: &Connection,
+        file_id: usize,
+    ) -> Result<Self, StdfHelperError> {
+        let mut tracker = RecordTracker::new(id_type);
+        // test ids are unique across all files,
+        // ids of other files are never matched
+        let num_test_ids: usize = conn.query_row(
+            "SELECT IFNULL(MAX(TEST_ID) + 1, 0) FROM Test_Info",
+            [],
+            |row| row.get(0),
+        )?;
+        tracker
+            .id_keys
+            .resize(num_test_ids, (usize::MAX, 0, String::new()));
+
+        let mut stmt = conn.prepare(
+            "SELECT TEST_ID, TEST_NUM, TEST_NAME, recHeader, RES_SCAL, LLimit, HLimit, FailCount 
+            FROM Test_Info WHERE Fid=?1",
+        )?;
+        let mut rows = stmt.query(rusqlite::params![file_id])?;
+        while let Some(row) = rows.next()? {
+            let test_id: usize = row.get(0)?;
+            let test_num: u32 = row.get(1)?;
+            let test_name: String = row.get::<_, Option<String>>(2)?.unwrap_or_default();
+            let rec_header: u8 = row.get(3)?;
+            let test_name = match id_type {
+                TestIDType::TestNumberAndName => test_name,
+                TestIDType::TestNumberOnly => String::new(),
+            };
+            tracker
+                .id_map
+                .entry((file_id, test_num))
+                .or_default()
+                .push(test_id);
+            tracker.id_keys[test_id] = (file_id, test_num, test_name);
+            tracker
+                .scale_map
+                .insert(test_id, row.get::<_, Option<i32>>(4)?.unwrap_or(0));
+            if rec_header == 10 {
+                // NaN limits are stored as NULL
+                let llimit: Option<f64> = row.get(5)?;
+                let hlimit: Option<f64> = row.get(6)?;
+                tracker.update_default_limits(
+                    test_id,
+                    llimit.map_or(f32::NAN, |v| v as f32),
+                    hlimit.map_or(f32::NAN, |v| v as f32),
+                );
+            }
+            // -1 means no TSR has been seen
+            let fail_cnt: i64 = row.get::<_, Option<i64>>(7)?.unwrap_or(-1);
+            if fail_cnt >= 0 {
+                tracker.test_fail_count.insert(test_id, fail_cnt as u32);
+            }
+        }
+        drop(rows);
+        stmt.finalize()?;
+
+        let dut_total: Option<u64> = conn.query_row(
+            "SELECT MAX(DUTIndex) FROM Dut_Info WHERE Fid=?1",
+            rusqlite::params![file_id],
+            |row| row.get(0),
+        )?;
+        if let Some(dut_total) = dut_total {
+            tracker.dut_total.insert(file_id, dut_total);
+        }
+        // a wafer without WRR is only seen in Dut_Info
+        let wafer_total: Option<u64> = conn.query_row(
+            "SELECT MAX(w) FROM (
+                SELECT MAX(WaferIndex) AS w FROM Wafer_Info WHERE Fid=?1 
+                UNION ALL 
+                SELECT MAX(WaferIndex) AS w FROM Dut_Info WHERE Fid=?1)",
+            rusqlite::params![file_id],
+            |row| row.get(0),
+        )?;
+        if let Some(wafer_total) = wafer_total {
+            tracker.wafer_total.insert(file_id, wafer_total);
+        }
+        // parts after a WIR belong to the latest wafer of the head
+        let mut stmt = conn.prepare(
+            "SELECT HEAD_NUM, MAX(WaferIndex) FROM Dut_Info 
+            WHERE Fid=?1 AND WaferIndex IS NOT NULL GROUP BY HEAD_NUM",
+        )?;
+        let mut rows = stmt.query(rusqlite::params![file_id])?;
+        while let Some(row) = rows.next()? {
+            let head_num: u8 = row.get(0)?;
+            tracker
+                .wafer_index_tracker
+                .insert((file_id, head_num), row.get(1)?);
+        }
+        drop(rows);
+        stmt.finalize()?;
+
+        // new DUTs may supersede the stored ones
+        let mut stmt = conn.prepare(
+            "SELECT DUTIndex, HEAD_NUM, SITE_NUM, PartID, WaferIndex, XCOORD, YCOORD FROM Dut_Info 
+            WHERE Fid=?1 AND Supersede=0 ORDER BY DUTIndex",
+        )?;
+        let mut rows = stmt.query(rusqlite::params![file_id])?;
+        while let Some(row) = rows.next()? {
+            let dut_index: u64 = row.get(0)?;
+            let head_num: u8 = row.get(1)?;
+            let site_num: u8 = row.get(2)?;
+            let part_id: String = row.get::<_, Option<String>>(3)?.unwrap_or_default();
+            tracker
+                .part_id_tracker
+                .entry((file_id, head_num, site_num, part_id))
+                .or_default()
+                .push(dut_index);
+            let wafer_index: Option<u64> = row.get(4)?;
+            let x_coord: Option<i16> = row.get(5)?;
+            let y_coord: Option<i16> = row.get(6)?;
+            if let (Some(wafer_index), Some(x), Some(y)) = (wafer_index, x_coord, y_coord) {
+                tracker
+                    .die_tracker
+                    .entry((file_id, head_num, site_num, wafer_index, x, y))
+                    .or_default()
+                    .push(dut_index);
+            }
+        }
+        drop(rows);
+        stmt.finalize()?;
+
+        let mut stmt = conn.prepare(
+            "SELECT TEST_ID, HEAD_NUM, SITE_NUM, Count, Shift, Sum, SumSq, Min, Max, 
+            FailCount, NaNCount, InfCount, Digest FROM Test_Stats WHERE Fid=?1",
+        )?;
+        let mut rows = stmt.query(rusqlite::params![file_id])?;
+        while let Some(row) = rows.next()? {
+            let test_id: usize = row.get(0)?;
+            let head_num: u8 = row.get(1)?;
+            let site_num: u8 = row.get(2)?;
+            // min and max of an empty stat are stored as NULL
+            let stat = TestStat {
+                count: row.get(3)?,
+                shift: row.get(4)?,
+                sum: row.get(5)?,
+                sum_sq: row.get(6)?,
+                min: row.get::<_, Option<f64>>(7)?.unwrap_or(f64::INFINITY),
+                max: row.get::<_, Option<f64>>(8)?.unwrap_or(f64::NEG_INFINITY),
+                fail_count: row.get(9)?,
+                nan_count: row.get(10)?,
+                inf_count: row.get(11)?,
+                digest: TDigest::from_bytes(&row.get::<_, Option<Vec<u8>>>(12)?.unwrap_or_default()),
+                stale: false,
+            };
+            tracker
+                .test_stats
+                .insert((file_id, test_id, head_num, site_num), stat);
+        }
+        drop(rows);
+        stmt.finalize()?;
+
+        let mut stmt =
+            conn.prepare("SELECT BIN_TYPE, BIN_NUM, BIN_NAME, BIN_PF FROM Bin_Info WHERE Fid=?1")?;
+        let mut rows = stmt.query(rusqlite::params![file_id])?;
+        while let Some(row) = rows.next()? {
+            let bin_type: String = row.get(0)?;
+            let bin_num: u16 = row.get(1)?;
+            let bin_name: String = row.get::<_, Option<String>>(2)?.unwrap_or_default();
+            let bin_pf = row
+                .get::<_, Option<String>>(3)?
+                .and_then(|pf| pf.chars().next())
+                .unwrap_or('U');
+            match bin_type.as_str() {
+                "H" => tracker.hbin_tracker.insert((file_id, bin_num), (bin_name, bin_pf)),
+                _ => tracker.sbin_tracker.insert((file_id, bin_num), (bin_name, bin_pf)),
+            };
+        }
+        drop(rows);
+        stmt.finalize()?;
+        Ok(tracker)
+    }
+
     #[inline(always)]
     pub fn pir_detected(&mut self, file_id: usize, head_num: u8, site_num: u8) -> u64 {
         // indicating any DTR or GDR is before PRR
         self.datalog_pos_tracker.insert(file_id, true);
+        // results after the PRR of last dut are discarded
+        if let Some(results) = self.pending_results.get_mut(&(file_id, head_num, site_num)) {
+            results.clear();
+        }
         let dut_index;
 
         if let Some(dut_total) = self.dut_total.get_mut(&file_id) {
@@ -141,7 +707,7 @@ impl RecordTracker {
             *dut_total += 1;
             // update dut index tracker
             self.dut_index_tracker
-                .insert((file_id, head_num, site_num), *dut_total);
+                .insert((file_id, head_num, site_num), (*dut_total, usize::MAX));
             dut_index = *dut_total;
         } else {
             // no dut_index was saved for file id, set dut_index to default 1
@@ -149,7 +715,7 @@ impl RecordTracker {
             // insert dut_index=1 to hashmap
             self.dut_total.insert(file_id, dut_index);
             self.dut_index_tracker
-                .insert((file_id, head_num, site_num), dut_index);
+                .insert((file_id, head_num, site_num), (dut_index, usize::MAX));
         };
         dut_index
     }
@@ -196,7 +762,7 @@ impl RecordTracker {
             });
         // get dut_index
         let dut_index = match self.dut_index_tracker.get( &(file_id, prr_rec.head_num, prr_rec.site_num) ) {
-            Some(stored_ind) => Ok(*stored_ind),
+            Some(&(stored_ind, _)) => Ok(stored_ind),
             // if dut_index is None, returns Err
             None => Err(StdfHelperError { msg: format!("STDF file structure error in File[{}]: PRR Head[{}] Site[{}] showed up before PIR", file_id, prr_rec.head_num, prr_rec.site_num) }),
         }?;
@@ -275,6 +841,99 @@ impl RecordTracker {
         wafer_index
     }
 
+    /// track the part id and die of a DUT, DUTs with the same
+    /// part id or die are superseded if the supersede flag is set in PRR.
+    ///
+    /// Tracked in memory instead of updating Dut_Info in each PRR,
+    /// as `PartID` and `XCOORD`/`YCOORD` are not indexed
+    #[inline(always)]
+    pub fn supersede_detected(
+        &mut self,
+        file_id: usize,
+        dut_index: u64,
+        prr_rec: &PRR,
+        die: Option<(u64, i16, i16)>,
+    ) {
+        let part_flg = prr_rec.part_flg[0];
+        let duts = self
+            .part_id_tracker
+            .entry((file_id, prr_rec.head_num, prr_rec.site_num, prr_rec.part_id.clone()))
+            .or_default();
+        if part_flg & 1u8 == 1u8 {
+            // supersede previous duts with same fid, head, site and part_id
+            self.superseded_duts.extend(
+                duts.drain(..)
+                    .map(|ind| (file_id, prr_rec.head_num, prr_rec.site_num, ind)),
+            );
+        }
+        duts.push(dut_index);
+
+        // NULL wafer index or coordinates never match
+        if let Some((wafer_index, x, y)) = die {
+            let duts = self
+                .die_tracker
+                .entry((file_id, prr_rec.head_num, prr_rec.site_num, wafer_index, x, y))
+                .or_default();
+            if part_flg & 2u8 == 2u8 {
+                // supersede previous duts with same fid, head, site, wafer_index, x and y
+                self.superseded_duts.extend(
+                    duts.drain(..)
+                        .map(|ind| (file_id, prr_rec.head_num, prr_rec.site_num, ind)),
+                );
+            }
+            duts.push(dut_index);
+        }
+    }
+
+    /// keep a PTR result until the PRR of its dut,
+    /// results of unfinished duts are not in statistics
+    #[inline(always)]
+    pub fn ptr_result_detected(
+        &mut self,
+        file_id: usize,
+        head_num: u8,
+        site_num: u8,
+        test_id: usize,
+        result: f32,
+        test_flg: u8,
+    ) {
+        self.pending_results
+            .entry((file_id, head_num, site_num))
+            .or_default()
+            .push((test_id, result, test_flg));
+    }
+
+    /// add PTR results of a finished dut to test statistics, if a test
+    /// is repeated in a dut, only the last result is added, same as PTR_Data
+    #[inline(always)]
+    pub fn dut_results_completed(
+        &mut self,
+        file_id: usize,
+        head_num: u8,
+        site_num: u8,
+        dut_index: u64,
+    ) {
+        let results = match self.pending_results.get_mut(&(file_id, head_num, site_num)) {
+            Some(r) => r,
+            None => return,
+        };
+        if self.last_result_dut.len() < self.id_keys.len() {
+            self.last_result_dut.resize(self.id_keys.len(), 0);
+        }
+        // 0 is reserved for no dut
+        let marker = dut_index + 1;
+        for (test_id, result, test_flg) in results.drain(..).rev() {
+            if self.last_result_dut[test_id] == marker {
+                continue;
+            }
+            self.last_result_dut[test_id] = marker;
+            self.test_stats
+                .entry((file_id, test_id, head_num, site_num))
+                .or_default()
+                .add(result, test_flg);
+        }
+    }
+
     /// return (exist, scale) for [PTR], [MPR]
     #[inline(always)]
     pub fn update_scale(&mut self, test_id: usize, scale: &Option<i8>) -> (bool, i32) {
@@ -304,26 +963,54 @@ impl RecordTracker {
         test_num: u32,
         test_txt: &str,
     ) -> Result<(u64, usize), StdfHelperError> {
-        // get dut_index
-        let dut_index = match self.dut_index_tracker.get( &(file_id, head_num, site_num) ) {
-            Some(stored_ind) => Ok(*stored_ind),
+        // get dut_index and the last test id of this site
+        let (dut_index, last_test_id) = match self.dut_index_tracker.get_mut( &(file_id, head_num, site_num) ) {
+            Some((stored_ind, last_test_id)) => Ok((*stored_ind, last_test_id)),
             // if dut_index is None, returns Err
             None => Err(StdfHelperError { msg: format!("STDF file structure error in File[{}]: TestNumber[{}] Head[{}] Site[{}] showed up before PIR", file_id, test_num, head_num, site_num) }),
         }?;
-        // get test_id
-        let key = match self.id_type {
-            TestIDType::TestNumberAndName => (file_id, test_num, test_txt.to_string()),
-            TestIDType::TestNumberOnly => (file_id, test_num, "".to_string()), // Test Name is not used, use empty string for placeholder
+        let test_name = match self.id_type {
+            TestIDType::TestNumberAndName => test_txt,
+            TestIDType::TestNumberOnly => "", // Test Name is not used, use empty string for placeholder
+        };
+        // fast path: the test after the last one of this site
+        let next_id = last_test_id.wrapping_add(1);
+        let test_id = match self.id_keys.get(next_id) {
+            Some((f, n, name)) if *f == file_id && *n == test_num && name == test_name => next_id,
+            _ => RecordTracker::lookup_test_id(
+                &mut self.id_map,
+                &mut self.id_keys,
+                file_id,
+                test_num,
+                test_name,
+            ),
         };
-        let test_id = match self.id_map.get(&key) {
-            Some(id) => *id,
+        *last_test_id = test_id;
+        Ok((dut_index, test_id))
+    }
+
+    /// return the test id of (file id, test num, test name),
+    /// a new id is assigned if not found.
+    ///
+    /// `test_name` is only copied for a new id
+    #[inline(always)]
+    fn lookup_test_id(
+        id_map: &mut HashMap<(usize, u32), Vec<usize>>,
+        id_keys: &mut Vec<(usize, u32, String)>,
+        file_id: usize,
+        test_num: u32,
+        test_name: &str,
+    ) -> usize {
+        let ids = id_map.entry((file_id, test_num)).or_default();
+        match ids.iter().find(|&&id| id_keys[id].2 == test_name) {
+            Some(&id) => id,
             None => {
-                let unique_id = self.id_map.len();
-                self.id_map.insert(key, unique_id);
+                let unique_id = id_keys.len();
+                id_keys.push((file_id, test_num, test_name.to_string()));
+                ids.push(unique_id);
                 unique_id
             }
-        };
-        Ok((dut_index, test_id))
+        }
     }
 
     /// return `true` if test_id is already in both limit hashmaps
@@ -405,41 +1092,57 @@ impl RecordTracker {
         }
     }
 
+    /// tests of a summary session are registered by TSR,
+    /// since test records are not parsed.
+    ///
+    /// returns the test id and `true` if it is a new test
+    #[inline(always)]
+    pub fn tsr_test_id(&mut self, file_id: usize, tsr_rec: &TSR) -> (usize, bool) {
+        let test_name = match self.id_type {
+            TestIDType::TestNumberAndName => tsr_rec.test_nam.as_str(),
+            TestIDType::TestNumberOnly => "",
+        };
+        let num_ids = self.id_keys.len();
+        let test_id = RecordTracker::lookup_test_id(
+            &mut self.id_map,
+            &mut self.id_keys,
+            file_id,
+            tsr_rec.test_num,
+            test_name,
+        );
+        (test_id, self.id_keys.len() > num_ids)
+    }
+
     #[inline(always)]
     pub fn tsr_detected(&mut self, file_id: usize, tsr_rec: &TSR) -> Result<(), StdfHelperError> {
         // get test_id
-        let key = match self.id_type {
-            TestIDType::TestNumberAndName => (file_id, tsr_rec.test_num, tsr_rec.test_nam.to_string()),
-            TestIDType::TestNumberOnly => (file_id, tsr_rec.test_num, "".to_string()),
+        let test_name = match self.id_type {
+            TestIDType::TestNumberAndName => tsr_rec.test_nam.as_str(),
+            TestIDType::TestNumberOnly => "",
         };
-        let test_id = match self.id_map.get(&key) {
-            Some(id) => Ok(*id),
-            None => {
-                // in some stdf files, the test name in TSR might be different
-                // in PTR/MPR/FTR, in this case, we should find the test id that
-                // file id and test number matched
-                match self
-                    .id_map
-                    .keys()
-                    .find(|&key| key.0 == file_id && key.1 == tsr_rec.test_num)
-                {
-                    Some(key) => {
-                        println!("TSR: [{}\t{}] matches no records in File[{}], use test name [{}] instead", 
-                        tsr_rec.test_num, tsr_rec.test_nam, file_id, &key.2);
-                        // this unwrap is infallible
-                        Ok(*self.id_map.get(key).unwrap())
-                    }
-                    None => {
-                        // if fild id and test number cannot match any key,
-                        // report this error
-                        Err(StdfHelperError {
-                            msg: format!(
-                                "Test number [{}] in TSR matches no records in File[{}]",
-                                tsr_rec.test_num, file_id
-                            ),
-                        })
-                    }
+        let test_id = match self.id_map.get(&(file_id, tsr_rec.test_num)) {
+            Some(ids) => match ids.iter().find(|&&id| self.id_keys[id].2 == test_name) {
+                Some(&id) => Ok(id),
+                None => {
+                    // in some stdf files, the test name in TSR might be different
+                    // in PTR/MPR/FTR, in this case, we should find the test id that
+                    // file id and test number matched.
+                    // ids are never empty
+                    let id = ids[0];
+                    println!("TSR: [{}\t{}] matches no records in File[{}], use test name [{}] instead", 
+                    tsr_rec.test_num, tsr_rec.test_nam, file_id, &self.id_keys[id].2);
+                    Ok(id)
                 }
+            },
+            None => {
+                // if fild id and test number cannot match any key,
+                // report this error
+                Err(StdfHelperError {
+                    msg: format!(
+                        "Test number [{}] in TSR matches no records in File[{}]",
+                        tsr_rec.test_num, file_id
+                    ),
+                })
             }
         }?;
         // update fail cnt hashmap, only when fail cnt is valid
@@ -454,6 +1157,49 @@ impl RecordTracker {
         Ok(())
     }
 
+    /// tracker state that is not in the database,
+    /// saved between polls of a followed file
+    pub fn follow_state(&self, file_id: usize) -> (Option<bool>, Vec<String>, Vec<(u8, u8, u64)>) {
+        (
+            self.datalog_pos_tracker.get(&file_id).copied(),
+            self.program_sections
+                .get(&file_id)
+                .cloned()
+                .unwrap_or_default(),
+            self.sampled_parts(file_id),
+        )
+    }
+
+    pub fn restore_follow_state(
+        &mut self,
+        file_id: usize,
+        is_before_prr: Option<bool>,
+        program_sections: Vec<String>,
+        sampled_parts: Vec<(u8, u8, u64)>,
+    ) {
+        if let Some(b) = is_before_prr {
+            self.datalog_pos_tracker.insert(file_id, b);
+        }
+        if !program_sections.is_empty() {
+            self.program_sections.insert(file_id, program_sections);
+        }
+        self.set_sampled_parts(file_id, sampled_parts);
+    }
+
+    /// (head, site, part count) seen by the sampler in `file_id`
+    pub fn sampled_parts(&self, file_id: usize) -> Vec<(u8, u8, u64)> {
+        self.sampled_parts
+            .get(&file_id)
+            .cloned()
+            .unwrap_or_default()
+    }
+
+    pub fn set_sampled_parts(&mut self, file_id: usize, parts_seen: Vec<(u8, u8, u64)>) {
+        if !parts_seen.is_empty() {
+            self.sampled_parts.insert(file_id, parts_seen);
+        }
+    }
+
     #[inline(always)]
     pub fn get_datalog_relative_pos(&self, file_id: usize) -> (u64, bool) {
         let dut_index = match self.dut_total.get(&file_id) {
@@ -496,6 +1242,10 @@ pub fn process_incoming_record(
 ) -> Result<(), StdfHelperError> {
     // unpack info
     let (file_id, subfile_id, order, _offset, _data_len, rec) = rec_info;
+    // records filtered by test name
+    if rec_tracker.profile.skip_decoded(&rec) {
+        return Ok(());
+    }
     match rec {
         // // rec type 15
         StdfRecord::PTR(ptr_rec) => on_ptr_rec(db_ctx, rec_tracker, file_id, ptr_rec)?,
@@ -518,8 +1268,8 @@ pub fn process_incoming_record(
         StdfRecord::MIR(mir_rec) => on_mir_rec(db_ctx, file_id, subfile_id, mir_rec)?,
         StdfRecord::MRR(mrr_rec) => on_mrr_rec(db_ctx, file_id, subfile_id, mrr_rec)?,
         StdfRecord::PCR(pcr_rec) => on_pcr_rec(db_ctx, file_id, pcr_rec)?,
-        StdfRecord::HBR(hbr_rec) => on_hbr_rec(rec_tracker, file_id, hbr_rec)?,
-        StdfRecord::SBR(sbr_rec) => on_sbr_rec(rec_tracker, file_id, sbr_rec)?,
+        StdfRecord::HBR(hbr_rec) => on_hbr_rec(db_ctx, rec_tracker, file_id, hbr_rec)?,
+        StdfRecord::SBR(sbr_rec) => on_sbr_rec(db_ctx, rec_tracker, file_id, sbr_rec)?,
         StdfRecord::PMR(pmr_rec) => on_pmr_rec(db_ctx, file_id, pmr_rec)?,
         StdfRecord::PGR(pgr_rec) => on_pgr_rec(db_ctx, file_id, pgr_rec)?,
         StdfRecord::PLR(plr_rec) => on_plr_rec(db_ctx, file_id, plr_rec)?,
@@ -554,6 +1304,60 @@ pub fn process_incoming_record(
     Ok(())
 }
 
+/// process a record of a summary session, only records
+/// at the head and the tail of a file are parsed.
+///
+/// Tests are registered by TSR, other records
+/// are the same as `process_incoming_record`
+pub fn process_summary_record(
+    db_ctx: &mut DataBaseCtx,
+    rec_tracker: &mut RecordTracker,
+    rec_info: (usize, usize, ByteOrder, u64, usize, StdfRecord),
+) -> Result<(), StdfHelperError> {
+    let (file_id, subfile_id, order, offset, data_len, rec) = rec_info;
+    match rec {
+        StdfRecord::TSR(tsr_rec) => {
+            let (test_id, is_new) = rec_tracker.tsr_test_id(file_id, &tsr_rec);
+            if is_new {
+                // limits and units are only in test records
+                db_ctx.insert_test_info(rusqlite::params![
+                    file_id,
+                    test_id,
+                    tsr_rec.test_num,
+                    match tsr_rec.test_typ {
+                        'M' => 15,
+                        'F' => 20,
+                        _ => 10,
+                    },
+                    tsr_rec.test_nam,
+                    None::<i8>,
+                    f32::NAN,
+                    f32::NAN,
+                    "",
+                    None::<u8>,
+                    -1,             // fail cnt, updated by `process_summary_data`
+                    None::<u16>,    // RTN_ICNT for FTR & MPR
+                    None::<u16>,    // RSLT or PGM for MPR or FTR
+                    f32::NAN,
+                    f32::NAN,
+                    None::<String>, // VECT_NAM
+                    if tsr_rec.seq_name.is_empty() {
+                        None
+                    } else {
+                        Some(&tsr_rec.seq_name)
+                    },
+                ])?;
+            }
+            on_tsr_rec(rec_tracker, file_id, tsr_rec)
+        }
+        _ => process_incoming_record(
+            db_ctx,
+            rec_tracker,
+            (file_id, subfile_id, order, offset, data_len, rec),
+        ),
+    }
+}
+
 #[inline(always)]
 pub fn process_summary_data(
     db_ctx: &mut DataBaseCtx,
@@ -577,6 +1381,81 @@ pub fn process_summary_data(
             &bin_pf.to_string()
         ])?;
     }
+    // write Supersede flags, a dut can be superseded
+    // by both part id and die
+    let mut superseded: Vec<_> = rec_tracker.superseded_duts.drain(..).collect();
+    superseded.sort_unstable();
+    superseded.dedup();
+    for &(file_id, _, _, dut_index) in superseded.iter() {
+        db_ctx.update_supersede(rusqlite::params![file_id, dut_index])?;
+    }
+    // remove results of superseded duts from test statistics
+    if !superseded.is_empty() {
+        db_ctx.flush_batches()?;
+    }
+    let test_stats = &mut rec_tracker.test_stats;
+    // DUTIndex -> (file id, head, site), a DUTIndex
+    // can be superseded in more than one file
+    let mut superseded_duts: HashMap<u64, Vec<(usize, u8, u8)>> = HashMap::new();
+    for &(file_id, head_num, site_num, dut_index) in superseded.iter() {
+        superseded_duts
+            .entry(dut_index)
+            .or_default()
+            .push((file_id, head_num, site_num));
+    }
+    let mut dut_indexes: Vec<u64> = superseded_duts.keys().copied().collect();
+    dut_indexes.sort_unstable();
+    db_ctx.for_each_ptr_of_duts(&dut_indexes, |dut_index, test_id, result, test_flg| {
+        for &(file_id, head_num, site_num) in superseded_duts[&dut_index].iter() {
+            // NaN is stored as NULL
+            if let Some(stat) = test_stats.get_mut(&(file_id, test_id, head_num, site_num)) {
+                stat.remove(result.unwrap_or(f64::NAN), test_flg);
+            }
+        }
+    })?;
+    // min and max cannot remove a result, if one of them is
+    // removed, rebuild the stat from non-superseded results
+    let mut stale_tests: HashMap<usize, Vec<usize>> = HashMap::new();
+    for (&(file_id, test_id, _, _), stat) in test_stats.iter_mut() {
+        if stat.stale {
+            stat.rebuild_begin();
+            stale_tests.entry(file_id).or_default().push(test_id);
+        }
+    }
+    for (file_id, mut test_ids) in stale_tests {
+        test_ids.sort_unstable();
+        test_ids.dedup();
+        db_ctx.for_each_ptr_of_tests(file_id, &test_ids, |test_id, head_num, site_num, result| {
+            if let Some(stat) = test_stats.get_mut(&(file_id, test_id, head_num, site_num)) {
+                if stat.stale {
+                    stat.rebuild_add(result);
+                }
+            }
+        })?;
+    }
+    for stat in test_stats.values_mut() {
+        stat.stale = false;
+    }
+    // write test statistics
+    for (&(file_id, test_id, head_num, site_num), stat) in test_stats.iter_mut() {
+        let has_value = stat.count > 0;
+        db_ctx.insert_test_stat(rusqlite::params![
+            file_id,
+            test_id,
+            head_num,
+            site_num,
+            stat.count,
+            stat.shift,
+            stat.sum,
+            stat.sum_sq,
+            if has_value { Some(stat.min) } else { None },
+            if has_value { Some(stat.max) } else { None },
+            stat.fail_count,
+            stat.nan_count,
+            stat.inf_count,
+            stat.digest.to_bytes(),
+        ])?;
+    }
     // write TSR
     for (&test_id, &fail_cnt) in rec_tracker.test_fail_count.iter() {
         if let Err(e) = db_ctx.update_fail_count(rusqlite::params![fail_cnt, test_id,]) {
@@ -1155,14 +2034,23 @@ fn on_ptr_rec(
     // The schema to update TestInfo table is set to ignore if exists, so we do not afraid of
     // overwrite existing TestInfo entry.
     let lim_exist = tracker.default_limits_contains_id(test_id);
+    // replace_inf(ptr_rec.result * 10f32.powi(scale)),
+    let result = ptr_rec.result * 10f32.powi(scale);
     // insert ptr result
     db_ctx.insert_ptr_data(rusqlite::params![
         dut_index,
         test_id,
-        // replace_inf(ptr_rec.result * 10f32.powi(scale)),
-        ptr_rec.result * 10f32.powi(scale),
+        result,
         ptr_rec.test_flg[0]
     ])?;
+    tracker.ptr_result_detected(
+        file_id,
+        ptr_rec.head_num,
+        ptr_rec.site_num,
+        test_id,
+        result,
+        ptr_rec.test_flg[0],
+    );
 
     if !exist || !lim_exist {
         // indicates it is the 1st PTR, that we need to save the possible omitted fields
@@ -1245,22 +2133,38 @@ fn on_mpr_rec(
         .iter_mut()
         // .for_each(|x| *x = replace_inf(*x * 10f32.powi(scale)));
         .for_each(|x| *x = *x * 10f32.powi(scale));
-    // serialize result array and stat array using hex
-    let rslt_hex = hex::encode_upper({
-        unsafe {
-            let u8ptr = std::mem::transmute::<*const _, *const u8>(mpr_rec.rtn_rslt.as_ptr());
-            std::slice::from_raw_parts(u8ptr, mpr_rec.rtn_rslt.len() * 4)
-        }
-    });
-    let stat_hex = hex::encode_upper(mpr_rec.rtn_stat);
-    // insert mpr data
-    db_ctx.insert_mpr_data(rusqlite::params![
-        dut_index,
-        test_id,
-        rslt_hex,
-        stat_hex,
-        mpr_rec.test_flg[0]
-    ])?;
+    if db_ctx.mpr_blob() {
+        // store little-endian bytes of result array and stat array as BLOB
+        let rslt_bytes: Vec<u8> = mpr_rec
+            .rtn_rslt
+            .iter()
+            .flat_map(|x| x.to_le_bytes())
+            .collect();
+        db_ctx.insert_mpr_data(rusqlite::params![
+            dut_index,
+            test_id,
+            rslt_bytes,
+            mpr_rec.rtn_stat,
+            mpr_rec.test_flg[0]
+        ])?;
+    } else {
+        // serialize result array and stat array using hex
+        let rslt_hex = hex::encode_upper({
+            unsafe {
+                let u8ptr = std::mem::transmute::<*const _, *const u8>(mpr_rec.rtn_rslt.as_ptr());
+                std::slice::from_raw_parts(u8ptr, mpr_rec.rtn_rslt.len() * 4)
+            }
+        });
+        let stat_hex = hex::encode_upper(&mpr_rec.rtn_stat);
+        // insert mpr data
+        db_ctx.insert_mpr_data(rusqlite::params![
+            dut_index,
+            test_id,
+            rslt_hex,
+            stat_hex,
+            mpr_rec.test_flg[0]
+        ])?;
+    }
 
     if !exist {
         // indicates it is the 1st PTR, that we need to save the possible omitted fields
@@ -1376,7 +2280,6 @@ fn on_prr_rec(
     // get dut_index
     // get wafer_index if WIR is detected
     let (dut_index, wafer_index) = tracker.prr_detected(file_id, &prr_rec)?;
-    let part_flg = prr_rec.part_flg[0];
     let x_coord = match prr_rec.x_coord != -32768 {
         // use NULL to replace -32768
         true => Some(prr_rec.x_coord), // in order to reduce db size
@@ -1387,37 +2290,17 @@ fn on_prr_rec(
         false => None,
     };
 
-    // check if current dut supersedes previous duts
-    // must do it before updating current PRR
-    // otherwise current dut will be marked as superseded as well
-    let supersede_dut = part_flg & 1u8 == 1u8;
-    let supersede_die = part_flg & 2u8 == 2u8;
-    if supersede_dut {
-        // set previous dut with same fid, head, site and part_id as superseded
-        db_ctx.update_supersede_dut(rusqlite::params![
-            file_id,
-            prr_rec.head_num,
-            prr_rec.site_num,
-            prr_rec.part_id,
-        ])?;
-    }
-    if supersede_die {
-        // set previous dut with same fid, head, site, wafer_index, x and y as superseded
-        db_ctx.update_supersede_die(rusqlite::params![
-            file_id,
-            prr_rec.head_num,
-            prr_rec.site_num,
-            wafer_index,
-            x_coord,
-            y_coord
-        ])?;
-    }
+    // check if current dut supersedes previous duts,
+    // flags are written in `process_summary_data`
+    let die = match (wafer_index, x_coord, y_coord) {
+        (Some(wafer_index), Some(x), Some(y)) => Some((wafer_index, x, y)),
+        _ => None,
+    };
+    tracker.dut_results_completed(file_id, prr_rec.head_num, prr_rec.site_num, dut_index);
+    tracker.supersede_detected(file_id, dut_index, &prr_rec, die);
 
-    // update PRR info to database
-    //
-    // `supersede` status may have been
-    // set to 1 by code above, we need
-    // to set it back to 0
+    // update PRR info to database,
+    // current dut is not superseded yet
     db_ctx.update_dut(rusqlite::params![
         prr_rec.num_test,
         prr_rec.test_t,
@@ -1437,24 +2320,41 @@ fn on_prr_rec(
 
 #[inline(always)]
 fn on_hbr_rec(
+    db_ctx: &mut DataBaseCtx,
     tracker: &mut RecordTracker,
     file_id: usize,
     hbr_rec: HBR,
 ) -> Result<(), StdfHelperError> {
-    // we do not update database in HBR
-    // modify hashmap in memory instead
+    // bin counts of the tester are kept as is,
+    // they are the only bin counts of a sampled session
+    db_ctx.insert_bin_cnt(rusqlite::params![
+        file_id,
+        hbr_rec.head_num,
+        hbr_rec.site_num,
+        "H",
+        hbr_rec.hbin_num,
+        hbr_rec.hbin_cnt,
+    ])?;
+    // bin names are updated in hashmap
     tracker.hbr_detected(file_id, &hbr_rec);
     Ok(())
 }
 
 #[inline(always)]
 fn on_sbr_rec(
+    db_ctx: &mut DataBaseCtx,
     tracker: &mut RecordTracker,
     file_id: usize,
     sbr_rec: SBR,
 ) -> Result<(), StdfHelperError> {
-    // we do not update database in SBR
-    // modify hashmap in memory instead
+    db_ctx.insert_bin_cnt(rusqlite::params![
+        file_id,
+        sbr_rec.head_num,
+        sbr_rec.site_num,
+        "S",
+        sbr_rec.sbin_num,
+        sbr_rec.sbin_cnt,
+    ])?;
     tracker.sbr_detected(file_id, &sbr_rec);
     Ok(())
 }
@@ -2080,3 +2980,55 @@ pub fn write_json_to_sheet(
     }
     Ok(())
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::time::Instant;
+
+    /// look up 50k tests per dut in program order and in a reversed
+    /// order, which misses the `last + 1` fast path, run by:
+    ///
+    /// `cargo test --release bench_test_id_lookup -- --ignored --nocapture`
+    #[test]
+    #[ignore]
+    fn bench_test_id_lookup() {
+        const NUM_TESTS: u32 = 50_000;
+        const NUM_DUTS: u32 = 100;
+        const NUM_SITES: u8 = 4;
+        let names: Vec<String> = (0..NUM_TESTS).map(|n| format!("test_{}", n)).collect();
+        let in_order: Vec<u32> = (0..NUM_TESTS).collect();
+        let reversed: Vec<u32> = (0..NUM_TESTS).rev().collect();
+
+        for (label, order) in [("in order", &in_order), ("reversed", &reversed)] {
+            for id_type in [TestIDType::TestNumberAndName, TestIDType::TestNumberOnly] {
+                let mut tracker = RecordTracker::new(id_type);
+                let start = Instant::now();
+                let mut checksum = 0usize;
+                for _ in 0..NUM_DUTS {
+                    for site in 0..NUM_SITES {
+                        tracker.pir_detected(0, 1, site);
+                    }
+                    for site in 0..NUM_SITES {
+                        for &n in order.iter() {
+                            let (_, test_id) = tracker
+                                .xtr_detected(0, 1, site, n, &names[n as usize])
+                                .unwrap();
+                            checksum = checksum.wrapping_add(test_id);
+                        }
+                    }
+                }
+                let lookups = (NUM_DUTS * NUM_SITES as u32 * NUM_TESTS) as f64;
+                let elapsed = start.elapsed().as_secs_f64();
+                assert_eq!(tracker.num_test_ids(), NUM_TESTS as usize);
+                println!(
+                    "{} {:?}: {:.1} ns/lookup (checksum {})",
+                    label,
+                    id_type,
+                    elapsed * 1e9 / lookups,
+                    checksum
+                );
+            }
+        }
+    }
+}
@@ -1,4 +1,5 @@
-//! This module contains functions for pp qq plot.
+//! This module contains functions for pp qq plot,
+//! and the statistics of test results collected during ingest.
 //!
 //! Functions are imported from `scipy` repo, see link below:
 //! https://github.com/scipy/scipy/blob/main/scipy/special/cephes/polevl.h;
@@ -12,12 +13,14 @@
 // Author: noonchen - chennoon233@foxmail.com
 // Created Date: December 21st 2022
 // -----
-// Last Modified: Thu Sep 11 2025
+// Last Modified: Sun Oct 18 2026
 // Modified By: noonchen
 // -----
 // Copyright (c) 2022 noonchen
 //
 
+use std::f64::consts::{FRAC_PI_2, PI};
+
 //
 // functions from polevl.h
 //
@@ -356,3 +359,270 @@ pub fn ndtri(y0: f64) -> f64 {
     }
     x
 }
+
+//
+// statistics of test results
+//
+
+/// compression of `TDigest`, larger is more accurate and uses more memory
+const DIGEST_COMPRESSION: f64 = 100.0;
+/// results are buffered and merged into centroids in batch
+const DIGEST_BUFFER_SIZE: usize = 128;
+
+/// merging t-digest with k1 scale function, see
+/// "Computing Extremely Accurate Quantiles Using t-Digests", Dunning & Ertl.
+///
+/// Centroids of different (head, site) are merged in python
+/// on demand, quantiles are interpolated from the merged centroids.
+#[derive(Debug, Clone, Default)]
+pub struct TDigest {
+    // (mean, weight) sorted by mean
+    centroids: Vec<(f64, f64)>,
+    total_weight: f64,
+    buffer: Vec<f32>,
+}
+
+impl TDigest {
+    #[inline(always)]
+    fn k_scale(q: f64) -> f64 {
+        DIGEST_COMPRESSION / (2.0 * PI) * (2.0 * q - 1.0).asin()
+    }
+
+    #[inline(always)]
+    fn k_scale_inv(k: f64) -> f64 {
+        let x = (k * 2.0 * PI / DIGEST_COMPRESSION).min(FRAC_PI_2);
+        (x.sin() + 1.0) / 2.0
+    }
+
+    #[inline(always)]
+    pub fn add(&mut self, value: f32) {
+        self.buffer.push(value);
+        if self.buffer.len() >= DIGEST_BUFFER_SIZE {
+            self.compress();
+        }
+    }
+
+    /// remove a value that was added before from the nearest
+    /// centroid, the sum of the centroid is kept exact
+    pub fn remove(&mut self, value: f32) {
+        if let Some(i) = self.buffer.iter().position(|&v| v == value) {
+            self.buffer.swap_remove(i);
+            return;
+        }
+        let value = value as f64;
+        let Some(i) = (0..self.centroids.len()).min_by(|&a, &b| {
+            (self.centroids[a].0 - value)
+                .abs()
+                .total_cmp(&(self.centroids[b].0 - value).abs())
+        }) else {
+            return;
+        };
+        let (mean, weight) = self.centroids[i];
+        self.total_weight -= 1.0;
+        if weight <= 1.0 {
+            self.centroids.remove(i);
+            return;
+        }
+        // keep centroids sorted by mean
+        let lo = if i > 0 { self.centroids[i - 1].0 } else { f64::NEG_INFINITY };
+        let hi = self.centroids.get(i + 1).map_or(f64::INFINITY, |c| c.0);
+        self.centroids[i] = (((mean * weight - value) / (weight - 1.0)).clamp(lo, hi), weight - 1.0);
+    }
+
+    /// merge buffered results into centroids
+    pub fn compress(&mut self) {
+        if self.buffer.is_empty() {
+            return;
+        }
+        self.buffer.sort_unstable_by(|a, b| a.total_cmp(b));
+        let total = self.total_weight + self.buffer.len() as f64;
+
+        let mut merged = Vec::with_capacity(self.centroids.len() + self.buffer.len());
+        let (mut i, mut j) = (0, 0);
+        while i < self.buffer.len() || j < self.centroids.len() {
+            if j == self.centroids.len()
+                || (i < self.buffer.len() && (self.buffer[i] as f64) < self.centroids[j].0)
+            {
+                merged.push((self.buffer[i] as f64, 1.0));
+                i += 1;
+            } else {
+                merged.push(self.centroids[j]);
+                j += 1;
+            }
+        }
+
+        // a centroid spans at most 1 in k scale
+        let mut compressed = Vec::with_capacity(DIGEST_COMPRESSION as usize);
+        let mut current = merged[0];
+        let mut weight_so_far = 0.0;
+        let mut weight_limit = total * TDigest::k_scale_inv(TDigest::k_scale(0.0) + 1.0);
+        for &(mean, weight) in merged[1..].iter() {
+            if weight_so_far + current.1 + weight <= weight_limit {
+                current.1 += weight;
+                current.0 += (mean - current.0) * weight / current.1;
+            } else {
+                weight_so_far += current.1;
+                compressed.push(current);
+                weight_limit = total
+                    * TDigest::k_scale_inv(TDigest::k_scale(weight_so_far / total) + 1.0);
+                current = (mean, weight);
+            }
+        }
+        compressed.push(current);
+
+        self.centroids = compressed;
+        self.total_weight = total;
+        self.buffer.clear();
+    }
+
+    /// little-endian f64 (mean, weight) pairs
+    pub fn to_bytes(&mut self) -> Vec<u8> {
+        self.compress();
+        self.centroids
+            .iter()
+            .flat_map(|&(mean, weight)| mean.to_le_bytes().into_iter().chain(weight.to_le_bytes()))
+            .collect()
+    }
+
+    pub fn from_bytes(bytes: &[u8]) -> Self {
+        let centroids: Vec<(f64, f64)> = bytes
+            .chunks_exact(16)
+            .map(|c| {
+                // infallible, chunk size is 16
+                let mean = f64::from_le_bytes(c[..8].try_into().unwrap());
+                let weight = f64::from_le_bytes(c[8..].try_into().unwrap());
+                (mean, weight)
+            })
+            .collect();
+        let total_weight = centroids.iter().map(|c| c.1).sum();
+        TDigest {
+            centroids,
+            total_weight,
+            buffer: Vec::new(),
+        }
+    }
+}
+
+/// mergeable statistics of PTR results of a test in a (head, site).
+///
+/// Sums are of `result - shift`, `shift` is the first finite result,
+/// it keeps the variance precise if mean is far larger than sdev.
+/// NaN and Inf results are only counted.
+#[derive(Debug, Clone)]
+pub struct TestStat {
+    pub count: u64,
+    pub shift: f64,
+    pub sum: f64,
+    pub sum_sq: f64,
+    pub min: f64,
+    pub max: f64,
+    pub fail_count: u64,
+    pub nan_count: u64,
+    pub inf_count: u64,
+    pub digest: TDigest,
+    // min or max is removed, min, max and digest
+    // need to be rebuilt from database
+    pub stale: bool,
+}
+
+impl Default for TestStat {
+    fn default() -> Self {
+        TestStat {
+            count: 0,
+            shift: 0.0,
+            sum: 0.0,
+            sum_sq: 0.0,
+            min: f64::INFINITY,
+            max: f64::NEG_INFINITY,
+            fail_count: 0,
+            nan_count: 0,
+            inf_count: 0,
+            digest: TDigest::default(),
+            stale: false,
+        }
+    }
+}
+
+impl TestStat {
+    /// same as `isPass` in python
+    #[inline(always)]
+    fn is_fail(test_flg: u8) -> bool {
+        test_flg & 0xC0 == 0x80
+    }
+
+    #[inline(always)]
+    pub fn add(&mut self, result: f32, test_flg: u8) {
+        if TestStat::is_fail(test_flg) {
+            self.fail_count += 1;
+        }
+        if result.is_nan() {
+            self.nan_count += 1;
+            return;
+        }
+        if result.is_infinite() {
+            self.inf_count += 1;
+            return;
+        }
+        let value = result as f64;
+        if self.count == 0 {
+            self.shift = value;
+        }
+        let d = value - self.shift;
+        self.count += 1;
+        self.sum += d;
+        self.sum_sq += d * d;
+        self.min = self.min.min(value);
+        self.max = self.max.max(value);
+        self.digest.add(result);
+    }
+
+    /// remove a result that was added before, e.g. of a superseded DUT
+    pub fn remove(&mut self, result: f64, test_flg: u8) {
+        if TestStat::is_fail(test_flg) {
+            self.fail_count = self.fail_count.saturating_sub(1);
+        }
+        if result.is_nan() {
+            self.nan_count = self.nan_count.saturating_sub(1);
+            return;
+        }
+        if result.is_infinite() {
+            self.inf_count = self.inf_count.saturating_sub(1);
+            return;
+        }
+        self.count = self.count.saturating_sub(1);
+        if self.count == 0 {
+            let (fail_count, nan_count, inf_count) =
+                (self.fail_count, self.nan_count, self.inf_count);
+            *self = TestStat {
+                fail_count,
+                nan_count,
+                inf_count,
+                ..Default::default()
+            };
+            return;
+        }
+        let d = result - self.shift;
+        self.sum -= d;
+        self.sum_sq -= d * d;
+        self.digest.remove(result as f32);
+        // other results are unknown, the new min or max must be read
+        if result <= self.min || result >= self.max {
+            self.stale = true;
+        }
+    }
+
+    /// clear min, max and digest before they are rebuilt by `rebuild_add`
+    pub fn rebuild_begin(&mut self) {
+        self.min = f64::INFINITY;
+        self.max = f64::NEG_INFINITY;
+        self.digest = TDigest::default();
+    }
+
+    /// add a finite result to min, max and digest only
+    #[inline(always)]
+    pub fn rebuild_add(&mut self, result: f64) {
+        self.min = self.min.min(result);
+        self.max = self.max.max(result);
+        self.digest.add(result as f32);
+    }
+}
@@ -143,7 +143,7 @@ class Ui_Setting(object):
         self.symbol_groupBox.setObjectName("symbol_groupBox")
         self.gridLayout_file_symbol = QtWidgets.QGridLayout(self.symbol_groupBox)
         self.gridLayout_file_symbol.setObjectName("gridLayout_file_symbol")
-        self.gridLayout.addWidget(self.symbol_groupBox, 5, 0, 1, 4)
+        self.gridLayout.addWidget(self.symbol_groupBox, 6, 0, 1, 4)
         self.label_6 = QtWidgets.QLabel(self.scrollAreaWidgetContents_3)
         self.label_6.setObjectName("label_6")
         self.gridLayout.addWidget(self.label_6, 3, 0, 1, 1)
@@ -173,7 +173,7 @@ class Ui_Setting(object):
         self.label_lang.setObjectName("label_lang")
         self.gridLayout.addWidget(self.label_lang, 0, 0, 1, 1)
         spacerItem = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
-        self.gridLayout.addItem(spacerItem, 6, 0, 1, 1)
+        self.gridLayout.addItem(spacerItem, 7, 0, 1, 1)
         self.label_3 = QtWidgets.QLabel(self.scrollAreaWidgetContents_3)
         self.label_3.setObjectName("label_3")
         self.gridLayout.addWidget(self.label_3, 1, 0, 1, 1)
@@ -261,6 +261,54 @@ class Ui_Setting(object):
         self.testIDTypecomboBox.addItem("")
         self.testIDTypecomboBox.addItem("")
         self.gridLayout.addWidget(self.testIDTypecomboBox, 4, 3, 1, 1)
+        self.ingest_groupBox = QtWidgets.QGroupBox(self.scrollAreaWidgetContents_3)
+        self.ingest_groupBox.setObjectName("ingest_groupBox")
+        self.gridLayout_ingest = QtWidgets.QGridLayout(self.ingest_groupBox)
+        self.gridLayout_ingest.setHorizontalSpacing(15)
+        self.gridLayout_ingest.setObjectName("gridLayout_ingest")
+        self.skipFTR_ingest = QtWidgets.QCheckBox(self.ingest_groupBox)
+        self.skipFTR_ingest.setObjectName("skipFTR_ingest")
+        self.gridLayout_ingest.addWidget(self.skipFTR_ingest, 0, 0, 1, 1)
+        self.skipMPR_ingest = QtWidgets.QCheckBox(self.ingest_groupBox)
+        self.skipMPR_ingest.setObjectName("skipMPR_ingest")
+        self.gridLayout_ingest.addWidget(self.skipMPR_ingest, 0, 1, 1, 1)
+        self.skipDatalog_ingest = QtWidgets.QCheckBox(self.ingest_groupBox)
+        self.skipDatalog_ingest.setObjectName("skipDatalog_ingest")
+        self.gridLayout_ingest.addWidget(self.skipDatalog_ingest, 0, 2, 1, 1)
+        self.skipPinMap_ingest = QtWidgets.QCheckBox(self.ingest_groupBox)
+        self.skipPinMap_ingest.setObjectName("skipPinMap_ingest")
+        self.gridLayout_ingest.addWidget(self.skipPinMap_ingest, 0, 3, 1, 1)
+        self.label_includeTests = QtWidgets.QLabel(self.ingest_groupBox)
+        self.label_includeTests.setObjectName("label_includeTests")
+        self.gridLayout_ingest.addWidget(self.label_includeTests, 1, 0, 1, 1)
+        self.lineEdit_includeTests = QtWidgets.QLineEdit(self.ingest_groupBox)
+        self.lineEdit_includeTests.setObjectName("lineEdit_includeTests")
+        self.gridLayout_ingest.addWidget(self.lineEdit_includeTests, 1, 1, 1, 1)
+        self.label_excludeTests = QtWidgets.QLabel(self.ingest_groupBox)
+        self.label_excludeTests.setObjectName("label_excludeTests")
+        self.gridLayout_ingest.addWidget(self.label_excludeTests, 1, 2, 1, 1)
+        self.lineEdit_excludeTests = QtWidgets.QLineEdit(self.ingest_groupBox)
+        self.lineEdit_excludeTests.setObjectName("lineEdit_excludeTests")
+        self.gridLayout_ingest.addWidget(self.lineEdit_excludeTests, 1, 3, 1, 1)
+        self.label_includeNames = QtWidgets.QLabel(self.ingest_groupBox)
+        self.label_includeNames.setObjectName("label_includeNames")
+        self.gridLayout_ingest.addWidget(self.label_includeNames, 2, 0, 1, 1)
+        self.lineEdit_includeNames = QtWidgets.QLineEdit(self.ingest_groupBox)
+        self.lineEdit_includeNames.setObjectName("lineEdit_includeNames")
+        self.gridLayout_ingest.addWidget(self.lineEdit_includeNames, 2, 1, 1, 1)
+        self.label_excludeNames = QtWidgets.QLabel(self.ingest_groupBox)
+        self.label_excludeNames.setObjectName("label_excludeNames")
+        self.gridLayout_ingest.addWidget(self.label_excludeNames, 2, 2, 1, 1)
+        self.lineEdit_excludeNames = QtWidgets.QLineEdit(self.ingest_groupBox)
+        self.lineEdit_excludeNames.setObjectName("lineEdit_excludeNames")
+        self.gridLayout_ingest.addWidget(self.lineEdit_excludeNames, 2, 3, 1, 1)
+        self.label_sites = QtWidgets.QLabel(self.ingest_groupBox)
+        self.label_sites.setObjectName("label_sites")
+        self.gridLayout_ingest.addWidget(self.label_sites, 3, 0, 1, 1)
+        self.lineEdit_sites = QtWidgets.QLineEdit(self.ingest_groupBox)
+        self.lineEdit_sites.setObjectName("lineEdit_sites")
+        self.gridLayout_ingest.addWidget(self.lineEdit_sites, 3, 1, 1, 1)
+        self.gridLayout.addWidget(self.ingest_groupBox, 5, 0, 1, 4)
         self.tablescrollArea.setWidget(self.scrollAreaWidgetContents_3)
         self.verticalLayout_3.addWidget(self.tablescrollArea)
         self.stackedWidget.addWidget(self.General)
@@ -564,6 +612,20 @@ class Ui_Setting(object):
         self.label_11.setText(_translate("Setting", "Test Identifier:"))
         self.testIDTypecomboBox.setItemText(0, _translate("Setting", "Number + Name"))
         self.testIDTypecomboBox.setItemText(1, _translate("Setting", "Number Only"))
+        self.ingest_groupBox.setTitle(_translate("Setting", "Ingest Profile (applies to next load)"))
+        self.skipFTR_ingest.setText(_translate("Setting", "Skip FTR"))
+        self.skipMPR_ingest.setText(_translate("Setting", "Skip MPR"))
+        self.skipDatalog_ingest.setText(_translate("Setting", "Skip DTR/GDR"))
+        self.skipPinMap_ingest.setText(_translate("Setting", "Skip Pin Map"))
+        self.label_includeTests.setText(_translate("Setting", "Include Tests:"))
+        self.lineEdit_includeTests.setPlaceholderText(_translate("Setting", "e.g. 1000-1999, 3000"))
+        self.label_excludeTests.setText(_translate("Setting", "Exclude Tests:"))
+        self.label_includeNames.setText(_translate("Setting", "Include Names:"))
+        self.lineEdit_includeNames.setPlaceholderText(_translate("Setting", "Regex"))
+        self.label_excludeNames.setText(_translate("Setting", "Exclude Names:"))
+        self.lineEdit_excludeNames.setPlaceholderText(_translate("Setting", "Regex"))
+        self.label_sites.setText(_translate("Setting", "Sites:"))
+        self.lineEdit_sites.setPlaceholderText(_translate("Setting", "All sites, e.g. 0-3, 5"))
         self.showMedian_trend.setText(_translate("Setting", "Show Median Line"))
         self.showHL_trend.setText(_translate("Setting", "Show Upper Limit"))
         self.showHSpec_trend.setText(_translate("Setting", "Show High Spec"))
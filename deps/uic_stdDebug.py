@@ -187,6 +187,7 @@ class RecordAnalyzerWrapper(QtCore.QObject):
     @Slot()
     def analyzeBegin(self):
         try:
+            rust_stdf_helper.set_mmap_reader(getSetting().gen.mmap_reader)
             rust_stdf_helper.analyzeSTDF(self.stdPath, self.resultSignal, self.progressSignal, self.flag)
             if self.flag.stop:
                 # user terminated
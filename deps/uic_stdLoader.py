@@ -4,7 +4,7 @@
 # Author: noonchen - chennoon233@foxmail.com
 # Created Date: August 11th 2020
 # -----
-# Last Modified: Sun Sep 21 2025
+# Last Modified: Sun Oct 18 2026
 # Modified By: noonchen
 # -----
 # Copyright (c) 2020 noonchen
@@ -40,7 +40,9 @@ from .ui.stdfViewer_loadingUI import Ui_loadingUI
 
 import rust_stdf_helper
 from deps.DataInterface import DataInterface
-from deps.SharedSrc import getSetting
+from deps.SharedSrc import getSetting, IngestProfileConfig, writeSessionSettings, readSessionSettings
+from deps.SessionCache import getCacheKey, getPartialPath, getCachePath, lookupCache, stampCacheVersion, removeCacheEntry
+from deps.ColumnarStore import getStorePath, removeStore
 
 
 logger = logging.getLogger("STDF Viewer")
@@ -49,16 +51,32 @@ class flags:
     stop = False
 
 
+def logInsertStats():
+    '''Write speed of the batched tables since the last parse'''
+    for table, rows, speed in rust_stdf_helper.take_insert_stats():
+        logger.debug(f"{table}: {rows} rows, {speed:.0f} rows/sec")
+
+
 class signal4Loader(QtCore.QObject):
     # get progress from reader
     progressBarSignal = Signal(int)
     # get `DataInterface` from reader
     dataInterfaceSignal_reader = Signal(object)
+    # get appended file id from reader
+    dataAppendedSignal_reader = Signal(int)
+    # get `DataInterface` of summary records from reader
+    summaryReadySignal_reader = Signal(object)
+    # get number of committed snapshots from reader
+    snapshotSignal_reader = Signal(int)
     # get close signal
     closeSignal = Signal(bool)
     
     # object signal from parent
     dataInterfaceSignal_parent = None
+    # file id signal from parent
+    dataAppendedSignal_parent = None
+    # snapshot refresh signal from parent
+    dataSnapshotSignal_parent = None
     # status bar signal from parent
     msgSignal = None
 
@@ -76,21 +94,37 @@ class stdfLoader(QtWidgets.QDialog):
         self.translator = QTranslator(self)
         self.closeEventByThread = False    # used to determine the source of close event
         self.genIdx = False
+        # loader is hidden after summary records are sent,
+        # the rest of the files is parsed in background
+        self.backgroundLoading = False
+        # the first snapshot of progressive loading is sent as a new session
+        self.snapshotShown = False
         
         self.signals = signal4Loader()
         self.signals.progressBarSignal.connect(self.updateProgressBar)
         self.signals.dataInterfaceSignal_reader.connect(self.sendDataInterface)
+        self.signals.dataAppendedSignal_reader.connect(self.sendAppendedFid)
+        self.signals.summaryReadySignal_reader.connect(self.sendSummary)
+        self.signals.snapshotSignal_reader.connect(self.sendSnapshot)
         self.signals.closeSignal.connect(self.closeLoader)
         
         self.signals.dataInterfaceSignal_parent = getattr(parentSignal, "dataInterfaceSignal", None)
+        self.signals.dataAppendedSignal_parent = getattr(parentSignal, "dataAppendedSignal", None)
+        self.signals.dataSnapshotSignal_parent = getattr(parentSignal, "snapshotSignal", None)
         self.signals.msgSignal = getattr(parentSignal, "statusSignal", None)
         
         self.loaderUI = Ui_loadingUI()
         self.loaderUI.setupUi(self)
         self.loaderUI.progressBar.setMaximum(10000)     # 100 (default max value) * 10^precision
         
-    def loadFile(self, stdPaths: list[list[str]]):
+    def loadFile(self, stdPaths: list[list[str]], sampled: bool = False):
+        '''
+        Parse `stdPaths` into a new session, only a 
+        sample of parts is kept if `sampled` is True
+        '''
+        if self.isBusy(): return
         self.closeEventByThread = False    # init at new file
+        self.snapshotShown = False
         self.loaderUI.progressBar.setFormat("0.00%%")
         self.loaderUI.progressBar.setValue(0)
         # create new thread and move stdReader to the new thread
@@ -103,6 +137,14 @@ class stdfLoader(QtWidgets.QDialog):
         if setting.gen.id_type in TestIDTypeDict:
             self.reader.setIDType(TestIDTypeDict[setting.gen.id_type])
         self.genIdx = self.reader.genIdx = setting.gen.gen_db_idx
+        self.reader.useCache = setting.gen.cache_size > 0
+        self.reader.mprBlob = setting.gen.mpr_blob
+        self.reader.ingest = setting.ingest
+        self.reader.sampled = sampled
+        self.reader.summaryFirstSize = setting.gen.summary_first * 2**20
+        self.reader.progressive = setting.gen.progressive
+        self.reader.columnarStore = setting.gen.columnar_store
+        rust_stdf_helper.set_mmap_reader(setting.gen.mmap_reader)
         
         # self.reader.readBegin()
         self.reader.moveToThread(self.thread)
@@ -111,6 +153,73 @@ class stdfLoader(QtWidgets.QDialog):
         # blocking parent if it's not finished
         self.exec_()
     
+    def followFile(self, stdPath: str):
+        '''
+        Open a STDF file that is still being written, 
+        only complete parts are loaded
+        '''
+        if self.isBusy(): return
+        self.closeEventByThread = False
+        self.loaderUI.progressBar.setFormat("0.00%%")
+        self.loaderUI.progressBar.setValue(0)
+        self.thread = QtCore.QThread(parent=self)
+        self.reader = stdReader(self.signals)
+        self.reader.followThis(stdPath)
+        
+        setting = getSetting()
+        if setting.gen.id_type in TestIDTypeDict:
+            self.reader.setIDType(TestIDTypeDict[setting.gen.id_type])
+        self.genIdx = False
+        self.reader.mprBlob = setting.gen.mpr_blob
+        self.reader.ingest = setting.ingest
+        
+        self.reader.moveToThread(self.thread)
+        self.thread.started.connect(self.reader.followBegin)
+        self.thread.start()
+        self.exec_()
+    
+    def appendFile(self, dbPath: str, stdPaths: list[str], fileId: int | None):
+        '''
+        Append `stdPaths` to the opened database, as a new file 
+        if `fileId` is None, otherwise merged into `fileId`
+        '''
+        if self.isBusy(): return
+        self.closeEventByThread = False
+        self.loaderUI.progressBar.setFormat("0.00%%")
+        self.loaderUI.progressBar.setValue(0)
+        self.thread = QtCore.QThread(parent=self)
+        self.reader = stdReader(self.signals)
+        self.reader.appendThis(dbPath, stdPaths, fileId)
+        
+        setting = getSetting()
+        if setting.gen.id_type in TestIDTypeDict:
+            self.reader.setIDType(TestIDTypeDict[setting.gen.id_type])
+        self.genIdx = False
+        self.reader.mprBlob = setting.gen.mpr_blob
+        self.reader.ingest = setting.ingest
+        rust_stdf_helper.set_mmap_reader(setting.gen.mmap_reader)
+        
+        self.reader.moveToThread(self.thread)
+        self.thread.started.connect(self.reader.appendBegin)
+        self.thread.start()
+        self.exec_()
+    
+    def isBusy(self) -> bool:
+        '''
+        `True` if files are still being parsed in background, 
+        a new request is rejected with a warning
+        '''
+        if self.backgroundLoading and self.signals.msgSignal:
+            self.signals.msgSignal.emit(self.tr("Please wait until all parts are loaded"), False, True, False)
+        return self.backgroundLoading
+    
+    def stopBackgroundLoading(self):
+        if self.backgroundLoading:
+            self.reader.flag.stop = True
+            self.thread.quit()
+            self.thread.wait()
+            self.backgroundLoading = False
+    
     def closeEvent(self, event):
         if self.closeEventByThread:
             # close by thread
@@ -133,6 +242,11 @@ class stdfLoader(QtWidgets.QDialog):
 
     @Slot(int)
     def updateProgressBar(self, num):
+        if self.backgroundLoading:
+            # loader is hidden, show progress in status bar
+            if self.signals.msgSignal and num < 10000:
+                self.signals.msgSignal.emit(self.tr("Loading all parts in background: {0:.2f}%").format(num/100), False, False, False)
+            return
         if num == 10000:
             completeMsg = "Creating index for fast query" if self.genIdx else "Loading database..."
             self.loaderUI.progressBar.setFormat(completeMsg)
@@ -147,6 +261,34 @@ class stdfLoader(QtWidgets.QDialog):
         # send `DataInterface` from reader to mainUI
         self.signals.dataInterfaceSignal_parent.emit(di)
     
+    @Slot(object)
+    def sendSummary(self, di: object):
+        # show summary records, hiding the loader
+        # ends `exec_` but not the reader thread
+        self.backgroundLoading = True
+        self.signals.dataInterfaceSignal_parent.emit(di)
+        self.hide()
+    
+    @Slot(int)
+    def sendSnapshot(self, count: int):
+        # the first snapshot is opened as a new session, 
+        # the following ones refresh the opened session
+        if self.reader is None:
+            return
+        if not self.snapshotShown:
+            self.snapshotShown = True
+            self.backgroundLoading = True
+            di = DataInterface()
+            di.dbPath = self.reader.progressivePath
+            self.signals.dataInterfaceSignal_parent.emit(di)
+            self.hide()
+        elif self.signals.dataSnapshotSignal_parent:
+            self.signals.dataSnapshotSignal_parent.emit()
+    
+    @Slot(int)
+    def sendAppendedFid(self, fid: int):
+        self.signals.dataAppendedSignal_parent.emit(fid)
+    
     @Slot(bool)
     def closeLoader(self, closeUI):
         self.closeEventByThread = closeUI
@@ -154,6 +296,7 @@ class stdfLoader(QtWidgets.QDialog):
             self.thread.quit()
             self.thread.wait()
             self.reader = None
+            self.backgroundLoading = False
             self.close()
         
         
@@ -170,14 +313,38 @@ class stdReader(QtCore.QObject):
         self.progressBarSignal = self.QSignals.progressBarSignal
         self.closeSignal = self.QSignals.closeSignal
         self.dataInterfaceSignal = self.QSignals.dataInterfaceSignal_reader
+        self.dataAppendedSignal = self.QSignals.dataAppendedSignal_reader
+        self.summaryReadySignal = self.QSignals.summaryReadySignal_reader
+        self.snapshotSignal = self.QSignals.snapshotSignal_reader
         self.msgSignal = self.QSignals.msgSignal
         self.flag = flags()     # used for stopping parser
         self.idType = rust_stdf_helper.TestIDType.TestNumberAndName
         self.genIdx = False
+        self.useCache = False
+        self.mprBlob = False
+        # records, tests and sites to keep at parse time
+        self.ingest = IngestProfileConfig()
+        # quick look, keep a sample of parts
+        self.sampled = False
+        # summary records are sent first if files are larger than this
+        self.summaryFirstSize = 0
+        # committed parts can be read while parsing
+        self.progressive = False
+        self.progressivePath = ""
+        # PTR data is also written per test for faster reads
+        self.columnarStore = False
         
     def readThis(self, stdPaths: list[list[str]]):
         self.stdPaths = stdPaths
         
+    def followThis(self, stdPath: str):
+        self.followPath = stdPath
+        
+    def appendThis(self, dbPath: str, stdPaths: list[str], fileId: int | None):
+        self.dbPath = dbPath
+        self.appendPaths = stdPaths
+        self.appendFid = fileId
+        
     def setIDType(self, idType):
         self.idType = idType
         
@@ -187,25 +354,63 @@ class stdReader(QtCore.QObject):
         sendDI = True
         showWarning = False
         finalMsg = ""
+        cacheKey = ""
 
         try:
             if self.msgSignal: self.msgSignal.emit("Loading STD file...", False, False, False)
             start = time.time()
-            # auto generate a database name
-            databasePath = os.path.join(sys.rootFolder, "logs", f"{uuid.uuid4().hex}.db")
-            rust_stdf_helper.generate_database(databasePath, self.stdPaths, self.idType, self.genIdx, self.progressBarSignal, self.flag)
-            end = time.time()
-            if self.flag.stop:
-                # user terminated...
-                sendDI = False
-                finalMsg = "Loading cancelled by user"
+            profile = self.ingest.get_profile(self.sampled)
+            cacheKey = getCacheKey(self.stdPaths, self.idType, self.genIdx, self.mprBlob, profile) if self.useCache else ""
+            cachedPath = lookupCache(cacheKey) if cacheKey else None
+            if cachedPath:
+                # same files have been parsed before
+                self.progressBarSignal.emit(10000)
+                di.dbPath = cachedPath
+                finalMsg = f"Load completed from cache, process time {time.time() - start :.3f} sec"
             else:
-                # send Data_interface object
-                # sqlite cannot be used between thread
-                # thus we need to store the db path and
-                # load database in the main thread
-                di.dbPath = databasePath
-                finalMsg = f"Load completed, process time {end - start :.3f} sec"
+                # cached session is written to a partial file first, 
+                # otherwise auto generate a database name.
+                # progressive session is opened while being written, 
+                # it cannot be renamed into the cache
+                publish = bool(cacheKey) and not self.progressive
+                databasePath = getPartialPath(cacheKey) if publish else os.path.join(sys.rootFolder, "logs", f"{uuid.uuid4().hex}.db")
+                self.progressivePath = databasePath
+                if (not self.sampled and self.summaryFirstSize > 0 and 
+                    sum(os.path.getsize(p) for group in self.stdPaths for p in group) >= self.summaryFirstSize):
+                    self.sendSummary()
+                # multiple file groups are written to shard databases
+                # in parallel and merged, instead of a single writer
+                rust_stdf_helper.generate_database(databasePath, self.stdPaths, self.idType, self.genIdx, self.progressBarSignal, self.flag, 
+                                                   sharded=len(self.stdPaths) > 1 and not self.progressive, mpr_blob=self.mprBlob, 
+                                                   profile=profile, 
+                                                   snapshot_signal=self.snapshotSignal if self.progressive else None)
+                end = time.time()
+                logInsertStats()
+                if self.flag.stop:
+                    # user terminated...
+                    sendDI = False
+                    finalMsg = "Loading cancelled by user"
+                    if publish:
+                        removeCacheEntry(databasePath)
+                else:
+                    # appended files are parsed with the same settings
+                    writeSessionSettings(databasePath, self.idType, profile)
+                    if publish:
+                        # session is complete, publish to cache
+                        stampCacheVersion(databasePath)
+                        os.replace(databasePath, getCachePath(cacheKey))
+                        databasePath = getCachePath(cacheKey)
+                    # send Data_interface object
+                    # sqlite cannot be used between thread
+                    # thus we need to store the db path and
+                    # load database in the main thread
+                    di.dbPath = databasePath
+                    finalMsg = f"Load completed, process time {end - start :.3f} sec"
+            
+            # store of a cached session is written once, progressive
+            # session is still being written after it's opened
+            if sendDI and self.columnarStore and not self.progressive and not os.path.isfile(getStorePath(di.dbPath)):
+                self.writeColumnarStore(di.dbPath)
                 
         except Exception as e:
             # set stop flag to True to stop rust process
@@ -213,6 +418,8 @@ class stdReader(QtCore.QObject):
             self.flag.stop = True
             # clean data interface
             di.close()
+            if cacheKey:
+                removeCacheEntry(getPartialPath(cacheKey))
             logger.exception("\nError occurred when parsing the file")
             sendDI = False
             showWarning = True
@@ -223,3 +430,161 @@ class stdReader(QtCore.QObject):
         self.closeSignal.emit(True)     # close loaderUI
         
 
+
+    def writeColumnarStore(self, dbPath: str):
+        '''
+        Write PTR data of `dbPath` per test, the
+        session is read from the database if it fails
+        '''
+        if self.msgSignal: self.msgSignal.emit("Writing columnar test store...", False, False, False)
+        try:
+            rust_stdf_helper.generate_columnar_store(dbPath, getStorePath(dbPath))
+        except Exception:
+            logger.exception("\nError occurred when writing columnar test store")
+    
+    def sendSummary(self):
+        '''
+        Send a session of the summary records at the file head 
+        and tail before parsing all parts, nothing is sent if 
+        the files are not supported, e.g. compressed
+        '''
+        summaryPath = os.path.join(sys.rootFolder, "logs", f"{uuid.uuid4().hex}.db")
+        try:
+            ready = rust_stdf_helper.generate_summary_database(summaryPath, self.stdPaths, self.idType)
+        except Exception:
+            logger.exception("\nError occurred when reading summary records")
+            ready = False
+        if ready:
+            summaryDI = DataInterface()
+            summaryDI.dbPath = summaryPath
+            self.summaryReadySignal.emit(summaryDI)
+            if self.msgSignal: self.msgSignal.emit("Summary records loaded, loading all parts in background...", False, False, False)
+        elif os.path.isfile(summaryPath):
+            os.remove(summaryPath)
+
+    @Slot()
+    def appendBegin(self):
+        showWarning = False
+        finalMsg = ""
+        fid = None
+        
+        try:
+            if self.msgSignal: self.msgSignal.emit("Appending STD file...", False, False, False)
+            start = time.time()
+            # test ids and filters must be the same as the session,
+            # current settings are used for sessions of older versions
+            sessionSettings = readSessionSettings(self.dbPath)
+            if sessionSettings is None:
+                idType, profile = self.idType, self.ingest.get_profile()
+            else:
+                idType, profile = sessionSettings
+            removeStore(self.dbPath)
+            # database is unchanged if cancelled or failed
+            fid = rust_stdf_helper.append_database(self.dbPath, self.appendPaths, self.appendFid, 
+                                                   idType, self.progressBarSignal, self.flag, 
+                                                   mpr_blob=self.mprBlob, 
+                                                   profile=profile)
+            logInsertStats()
+            if fid is None:
+                finalMsg = "Appending cancelled by user"
+            else:
+                if sessionSettings is None:
+                    writeSessionSettings(self.dbPath, idType, profile)
+                finalMsg = f"Append completed, process time {time.time() - start :.3f} sec"
+        
+        except Exception as e:
+            self.flag.stop = True
+            logger.exception("\nError occurred when appending the file")
+            fid = None
+            showWarning = True
+            finalMsg = str(e)
+        
+        if fid is not None:
+            self.dataAppendedSignal.emit(fid)
+        if self.msgSignal: self.msgSignal.emit(finalMsg, False, showWarning, False)
+        self.closeSignal.emit(True)     # close loaderUI
+
+
+    @Slot()
+    def followBegin(self):
+        di = DataInterface()
+        sendDI = True
+        showWarning = False
+        finalMsg = ""
+        
+        try:
+            if self.msgSignal: self.msgSignal.emit("Loading STD file...", False, False, False)
+            start = time.time()
+            # followed session changes over time, never cached
+            databasePath = os.path.join(sys.rootFolder, "logs", f"{uuid.uuid4().hex}.db")
+            profile = self.ingest.get_profile()
+            offset = rust_stdf_helper.follow_database(databasePath, self.followPath, 0, 
+                                                      self.idType, self.progressBarSignal, self.flag, 
+                                                      mpr_blob=self.mprBlob, 
+                                                      profile=profile)
+            if self.flag.stop:
+                sendDI = False
+                finalMsg = "Loading cancelled by user"
+            else:
+                # later polls are parsed with the same settings
+                writeSessionSettings(databasePath, self.idType, profile)
+                di.dbPath = databasePath
+                di.followPath = self.followPath
+                di.followOffset = offset
+                finalMsg = f"Load completed, following new parts, process time {time.time() - start :.3f} sec"
+        
+        except Exception as e:
+            self.flag.stop = True
+            di.close()
+            logger.exception("\nError occurred when parsing the file")
+            sendDI = False
+            showWarning = True
+            finalMsg = str(e)
+        
+        self.dataInterfaceSignal.emit(di if sendDI else None)
+        if self.msgSignal: self.msgSignal.emit(finalMsg, False, showWarning, False)
+        self.closeSignal.emit(True)     # close loaderUI
+
+
+
+class stdFollower(QtCore.QObject):
+    '''
+    Parse new parts of a followed STDF file in a background thread
+    '''
+    # offset of the next poll, might be larger than int32
+    followedSignal = Signal(object)
+    # not displayed, polls are usually short
+    progressSignal = Signal(int)
+    # error message, following is stopped
+    failedSignal = Signal(str)
+    
+    def __init__(self):
+        super().__init__()
+        self.flag = flags()
+        self.idType = rust_stdf_helper.TestIDType.TestNumberAndName
+        self.mprBlob = False
+        self.ingest = IngestProfileConfig()
+        
+    def setIDType(self, idType):
+        self.idType = idType
+        
+    @Slot(str, str, object)
+    def poll(self, dbPath: str, stdPath: str, offset: int):
+        try:
+            # settings might be changed after following starts
+            sessionSettings = readSessionSettings(dbPath)
+            if sessionSettings is None:
+                idType, profile = self.idType, self.ingest.get_profile()
+            else:
+                idType, profile = sessionSettings
+            removeStore(dbPath)
+            offset = rust_stdf_helper.follow_database(dbPath, stdPath, offset, 
+                                                      idType, self.progressSignal, self.flag, 
+                                                      mpr_blob=self.mprBlob, 
+                                                      profile=profile)
+        except Exception as e:
+            # a failed poll fails again with the same records
+            logger.exception("\nError occurred when following the file")
+            self.failedSignal.emit(str(e))
+            return
+        self.followedSignal.emit(offset)
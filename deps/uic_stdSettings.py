@@ -25,7 +25,7 @@
 
 
 from deps.SharedSrc import *
-from rust_stdf_helper import TestIDType
+from rust_stdf_helper import TestIDType, validate_profile
 # pyqt5
 from PyQt5 import QtWidgets, QtGui
 from PyQt5.QtCore import QTranslator
@@ -70,6 +70,13 @@ indexDic_testIdfy = {
                 TestIDType.TestNumberOnly: "Number Only"}
 indexDic_testIdfy_reverse = {v:k for k, v in indexDic_testIdfy.items()}
 
+# ingest profile checkbox -> skipped record types
+skipRecordDic = {
+                "skipFTR_ingest": ["FTR"],
+                "skipMPR_ingest": ["MPR"],
+                "skipDatalog_ingest": ["DTR", "GDR"],
+                "skipPinMap_ingest": ["PMR", "PGR", "PLR"]}
+
 
 class colorBtn(QtWidgets.QWidget):
     def __init__(self, parent=None, name="", num=None):
@@ -220,6 +227,14 @@ class stdfSettings(QtWidgets.QDialog):
         self.settingsUI.lineEdit_cpk.setText(str(settings.gen.cpk_thrsh))
         self.settingsUI.sortTestListComboBox.setCurrentIndex(indexDic_sortby_reverse.get(settings.gen.sort_tlist, 0))
         self.settingsUI.testIDTypecomboBox.setCurrentIndex(indexDic_testIdfy_reverse.get(settings.gen.id_type, 0))
+        # ingest profile
+        for cbName, recs in skipRecordDic.items():
+            getattr(self.settingsUI, cbName).setChecked(all(r in settings.ingest.skip_records for r in recs))
+        self.settingsUI.lineEdit_includeTests.setText(settings.ingest.include_tests)
+        self.settingsUI.lineEdit_excludeTests.setText(settings.ingest.exclude_tests)
+        self.settingsUI.lineEdit_includeNames.setText(settings.ingest.include_names)
+        self.settingsUI.lineEdit_excludeNames.setText(settings.ingest.exclude_names)
+        self.settingsUI.lineEdit_sites.setText(settings.ingest.sites)
         # file symbol
         fsLayout = self.settingsUI.gridLayout_file_symbol
         for i in range(fsLayout.count()):
@@ -271,6 +286,17 @@ class stdfSettings(QtWidgets.QDialog):
         userSettings.gen.cpk_thrsh = float(self.settingsUI.lineEdit_cpk.text())
         userSettings.gen.sort_tlist = indexDic_sortby[self.settingsUI.sortTestListComboBox.currentIndex()]
         userSettings.gen.id_type = indexDic_testIdfy[self.settingsUI.testIDTypecomboBox.currentIndex()]
+        # ingest profile, keep record types that are not in the UI
+        uiRecords = [r for recs in skipRecordDic.values() for r in recs]
+        userSettings.ingest.skip_records = [r for r in getSetting().ingest.skip_records if r not in uiRecords]
+        for cbName, recs in skipRecordDic.items():
+            if getattr(self.settingsUI, cbName).isChecked():
+                userSettings.ingest.skip_records.extend(recs)
+        userSettings.ingest.include_tests = self.settingsUI.lineEdit_includeTests.text().strip()
+        userSettings.ingest.exclude_tests = self.settingsUI.lineEdit_excludeTests.text().strip()
+        userSettings.ingest.include_names = self.settingsUI.lineEdit_includeNames.text()
+        userSettings.ingest.exclude_names = self.settingsUI.lineEdit_excludeNames.text()
+        userSettings.ingest.sites = self.settingsUI.lineEdit_sites.text().strip()
         # file symbol
         fsLayout = self.settingsUI.gridLayout_file_symbol
         for i in range(fsLayout.count()):
@@ -295,6 +321,14 @@ class stdfSettings(QtWidgets.QDialog):
         if self.parent:
             origSettings = getSetting()
             userSettings = self.getUserSettings()
+            try:
+                # regex is checked by the parser's engine, 
+                # quick look settings are checked as well
+                validate_profile(userSettings.ingest.get_profile(sampled=True))
+            except ValueError as e:
+                # keep the dialog open for correction
+                QtWidgets.QMessageBox.warning(self, "Warning", f"Invalid ingest profile:\n{e}")
+                return
             currentTab = self.parent.ui.tabControl.currentIndex()
             
             refreshTab = False